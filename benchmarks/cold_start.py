@@ -0,0 +1,42 @@
+import time
+
+STARTED = time.perf_counter()
+
+import json
+import sys
+
+def main(argv=None):
+    """Command line: ``python -m benchmarks.cold_start MODEL CSV``; prints phase timings as JSON.
+
+    Run in a fresh interpreter by the ``cold_start`` benchmark: imports the
+    detector, loads the model and scores the first chunk of the CSV, the
+    same work a restarted system does before it scores its first packet.
+    """
+    model_path, csv_path = (argv or sys.argv[1:])[:2]
+    from detector.anomaly_detector import EnhancedAnomalyDetector
+    from detector.model_manager import ModelManager
+    from utils.logger import logger
+    imported = time.perf_counter()
+
+    # Nothing this run does belongs in the system log
+    logger.logger.disabled = True
+    detector = EnhancedAnomalyDetector()
+    detector.model_manager = ModelManager(model_path)
+    if detector.pipeline is None:
+        sys.exit(f"No model at {model_path}")
+    loaded = time.perf_counter()
+
+    results = detector.predict(next(detector.iter_chunks([csv_path])))
+    if results is None:
+        sys.exit(f"Could not score {csv_path}")
+    scored = time.perf_counter()
+
+    print(json.dumps({
+        'import': imported - STARTED,
+        'load_model': loaded - imported,
+        'first_score': scored - loaded,
+        'rows': len(results['predictions'])
+    }))
+
+if __name__ == "__main__":
+    main()
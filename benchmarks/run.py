@@ -0,0 +1,337 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import sklearn
+from config import BASE_DIR, BENCHMARK_CONFIG, LOG_CONFIG
+from benchmarks.synthetic import parse_size, write_csv
+from detector.anomaly_detector import EnhancedAnomalyDetector
+from detector.feature_cache import feature_cache
+from detector.model_manager import ModelManager
+from security.firewall import FakeBackend
+from security.response import SecurityResponse
+from security.store import BlockStore
+from utils.logger import logger, AsyncQueueHandler, BatchWriter, WriterHandler
+from utils.threat_log import ThreatLog
+
+BENCHMARKS = ("load_data_cold", "load_data_warm", "train", "predict", "predict_stream", "predict_file", "cold_start",
+              "block_ip")
+
+def measure(run, repeats, memory=True, setup=None):
+    """Time ``run()`` ``repeats`` times, then trace one more run for its peak memory.
+
+    ``setup()`` runs untimed before each run. If ``run`` returns a list of
+    per-operation latencies, those feed the percentiles; otherwise each run
+    counts as one operation. Tracing slows Python code down, so the traced
+    run is never timed. Returns ``(times, latencies, peak_bytes)``.
+    """
+    times, latencies = [], []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        latencies.extend(result if isinstance(result, list) else [elapsed])
+
+    peak = None
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return times, latencies, peak
+
+def _record(name, rows, operations, times, latencies, peak):
+    median = statistics.median(times)
+    return {
+        'benchmark': name,
+        'rows': rows,
+        'operations': operations,
+        'repeats': len(times),
+        'seconds': {'min': min(times), 'median': median, 'max': max(times)},
+        'throughput': operations / median if median > 0 else None,
+        'latency_ms': {f'p{q}': float(np.percentile(latencies, q)) * 1000 for q in (50, 95, 99)},
+        'peak_memory_mb': None if peak is None else peak / 2 ** 20
+    }
+
+class _ScratchLogs:
+    """Send log records and threat events to a scratch directory while benchmarking.
+
+    Blocking thousands of synthetic addresses would otherwise fill the real
+    threat log, and per-chunk progress would flood the console.
+    """
+
+    def __init__(self, directory):
+        writer = BatchWriter(logging.Formatter(LOG_CONFIG['format']), os.path.join(directory, "system.log"),
+                             ThreatLog(os.path.join(directory, "threats")), console=False)
+        self.handler = AsyncQueueHandler(writer) if LOG_CONFIG['async'] else WriterHandler(writer)
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = logger.handler
+        logger.logger.removeHandler(self.previous)
+        logger.logger.addHandler(self.handler)
+        logger.handler = self.handler
+        return self
+
+    def __exit__(self, *exc):
+        logger.logger.removeHandler(self.handler)
+        logger.logger.addHandler(self.previous)
+        logger.handler = self.previous
+        self.handler.close()
+
+class BenchmarkSuite:
+    """Time each pipeline stage on synthetic flows in a scratch directory.
+
+    Every size gets its own data directory, detector and model file, so
+    nothing touches the live model, data or block store.
+    """
+
+    def __init__(self, workdir, repeats=None, memory=True, seed=None, block_ips=None, only=None, report=print):
+        self.workdir = workdir
+        self.repeats = repeats or BENCHMARK_CONFIG['repeats']
+        self.memory = memory
+        self.seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+        self.block_ips = block_ips or BENCHMARK_CONFIG['block_ips']
+        self.only = set(only or BENCHMARKS)
+        self.report = report
+
+    def _add(self, results, name, rows, operations, run, setup=None, memory=None):
+        if name not in self.only:
+            return
+        memory = self.memory if memory is None else memory
+        record = _record(name, rows, operations, *measure(run, self.repeats, memory, setup))
+        results.append(record)
+        self.report(format_record(record))
+
+    def _data(self, rows):
+        """Directory holding the synthetic CSV for ``rows`` flows, generated on first use."""
+        data_dir = os.path.join(self.workdir, f"flows-{rows}-seed{self.seed}")
+        csv_path = os.path.join(data_dir, "flows.csv")
+        if not os.path.exists(csv_path):
+            os.makedirs(data_dir, exist_ok=True)
+            start = time.perf_counter()
+            write_csv(csv_path, rows, self.seed, workers=BENCHMARK_CONFIG['generate_workers'])
+            self.report(f"Generated {rows} flows in {time.perf_counter() - start:.1f}s")
+        return data_dir, csv_path
+
+    def _cold_start(self, model_path, csv_path):
+        """Score the first chunk of ``csv_path`` from a fresh interpreter; return its phase timings."""
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.cold_start", model_path, csv_path],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run_size(self, rows):
+        """Benchmark the detector stages on ``rows`` synthetic flows."""
+        data_dir, csv_path = self._data(rows)
+        results_path = csv_path.replace('.csv', '_results.csv')
+        detector = EnhancedAnomalyDetector()
+        detector.model_manager = ModelManager(os.path.join(data_dir, "model.pkl"))
+        results = []
+
+        def remove_results():
+            # predict_file writes next to its input, where load_data would pick it up
+            if os.path.exists(results_path):
+                os.remove(results_path)
+
+        try:
+            self._add(results, "load_data_cold", rows, rows,
+                      lambda: detector.load_data(data_dir), setup=lambda: feature_cache.evict(csv_path))
+            # Also leaves the feature cache warm
+            block = detector.load_data(data_dir)
+            self._add(results, "load_data_warm", rows, rows, lambda: detector.load_data(data_dir))
+
+            self._add(results, "train", rows, rows, lambda: detector.train(block))
+            if detector.pipeline is None:
+                # The predict benchmarks need a model
+                detector.train(block)
+            self._add(results, "predict", rows, rows, lambda: detector.predict(block))
+            self._add(results, "predict_stream", rows, rows,
+                      lambda: detector.predict(detector.load_data(data_dir, stream=True)))
+            self._add(results, "predict_file", rows, rows,
+                      lambda: detector.predict_file(csv_path), setup=remove_results)
+            if "cold_start" in self.only:
+                # Start-to-first-score of a restart; a child process has nothing for tracemalloc to see
+                phases = []
+                self._add(results, "cold_start", rows, 1,
+                          lambda: phases.append(self._cold_start(detector.model_manager.model_path, csv_path)),
+                          memory=False)
+                self.report("  cold start phases: " + ", ".join(
+                    f"{phase} {statistics.median(run[phase] for run in phases):.3f}s"
+                    for phase in ('import', 'load_model', 'first_score')))
+        finally:
+            remove_results()
+            detector.scorer.close()
+        return results
+
+    def run_block_ip(self):
+        """Benchmark ``SecurityResponse.block_ip`` against a fake firewall, one latency per call."""
+        rng = np.random.default_rng(self.seed)
+        addresses = [f"10.{a}.{b}.{c}" for a, b, c in rng.integers(0, 256, (self.block_ips, 3)).tolist()]
+        runs = iter(range(sys.maxsize))
+
+        def run():
+            store = BlockStore(os.path.join(self.workdir, f"blocks-{next(runs)}.db"))
+            response = SecurityResponse(firewall=FakeBackend(), store=store)
+            latencies = []
+            try:
+                for ip in addresses:
+                    start = time.perf_counter()
+                    response.block_ip(ip, reason="Benchmark")
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                response.expiry_scheduler.stop()
+                store.close()
+            return latencies
+
+        results = []
+        self._add(results, "block_ip", len(addresses), len(addresses), run)
+        return results
+
+    def run(self, sizes):
+        results = []
+        with _ScratchLogs(self.workdir):
+            for rows in sizes:
+                results.extend(self.run_size(rows))
+            results.extend(self.run_block_ip())
+        return results
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def environment():
+    """Where the numbers came from; comparisons across machines are only indicative."""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'commit': _git_commit()
+    }
+
+def format_record(record):
+    peak = record['peak_memory_mb']
+    return (f"{record['benchmark']:<15} {record['rows']:>10} rows  "
+            f"median {record['seconds']['median']:9.4f}s  {record['throughput'] or 0:12.0f} ops/s  "
+            f"p95 {record['latency_ms']['p95']:10.3f}ms  peak {'-' if peak is None else f'{peak:.1f}MB'}")
+
+def compare(results, baseline, tolerance=None, memory_tolerance=None):
+    """Regressions of ``results`` against a ``baseline`` run, as readable lines.
+
+    A benchmark regresses when its median time grows by more than
+    ``tolerance`` or its peak memory by more than ``memory_tolerance``
+    (fractions). Benchmarks missing from either run are skipped.
+    """
+    tolerance = BENCHMARK_CONFIG['tolerance'] if tolerance is None else tolerance
+    memory_tolerance = BENCHMARK_CONFIG['memory_tolerance'] if memory_tolerance is None else memory_tolerance
+    previous = {(record['benchmark'], record['rows']): record for record in baseline['results']}
+    regressions = []
+    for record in results['results']:
+        old = previous.get((record['benchmark'], record['rows']))
+        if old is None:
+            continue
+        name = f"{record['benchmark']}@{record['rows']}"
+        before, after = old['seconds']['median'], record['seconds']['median']
+        if before > 0 and after / before > 1 + tolerance:
+            regressions.append(f"{name}: median {before:.4f}s -> {after:.4f}s (+{(after / before - 1) * 100:.0f}%)")
+        before, after = old.get('peak_memory_mb'), record.get('peak_memory_mb')
+        if before and after and after / before > 1 + memory_tolerance:
+            regressions.append(f"{name}: peak memory {before:.1f}MB -> {after:.1f}MB (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+def over_budget(results, budget=None):
+    """Cold starts slower than ``budget`` seconds, whatever the baseline says."""
+    budget = BENCHMARK_CONFIG['cold_start_budget'] if budget is None else budget
+    return [
+        f"cold_start@{record['rows']}: median {record['seconds']['median']:.2f}s exceeds the {budget:.1f}s budget"
+        for record in results['results']
+        if record['benchmark'] == 'cold_start' and record['seconds']['median'] > budget
+    ]
+
+def main(argv=None):
+    """Command line: ``python -m benchmarks.run --sizes 10k,100k,1m``; exits 1 on regressions."""
+    parser = argparse.ArgumentParser(description="Benchmark load, train, predict and blocking on synthetic flows")
+    parser.add_argument("--sizes", type=lambda text: [parse_size(size) for size in text.split(",")],
+                        default=BENCHMARK_CONFIG['sizes'], help="Flow counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--repeats", type=int, default=BENCHMARK_CONFIG['repeats'])
+    parser.add_argument("--only", type=lambda text: text.split(","), help=f"Subset of: {','.join(BENCHMARKS)}")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced run measuring peak memory")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "benchmarks", "results.json"),
+                        help="Where to write this run's results")
+    parser.add_argument("--baseline", default=BENCHMARK_CONFIG['baseline'], help="Previous results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Make this run the new baseline")
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_CONFIG['tolerance'])
+    parser.add_argument("--workdir", help="Keep generated data here and reuse it across runs")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.only or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="shcs-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    suite = BenchmarkSuite(workdir, args.repeats, not args.no_memory, only=args.only)
+    try:
+        records = suite.run(args.sizes)
+    finally:
+        # Cached matrices of the synthetic files would otherwise linger in the feature cache
+        for rows in args.sizes:
+            feature_cache.evict(os.path.join(workdir, f"flows-{rows}-seed{suite.seed}", "flows.csv"))
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'created': datetime.now().isoformat(),
+        'environment': environment(),
+        'repeats': args.repeats,
+        'seed': suite.seed,
+        'results': records
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    regressions = over_budget(results)
+    for line in regressions:
+        print(f"  OVER BUDGET {line}")
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.tolerance)
+        print(f"Compared with {args.baseline}: {len(slower)} regression(s)")
+        for line in slower:
+            print(f"  REGRESSION {line}")
+        regressions.extend(slower)
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Column names exactly as in the CICIDS2017 exports (and data/sample1.csv), leading spaces included
+COLUMNS = (
+    ' Destination Port', ' Flow Duration', ' Total Fwd Packets', ' Total Backward Packets',
+    'Total Length of Fwd Packets', ' Total Length of Bwd Packets', ' Fwd Packet Length Max', ' Fwd Packet Length Min',
+    ' Fwd Packet Length Mean', ' Fwd Packet Length Std', 'Bwd Packet Length Max', ' Bwd Packet Length Min',
+    ' Bwd Packet Length Mean', ' Bwd Packet Length Std', 'Flow Bytes/s', ' Flow Packets/s',
+    ' Flow IAT Mean', ' Flow IAT Std', ' Flow IAT Max', ' Flow IAT Min',
+    'Fwd IAT Total', ' Fwd IAT Mean', ' Fwd IAT Std', ' Fwd IAT Max',
+    ' Fwd IAT Min', 'Bwd IAT Total', ' Bwd IAT Mean', ' Bwd IAT Std',
+    ' Bwd IAT Max', ' Bwd IAT Min', 'Fwd PSH Flags', ' Bwd PSH Flags',
+    ' Fwd URG Flags', ' Bwd URG Flags', ' Fwd Header Length', ' Bwd Header Length',
+    'Fwd Packets/s', ' Bwd Packets/s', ' Min Packet Length', ' Max Packet Length',
+    ' Packet Length Mean', ' Packet Length Std', ' Packet Length Variance', 'FIN Flag Count',
+    ' SYN Flag Count', ' RST Flag Count', ' PSH Flag Count', ' ACK Flag Count',
+    ' URG Flag Count', ' CWE Flag Count', ' ECE Flag Count', ' Down/Up Ratio',
+    ' Average Packet Size', ' Avg Fwd Segment Size', ' Avg Bwd Segment Size', ' Fwd Header Length',
+    'Fwd Avg Bytes/Bulk', ' Fwd Avg Packets/Bulk', ' Fwd Avg Bulk Rate', ' Bwd Avg Bytes/Bulk',
+    ' Bwd Avg Packets/Bulk', 'Bwd Avg Bulk Rate', 'Subflow Fwd Packets', ' Subflow Fwd Bytes',
+    ' Subflow Bwd Packets', ' Subflow Bwd Bytes', 'Init_Win_bytes_forward', ' Init_Win_bytes_backward',
+    ' act_data_pkt_fwd', ' min_seg_size_forward', 'Active Mean', ' Active Std',
+    ' Active Max', ' Active Min', 'Idle Mean', ' Idle Std',
+    ' Idle Max', ' Idle Min', ' Label',
+)
+META_COLUMNS = (' Source IP', ' Timestamp')
+
+BLOCK_ROWS = 100000          # Rows generated per block; the output does not depend on it
+START_TIME = np.datetime64('2017-07-07T08:00:00')
+ATTACK_LABELS = np.array(["DDoS", "PortScan"])
+
+def _spread(rng, mean, n, low=0.0, high=1.0):
+    """A standard deviation around ``mean``: a random fraction of it."""
+    return mean * rng.uniform(low, high, n)
+
+def _generate_block(seed, index, rows, anomaly_rate, with_meta):
+    """Flows ``index * BLOCK_ROWS`` onwards, from their own random stream."""
+    rng = np.random.default_rng([seed, index])
+    n = rows
+    attack = rng.random(n) < anomaly_rate
+
+    # Packet counts, sizes and duration; attacks are floods of tiny, fast packets
+    fwd = np.where(attack, rng.integers(50, 2000, n), rng.geometric(0.3, n))
+    bwd = np.where(attack, rng.integers(0, 3, n), rng.geometric(0.4, n) - 1)
+    fwd_mean = np.where(attack, rng.uniform(0, 6, n), rng.lognormal(3.5, 1.2, n).clip(0, 1460))
+    bwd_mean = np.where(bwd > 0, rng.lognormal(4.5, 1.5, n).clip(0, 1460), 0.0)
+    fwd_std = np.where(fwd > 1, _spread(rng, fwd_mean, n, 0, 0.8), 0.0)
+    bwd_std = np.where(bwd > 1, _spread(rng, bwd_mean, n, 0, 0.8), 0.0)
+    duration = np.where(attack, rng.lognormal(6, 1, n), rng.lognormal(9, 3, n)).clip(1, 120e6).round()
+
+    tot_fwd = np.round(fwd * fwd_mean)
+    tot_bwd = np.round(bwd * bwd_mean)
+    fwd_max = np.minimum(1460, fwd_mean + fwd_std).round()
+    fwd_min = np.maximum(0, fwd_mean - fwd_std).round()
+    bwd_max = np.minimum(1460, bwd_mean + bwd_std).round()
+    bwd_min = np.maximum(0, bwd_mean - bwd_std).round()
+    packets = fwd + bwd
+
+    # Inter-arrival times, in microseconds like the flow duration
+    iat_mean = duration / np.maximum(packets - 1, 1)
+    iat_std = np.where(packets > 2, _spread(rng, iat_mean, n, 0, 1.5), 0.0)
+    iat_max = np.minimum(duration, iat_mean + 2 * iat_std)
+    iat_min = np.maximum(0, iat_mean - iat_std)
+    fwd_iat_total = np.where(fwd > 1, duration * rng.uniform(0.5, 1, n), 0.0).round()
+    fwd_iat_mean = fwd_iat_total / np.maximum(fwd - 1, 1)
+    fwd_iat_std = np.where(fwd > 2, _spread(rng, fwd_iat_mean, n), 0.0)
+    bwd_iat_total = np.where(bwd > 1, duration * rng.uniform(0.3, 1, n), 0.0).round()
+    bwd_iat_mean = bwd_iat_total / np.maximum(bwd - 1, 1)
+    bwd_iat_std = np.where(bwd > 2, _spread(rng, bwd_iat_mean, n), 0.0)
+
+    header = rng.choice([20, 32, 40], n)
+    flag = lambda p: (rng.random(n) < p).astype(np.int64)
+    pkt_mean = (tot_fwd + tot_bwd) / packets
+    pkt_std = _spread(rng, pkt_mean, n, 0, 0.9)
+    long_flow = duration > 5e6
+    active = np.where(long_flow, rng.lognormal(11, 1, n), 0.0).round()
+    idle = np.where(long_flow, rng.lognormal(16, 1, n), 0.0).round()
+    active_std = _spread(rng, active, n, 0, 0.5)
+    idle_std = _spread(rng, idle, n, 0, 0.5)
+    zeros = np.zeros(n, dtype=np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bytes_s = (tot_fwd + tot_bwd) / duration * 1e6
+        packets_s = packets / duration * 1e6
+    # Real exports carry a few broken rate cells; keep the sanitizer honest
+    broken = rng.random(n) < 1e-4
+    bytes_s[broken] = rng.choice([np.nan, np.inf], broken.sum())
+    packets_s[broken] = np.inf
+
+    values = [
+        np.where(attack, rng.integers(1, 1024, n), rng.choice([80, 443, 53, 22, 8080, 3389, 123], n)),
+        duration, fwd, bwd,
+        tot_fwd, tot_bwd, fwd_max, fwd_min,
+        fwd_mean, fwd_std, bwd_max, bwd_min,
+        bwd_mean, bwd_std, bytes_s, packets_s,
+        iat_mean, iat_std, iat_max, iat_min,
+        fwd_iat_total, fwd_iat_mean, fwd_iat_std, np.minimum(fwd_iat_total, fwd_iat_mean + 2 * fwd_iat_std),
+        np.maximum(0, fwd_iat_mean - fwd_iat_std), bwd_iat_total, bwd_iat_mean, bwd_iat_std,
+        np.minimum(bwd_iat_total, bwd_iat_mean + 2 * bwd_iat_std), np.maximum(0, bwd_iat_mean - bwd_iat_std), flag(0.05), zeros,
+        zeros, zeros, fwd * header, bwd * header,
+        fwd / duration * 1e6, bwd / duration * 1e6, np.where(bwd > 0, np.minimum(fwd_min, bwd_min), fwd_min), np.maximum(fwd_max, bwd_max),
+        pkt_mean, pkt_std, pkt_std ** 2, flag(0.1),
+        np.where(attack, flag(0.9), flag(0.05)), flag(0.02), flag(0.3), flag(0.5),
+        flag(0.05), zeros, flag(0.01), bwd // fwd,
+        pkt_mean * packets / np.maximum(packets - 1, 1), fwd_mean, bwd_mean, fwd * header,
+        zeros, zeros, zeros, zeros,
+        zeros, zeros, fwd, tot_fwd,
+        bwd, tot_bwd, rng.choice([-1, 29, 229, 8192, 29200, 65535], n), rng.choice([-1, 0, 235, 28960, 65160], n),
+        rng.binomial(fwd, 0.5), header, active, active_std,
+        active + active_std, np.maximum(0, active - active_std), idle, idle_std,
+        idle + idle_std, np.maximum(0, idle - idle_std),
+        np.where(attack, ATTACK_LABELS[rng.integers(0, len(ATTACK_LABELS), n)], "BENIGN"),
+    ]
+    # Whole-valued columns are written as integers and the rest to 4 decimals, which is also faster to format
+    for i, column in enumerate(values):
+        column = np.asarray(column)
+        if column.dtype == np.float64:
+            if np.isfinite(column).all() and (column == np.round(column)).all():
+                values[i] = column.astype(np.int64)
+            else:
+                values[i] = np.round(column, 4)
+    frame = pd.DataFrame(dict(zip(range(len(COLUMNS)), values)))
+    frame.columns = list(COLUMNS)
+
+    if with_meta:
+        # Benign traffic comes from a large internal pool, attacks from a few documentation-range hosts
+        hosts = np.where(attack, rng.integers(0, 256, n) + (198 << 24 | 51 << 16 | 100 << 8),
+                         rng.integers(0, 50000, n) + (10 << 24))
+        frame[META_COLUMNS[0]] = [f"{h >> 24}.{h >> 16 & 255}.{h >> 8 & 255}.{h & 255}" for h in hosts.tolist()]
+        offsets = (index * BLOCK_ROWS + np.arange(n)) * 5   # One flow every 5 ms
+        frame[META_COLUMNS[1]] = np.datetime_as_string(START_TIME + offsets.astype('timedelta64[ms]'), unit='s')
+    return frame
+
+def iter_flows(rows, seed=0, anomaly_rate=0.02, with_meta=True):
+    """Yield DataFrames of synthetic flows, ``rows`` in total, deterministic for a seed."""
+    for index, start in enumerate(range(0, rows, BLOCK_ROWS)):
+        yield _generate_block(seed, index, min(BLOCK_ROWS, rows - start), anomaly_rate, with_meta)
+
+def _block_csv(args):
+    """CSV text of one block, with the header if it is the first."""
+    seed, index, rows, anomaly_rate, with_meta = args
+    return _generate_block(seed, index, rows, anomaly_rate, with_meta).to_csv(header=(index == 0), index=False)
+
+def write_csv(path, rows, seed=0, anomaly_rate=0.02, with_meta=True, workers=1):
+    """Write ``rows`` synthetic flows to a CSV file and return its path.
+
+    Blocks are formatted by ``workers`` processes (0 for one per core) and
+    written in order, so the file is the same whatever the worker count.
+    """
+    blocks = [(seed, index, min(BLOCK_ROWS, rows - start), anomaly_rate, with_meta)
+              for index, start in enumerate(range(0, rows, BLOCK_ROWS))]
+    workers = workers or os.cpu_count() or 1
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        if workers <= 1 or len(blocks) <= 1:
+            f.writelines(map(_block_csv, blocks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                f.writelines(pool.map(_block_csv, blocks))
+    os.replace(tmp_path, path)
+    return path
+
+def parse_size(text):
+    """Row count from text such as ``10k``, ``1.5m`` or ``250000``."""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+def main(argv=None):
+    """Command line: ``python -m benchmarks.synthetic 1m data/synthetic.csv``."""
+    parser = argparse.ArgumentParser(description="Generate synthetic CICIDS-style flow records")
+    parser.add_argument("rows", type=parse_size, help="Number of flows, e.g. 10k or 1m")
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--anomaly-rate", type=float, default=0.02)
+    parser.add_argument("--no-meta", action="store_true", help="Omit the Source IP and Timestamp columns")
+    parser.add_argument("--workers", type=int, default=0, help="Formatting processes; 0 uses every core")
+    args = parser.parse_args(argv)
+    write_csv(args.output, args.rows, args.seed, args.anomaly_rate, not args.no_meta, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,15 @@ class AnomalyDetector:
     def __init__(self):
         self.model = IsolationForest(contamination=0.05, random_state=42)
         self.scaler = RobustScaler()
+        self._artifact_mtimes = None
+
+    def _load_artifacts(self):
+        """ Load model and scaler once, reloading only when the files change. """
+        mtimes = (os.stat("data/model.pkl").st_mtime_ns, os.stat("data/scaler.pkl").st_mtime_ns)
+        if mtimes != self._artifact_mtimes:
+            self.model = joblib.load("data/model.pkl")
+            self.scaler = joblib.load("data/scaler.pkl")
+            self._artifact_mtimes = mtimes
 
     def load_data(self):
         """ Load and preprocess data from the 'data/' folder. """
@@ -47,8 +56,11 @@ class AnomalyDetector:
             print("[INFO] Training Isolation Forest model...")
             self.model.fit(data)
             os.makedirs("data", exist_ok=True)
-            joblib.dump(self.model, "data/model.pkl")
-            joblib.dump(self.scaler, "data/scaler.pkl")
+            # Write to temp files first so readers never load a partial artifact
+            joblib.dump(self.model, "data/model.pkl.tmp")
+            joblib.dump(self.scaler, "data/scaler.pkl.tmp")
+            os.replace("data/scaler.pkl.tmp", "data/scaler.pkl")
+            os.replace("data/model.pkl.tmp", "data/model.pkl")
             print("[INFO] Model and scaler saved to 'data/' folder.")
         except Exception as e:
             print(f"[ERROR] Failed to train model: {e}")
@@ -56,8 +68,7 @@ class AnomalyDetector:
     def predict(self, new_data):
         """ Predict anomalies in new data. """
         try:
-            self.model = joblib.load("data/model.pkl")
-            self.scaler = joblib.load("data/scaler.pkl")
+            self._load_artifacts()
             
             if isinstance(new_data, pd.DataFrame):
                 new_data = new_data.select_dtypes(include=[np.number]).replace([np.inf, -np.inf], np.nan).fillna(0)
@@ -74,11 +85,14 @@ class AnomalyDetector:
             new_data = pd.read_csv(file_path)
             original_data = new_data.copy()
             numeric_data = new_data.select_dtypes(include=[np.number]).replace([np.inf, -np.inf], np.nan).fillna(0)
-            predictions = self.predict(numeric_data)
+            self._load_artifacts()
+            
+            # Scale and score once; IsolationForest flags scores below 0
+            scores = self.model.decision_function(self.scaler.transform(numeric_data))
             
             result = original_data.copy()
-            result['anomaly_score'] = self.model.decision_function(self.scaler.transform(numeric_data))
-            result['anomaly'] = predictions
+            result['anomaly_score'] = scores
+            result['anomaly'] = np.where(scores < 0, -1, 1)
             result['is_anomaly'] = result['anomaly'].apply(lambda x: "Yes" if x == -1 else "No")
             
             output_file = file_path.replace('.csv', '_results.csv')
@@ -1,66 +1,300 @@
 import numpy as np
-import pandas as pd
-import joblib
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import RobustScaler
-from sklearn.pipeline import Pipeline
-from sklearn.model_selection import train_test_split
-from config import MODEL_CONFIG, DATA_DIR, MODEL_PATH, SCALER_PATH
+from config import MODEL_CONFIG, INGEST_CONFIG, TRAINING_CONFIG, CACHE_CONFIG, SCHEMA_CONFIG, DATA_DIR, MODEL_PATH, SCALER_PATH
+from detector.feature_cache import feature_cache
+from detector.model_manager import ModelManager
+from detector.parallel import ParallelScorer
+from detector.sampling import ReservoirSampler, parse_times
+from detector.sanitizer import Sanitizer
+from detector.schema import FeatureSchema, column_positions, meta_columns, normalize_columns, read_features
 from utils.logger import logger
+from utils.metrics import metrics, STAGE_SECONDS, STAGE_ROWS
+from collections.abc import Iterable
+import copy
+import hashlib
+import json
 import os
+import time
+
+# pandas and sklearn are imported by the methods that use them: together they
+# take over a second to import, which would otherwise delay every startup
+
+ANOMALIES = metrics.counter('shcs_anomalies_total', "Rows scored as anomalous")
+REPAIRED_CELLS = metrics.counter('shcs_repaired_cells_total', "NaN/inf cells repaired by the sanitizer", ('kind',))
+
+class TrainingCancelled(Exception):
+    """Raised inside a training run once its cancellation was requested."""
 
 class EnhancedAnomalyDetector:
     def __init__(self):
         self.model = None
         self.scaler = None
         self.feature_names = None
-        self.pipeline = Pipeline([
+        self.model_manager = ModelManager(MODEL_PATH)
+        self.scorer = ParallelScorer()
+        self.repair_counts = {'nan': 0, 'posinf': 0, 'neginf': 0}
+        self._dropped_columns = set()
+
+    @property
+    def pipeline(self):
+        """The live pipeline, or None if no model has been trained yet."""
+        return self._current_model()[0]['pipeline']
+
+    def _current_model(self):
+        """Return ``(artifact, version)`` for the live model.
+
+        Artifacts are dicts holding the fitted pipeline, its decision
+        threshold, the sanitizer fitted on the training data and the feature
+        schema. Older artifacts get IsolationForest's own cut-off of 0, an
+        unfitted sanitizer and no column alignment.
+        """
+        model, version = self.model_manager.current()
+        if not isinstance(model, dict):
+            model = {'pipeline': model}
+        return {'threshold': 0.0, 'sanitizer': Sanitizer(), 'schema': None, **model}, version
+
+    def _build_pipeline(self):
+        """Create a fresh, unfitted pipeline."""
+        from sklearn.ensemble import IsolationForest
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import RobustScaler
+        return Pipeline([
             ('scaler', RobustScaler()),
             ('model', IsolationForest(**MODEL_CONFIG))
         ])
 
-    def _validate_data(self, data):
-        """Validate input data format and content."""
+    def _to_block(self, data, schema=None):
+        """Convert input to a contiguous float32 block of its feature columns.
+
+        With a ``schema`` the columns are projected onto the model's features
+        in training order and mismatches raise ``SchemaMismatchError``;
+        without one every numeric column is kept. Arrays that are already
+        writable, C-contiguous float32 are used as-is, so sanitizing them
+        afterwards modifies the caller's array.
+        """
+        import pandas as pd
         if not isinstance(data, (pd.DataFrame, np.ndarray)):
             raise ValueError("Input data must be a pandas DataFrame or numpy array")
         
-        if isinstance(data, pd.DataFrame):
-            # Check for non-numeric columns
+        if schema is not None:
+            data = schema.align(data)
+        elif isinstance(data, pd.DataFrame):
+            # Check for non-numeric columns; flow metadata is expected and dropped silently
             non_numeric = data.select_dtypes(exclude=[np.number]).columns
             if not non_numeric.empty:
-                logger.warning(f"Dropping non-numeric columns: {non_numeric.tolist()}")
+                normalized = normalize_columns(non_numeric)
+                meta = set(meta_columns(normalized))
+                unexpected = {raw for raw, name in zip(non_numeric, normalized) if name not in meta}
+                if unexpected - self._dropped_columns:
+                    self._dropped_columns.update(unexpected)
+                    logger.warning(f"Dropping non-numeric columns: {sorted(unexpected)}")
                 data = data.select_dtypes(include=[np.number])
-            
-            # Handle missing values
-            if data.isnull().any().any():
-                logger.warning("Found missing values in data, filling with 0")
-                data = data.fillna(0)
-            
-            # Handle infinite values
-            if np.isinf(data).any().any():
-                logger.warning("Found infinite values in data, replacing with max/min")
-                data = data.replace([np.inf, -np.inf], np.nan)
-                data = data.fillna(data.max())
-        
+            data = data.to_numpy(dtype=np.float32)
+
+        block = np.ascontiguousarray(data, dtype=np.float32)
+        if not block.flags.writeable:
+            block = block.copy()
+        return block
+
+    def _record_repairs(self, counts):
+        """Add repaired-cell counts from the sanitizer to the running totals."""
+        for key, count in zip(('nan', 'posinf', 'neginf'), counts):
+            self.repair_counts[key] += count
+            REPAIRED_CELLS.inc(int(count), kind=key)
+
+    def _validate_data(self, data, model=None):
+        """Validate input data against a model and repair NaN/inf cells in one pass."""
+        if model is None:
+            model = self._current_model()[0]
+        with STAGE_SECONDS.time(stage='sanitize'):
+            block = self._to_block(data, model['schema'])
+            self._record_repairs(model['sanitizer'].transform(block))
+        STAGE_ROWS.inc(len(block), stage='sanitize')
+        return block
+
+    def _training_feature_names(self, data, n_features):
+        """Feature names for a training set of ``n_features`` columns."""
+        import pandas as pd
+        if isinstance(data, pd.DataFrame):
+            return normalize_columns(data.select_dtypes(include=[np.number]).columns)
+        if self.feature_names is not None and len(self.feature_names) == n_features:
+            return list(self.feature_names)
+        return [f"feature_{i}" for i in range(n_features)]
+
+    def _is_chunked(self, data):
+        """Check whether data is a stream of chunks rather than a single batch."""
+        import pandas as pd
+        return isinstance(data, Iterable) and not isinstance(data, (pd.DataFrame, np.ndarray))
+
+    def _list_csv_files(self, data_dir):
+        """List CSV files in the data directory, creating it if missing."""
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+            logger.warning(f"Created data directory: {data_dir}")
+            return None
+
+        csv_files = sorted(f for f in os.listdir(data_dir) if f.endswith('.csv'))
+        if not csv_files:
+            logger.error(f"No CSV files found in {data_dir}")
+            return None
+
+        return [os.path.join(data_dir, f) for f in csv_files]
+
+    def training_fingerprint(self, data_dir=DATA_DIR):
+        """Hash of what a model fitted on ``data_dir`` depends on.
+
+        Covers the name, size and mtime of every CSV in the directory and
+        the model, sampling and schema settings, so it changes whenever a
+        retrain could produce a different model. Files are not read.
+        """
+        files = []
+        if os.path.isdir(data_dir):
+            for name in sorted(os.listdir(data_dir)):
+                if name.endswith('.csv'):
+                    stat = os.stat(os.path.join(data_dir, name))
+                    files.append((name, stat.st_size, stat.st_mtime_ns))
+        return self._fingerprint({'settings': self.settings_fingerprint(), 'files': files})
+
+    def settings_fingerprint(self):
+        """Hash of the model, sampling and schema settings alone, without the data."""
+        return self._fingerprint({
+            'model': MODEL_CONFIG,
+            'schema': SCHEMA_CONFIG,
+            'sampling': {key: TRAINING_CONFIG[key] for key in ('sample_size', 'stratify_window')}
+        })
+
+    def _fingerprint(self, value):
+        encoded = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+    def update_mode(self, data_dir=DATA_DIR):
+        """How the live model should be brought up to date: None, ``'refresh'`` or ``'full'``.
+
+        A model fitted with the settings in place now, whose data has
+        changed since, is refreshed with the recent data when
+        ``refresh_on_change`` is set; anything else is refitted.
+        """
+        model, version = self._current_model()
+        if model['pipeline'] is None:
+            logger.info("No trained model found")
+            return 'full'
+        if TRAINING_CONFIG['retrain_on_start']:
+            return 'full'
+        if model.get('fingerprint') == self.training_fingerprint(data_dir):
+            logger.info(f"Model version {version} matches the training data; skipping retraining")
+            return None
+        if TRAINING_CONFIG['refresh_on_change'] and model.get('settings') == self.settings_fingerprint():
+            logger.info(f"Model version {version} is out of date with the training data; refreshing it")
+            return 'refresh'
+        logger.info(f"Model version {version} is out of date with the training data or settings")
+        return 'full'
+
+    def model_is_current(self, data_dir=DATA_DIR):
+        """Check whether the live model was trained on the data and settings in place now."""
+        model, version = self._current_model()
+        if model['pipeline'] is None:
+            logger.info("No trained model found")
+            return False
+        if model.get('fingerprint') != self.training_fingerprint(data_dir):
+            logger.info(f"Model version {version} is out of date with the training data or settings")
+            return False
+        logger.info(f"Model version {version} matches the training data; skipping retraining")
+        return True
+
+    def ensure_model(self, progress=None, cancelled=None):
+        """Bring the live model up to date on this thread (see ``update_mode``); return True if one is live."""
+        mode = self.update_mode()
+        if mode is None:
+            return True
+        if mode == 'refresh' and self.train(progress=progress, cancelled=cancelled, refresh=True):
+            return True
+        return self.train(progress=progress, cancelled=cancelled)
+
+    def _feature_positions(self, columns, source):
+        """Positions of the detector's features in ``columns``, adopting them if unset."""
+        if self.feature_names is None:
+            self.feature_names = list(columns)
+        return column_positions(columns, self.feature_names, source)
+
+    def _read_file(self, path):
+        """Read the feature columns of a whole CSV as float32."""
+        import pandas as pd
+        if not CACHE_CONFIG['enabled']:
+            self.feature_names, data = read_features(path, self.feature_names)
+            return data
+        matrix, columns, meta = feature_cache.load(path)
+        positions = self._feature_positions(columns, path)
+        data = pd.DataFrame(matrix[:, positions], columns=self.feature_names)
+        for name, values in meta.items():
+            data[name] = values.astype(str)
         return data
 
-    def load_data(self, data_dir=DATA_DIR):
-        """Load and preprocess data from directory."""
+    def _read_chunks(self, path, chunk_size):
+        """Yield fixed-size float32 chunks of a CSV's feature columns."""
+        import pandas as pd
+        if not CACHE_CONFIG['enabled']:
+            self.feature_names, chunks = read_features(path, self.feature_names, chunk_size)
+            yield from chunks
+            return
+
+        matrix, columns, meta = feature_cache.load(path, chunk_size)
+        positions = self._feature_positions(columns, path)
+        for start in range(0, len(matrix), chunk_size):
+            block = np.take(matrix[start:start + chunk_size], positions, axis=1)
+            chunk = pd.DataFrame(block, columns=self.feature_names)
+            for name, values in meta.items():
+                chunk[name] = values[start:start + chunk_size].astype(str)
+            yield chunk
+
+    def iter_chunks(self, csv_paths, chunk_size=None):
+        """Yield fixed-size feature chunks from each CSV file in turn."""
+        if chunk_size is None:
+            chunk_size = INGEST_CONFIG['chunk_size']
+
+        for path in csv_paths:
+            file = os.path.basename(path)
+            try:
+                rows = 0
+                chunks = self._read_chunks(path, chunk_size)
+                while True:
+                    start = time.perf_counter()
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage='parse')
+                    STAGE_ROWS.inc(len(chunk), stage='parse')
+                    rows += len(chunk)
+                    yield chunk
+                logger.info(f"Successfully streamed {rows} rows from {file}")
+            except Exception as e:
+                logger.error(f"Error loading {file}: {str(e)}")
+
+    def load_data(self, data_dir=DATA_DIR, stream=False, chunk_size=None):
+        """Load and preprocess data from directory into a float32 block.
+
+        With ``stream=True`` a generator of unvalidated float32 chunks is
+        returned instead of a single block, so memory stays bounded by
+        ``chunk_size`` rows. Consumers validate each chunk as they go.
+        """
         try:
-            if not os.path.exists(data_dir):
-                os.makedirs(data_dir)
-                logger.warning(f"Created data directory: {data_dir}")
+            csv_paths = self._list_csv_files(data_dir)
+            if not csv_paths:
                 return None
-            
-            csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-            if not csv_files:
-                logger.error(f"No CSV files found in {data_dir}")
-                return None
-            
+
+            if CACHE_CONFIG['enabled']:
+                feature_cache.prune()
+
+            # The first file fixes the feature set; later files are projected onto it
+            self.feature_names = None
+            if stream:
+                return self.iter_chunks(csv_paths, chunk_size)
+
             dataframes = []
-            for file in csv_files:
+            for path in csv_paths:
+                file = os.path.basename(path)
                 try:
-                    df = pd.read_csv(os.path.join(data_dir, file))
+                    with STAGE_SECONDS.time(stage='parse'):
+                        df = self._read_file(path)
+                    STAGE_ROWS.inc(len(df), stage='parse')
                     dataframes.append(df)
                     logger.info(f"Successfully loaded {file}")
                 except Exception as e:
@@ -69,68 +303,346 @@ class EnhancedAnomalyDetector:
             if not dataframes:
                 return None
             
+            import pandas as pd
             data = pd.concat(dataframes, ignore_index=True)
-            self.feature_names = data.select_dtypes(include=[np.number]).columns.tolist()
             
             return self._validate_data(data)
         except Exception as e:
             logger.error(f"Failed to load data: {str(e)}")
             return None
 
-    def train(self, data=None):
-        """Train the anomaly detection model."""
-        try:
+    def _sample_training_rows(self, chunks, size, model=None, window=None, progress=None, cancelled=None):
+        """Stream chunks once into a reservoir sample of at most ``size`` float32 rows.
+
+        Chunks are validated against ``model`` when given and only converted
+        otherwise. With a ``window`` (seconds), rows are sampled evenly per
+        time window of the flows' timestamps.
+        """
+        sampler = ReservoirSampler(size, window, MODEL_CONFIG['random_state'])
+        for chunk in chunks:
+            if cancelled is not None and cancelled():
+                raise TrainingCancelled()
+            times = None
+            if window:
+                seen = self._flow_metadata(chunk).get('seen')
+                if seen is not None:
+                    times = parse_times(seen)
+            block = self._validate_data(chunk, model) if model is not None else self._to_block(chunk)
+            sampler.add(block, times)
+            if progress is not None:
+                progress('loading', sampler.seen, None)
+
+        sample = sampler.sample()
+        if sample is not None and sampler.seen > len(sample):
+            logger.info(f"Sampled {len(sample)} of {sampler.seen} rows across {sampler.windows} window(s)")
+        return sample
+
+    def _fit_pipeline(self, train_data, progress=None, cancelled=None):
+        """Fit a new pipeline, growing the forest a few trees at a time.
+
+        Warm starts grow the same forest a single fit would, which lets
+        progress be reported and cancellation be checked between steps. Only
+        the last step computes the contamination offset, since that costs a
+        pass over the training data.
+        """
+        pipeline = self._build_pipeline()
+        forest = pipeline.named_steps['model']
+        scaled = pipeline.named_steps['scaler'].fit_transform(train_data)
+
+        total = forest.n_estimators
+        step = TRAINING_CONFIG['trees_per_step'] or total
+        contamination = forest.contamination
+        forest.set_params(warm_start=True)
+        n_trees = 0
+        while n_trees < total:
+            if cancelled is not None and cancelled():
+                raise TrainingCancelled()
+            n_trees = min(n_trees + step, total)
+            forest.set_params(n_estimators=n_trees,
+                              contamination=contamination if n_trees == total else 'auto')
+            forest.fit(scaled)
+            if progress is not None:
+                progress('fitting', n_trees, total)
+        forest.set_params(warm_start=False)
+        return pipeline
+
+    def _validation_threshold(self, pipeline, val_data):
+        """Score below which the contamination share of the validation rows falls.
+
+        Uses the forest's contamination, or ``MODEL_CONFIG['contamination']``
+        when the forest's is ``'auto'``; with neither set, 0.0 is the
+        forest's own decision boundary.
+        """
+        contamination = pipeline.named_steps['model'].contamination
+        if isinstance(contamination, str):
+            contamination = MODEL_CONFIG['contamination']
+        if isinstance(contamination, str):
+            return 0.0
+        val_scores = pipeline.decision_function(val_data)
+        return float(np.percentile(val_scores, contamination * 100))
+
+    def fit_artifact(self, data=None, progress=None, cancelled=None):
+        """Fit a model artifact without publishing it, or return None without data.
+
+        The data is streamed once into a reservoir sample of
+        ``sample_size`` rows, so the cost of a fit does not grow with the
+        archive.
+
+        ``progress(stage, done, total)`` is called as work advances and
+        ``cancelled()`` is polled between steps; when it returns True,
+        ``TrainingCancelled`` is raised.
+        """
+        # Taken before reading, so files changed mid-fit make the artifact stale
+        fingerprint = settings = None
+        if data is None:
+            fingerprint = self.training_fingerprint()
+            settings = self.settings_fingerprint()
+            data = self.load_data(stream=True)
+
+        source = data
+        if data is not None:
+            # One pass over the data, keeping a fixed-size sample to fit on
+            data = self._sample_training_rows(
+                data if self._is_chunked(data) else [data],
+                TRAINING_CONFIG['sample_size'],
+                window=TRAINING_CONFIG['stratify_window'],
+                progress=progress,
+                cancelled=cancelled
+            )
+
+        if data is None or len(data) == 0:
+            logger.error("No valid training data available")
+            return None
+
+        # Learn per-column fill values, then repair the training block with them
+        sanitizer = Sanitizer.fit(data)
+        self._record_repairs(sanitizer.transform(data))
+        schema = FeatureSchema(
+            self._training_feature_names(source, data.shape[1]),
+            fill_values={
+                'nan': sanitizer.nan_fill,
+                'posinf': sanitizer.posinf_fill,
+                'neginf': sanitizer.neginf_fill
+            }
+        )
+
+        # Split data for validation
+        from sklearn.model_selection import train_test_split
+        train_data, val_data = train_test_split(data, test_size=0.2, random_state=42)
+
+        # Fit a new pipeline so readers keep using the old one until it is published
+        logger.info("Training model...")
+        pipeline = self._fit_pipeline(train_data, progress, cancelled)
+
+        # Validate model performance
+        if progress is not None:
+            progress('validating', None, None)
+        threshold = self._validation_threshold(pipeline, val_data)
+        logger.info(f"Model trained with validation threshold: {threshold}")
+
+        return {
+            'pipeline': pipeline,
+            'threshold': float(threshold),
+            'sanitizer': sanitizer,
+            'schema': schema,
+            'fingerprint': fingerprint,
+            'settings': settings
+        }
+
+    def _recent_data(self):
+        """Chunks of the CSV files modified since the live artifact was written, or None."""
+        csv_paths = self._list_csv_files(DATA_DIR)
+        if not csv_paths:
+            return None
+        since = os.path.getmtime(self.model_manager.model_path)
+        recent = [path for path in csv_paths if os.path.getmtime(path) > since]
+        if not recent:
+            logger.error("No data has changed since the model was trained")
+            return None
+        self.feature_names = None
+        return self.iter_chunks(recent)
+
+    def refresh_artifact(self, data=None, progress=None, cancelled=None):
+        """Refresh the live model with recent data, without publishing it.
+
+        Fits ``refresh_trees`` new trees on a sample of ``data`` (by default
+        the CSV files changed since the model was written) and retires as
+        many of the oldest trees, so the forest keeps its size and follows
+        the traffic. The scaler, sanitizer and schema are kept, so old and
+        new trees see features the same way. Returns None when there is no
+        model or not enough recent data.
+        """
+        model, _ = self._current_model()
+        if model['pipeline'] is None:
+            logger.error("No trained model to refresh")
+            return None
+        fingerprint = model.get('fingerprint')
+        if data is None:
+            # The refreshed model has seen the data directory as it is now
+            fingerprint = self.training_fingerprint()
+            data = self._recent_data()
             if data is None:
-                data = self.load_data()
-            
-            if data is None or data.empty:
-                logger.error("No valid training data available")
+                return None
+
+        block = self._sample_training_rows(
+            data if self._is_chunked(data) else [data],
+            TRAINING_CONFIG['refresh_sample_size'],
+            model=model,
+            progress=progress,
+            cancelled=cancelled
+        )
+        pipeline = copy.deepcopy(model['pipeline'])
+        forest = pipeline.named_steps['model']
+        # Every tree is scored against the same max_samples_, so new trees need as many rows
+        if block is None or len(block) * 0.8 < forest.max_samples_:
+            logger.error(f"At least {int(np.ceil(forest.max_samples_ / 0.8))} recent rows are needed to refresh the model")
+            return None
+
+        from sklearn.model_selection import train_test_split
+        train_data, val_data = train_test_split(block, test_size=0.2, random_state=42)
+        scaled = pipeline.named_steps['scaler'].transform(train_data)
+        if cancelled is not None and cancelled():
+            raise TrainingCancelled()
+
+        # Oldest trees come first: warm starts append new ones at the end
+        total = len(forest.estimators_)
+        n_new = min(TRAINING_CONFIG['refresh_trees'], total)
+        forest.estimators_ = forest.estimators_[n_new:]
+        forest.estimators_features_ = forest.estimators_features_[n_new:]
+        generation = model.get('generation', 0) + 1
+        params = forest.get_params()
+        random_state = params['random_state']
+        forest.set_params(
+            n_estimators=total,
+            max_samples=forest.max_samples_,
+            warm_start=True,
+            # Settings changed since the last fit apply to the refreshed model
+            contamination=MODEL_CONFIG['contamination'],
+            # A new seed per refresh, or every refresh would grow the same trees
+            random_state=None if random_state is None else random_state + generation
+        )
+        logger.info(f"Refreshing model: replacing {n_new} of {total} trees with trees fitted on {len(train_data)} recent rows")
+        forest.fit(scaled)
+        forest.set_params(max_samples=params['max_samples'], warm_start=False, random_state=random_state)
+        if progress is not None:
+            progress('fitting', n_new, n_new)
+            progress('validating', None, None)
+        threshold = self._validation_threshold(pipeline, val_data)
+        logger.info(f"Model refreshed with validation threshold: {threshold}")
+
+        return {**model, 'pipeline': pipeline, 'threshold': float(threshold), 'generation': generation,
+                'fingerprint': fingerprint}
+
+    def train(self, data=None, progress=None, cancelled=None, refresh=False):
+        """Train the anomaly detection model on this thread and publish it.
+
+        With ``refresh=True`` the live model is refreshed with recent data
+        instead of being refitted from scratch.
+        """
+        try:
+            fit = self.refresh_artifact if refresh else self.fit_artifact
+            artifact = fit(data, progress, cancelled)
+            if artifact is None:
                 return False
-            
-            # Split data for validation
-            train_data, val_data = train_test_split(data, test_size=0.2, random_state=42)
-            
-            logger.info("Training model...")
-            self.pipeline.fit(train_data)
-            
-            # Validate model performance
-            val_scores = self.pipeline.decision_function(val_data)
-            threshold = np.percentile(val_scores, 5)  # 5% anomaly rate
-            logger.info(f"Model trained with validation threshold: {threshold}")
-            
-            # Save model and scaler
-            os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-            joblib.dump(self.pipeline, MODEL_PATH)
-            logger.info(f"Model saved to {MODEL_PATH}")
+
+            # Save model together with its threshold atomically and swap it in
+            version = self.model_manager.publish(artifact)
+            logger.info(f"Model saved to {MODEL_PATH} (version {version})")
             
             return True
+        except TrainingCancelled:
+            logger.info("Training cancelled")
+            return False
         except Exception as e:
             logger.error(f"Training failed: {str(e)}")
             return False
 
     def predict(self, new_data):
-        """Predict anomalies in new data."""
+        """Predict anomalies in new data.
+
+        ``new_data`` may be a single DataFrame/array or an iterable of chunks
+        (e.g. from ``load_data(stream=True)``), which is scored chunk by chunk.
+        """
         try:
-            if self.pipeline is None:
-                if os.path.exists(MODEL_PATH):
-                    self.pipeline = joblib.load(MODEL_PATH)
-                else:
-                    logger.error("No trained model available")
-                    return None
-            
-            new_data = self._validate_data(new_data)
-            predictions = self.pipeline.predict(new_data)
-            scores = self.pipeline.decision_function(new_data)
+            # One snapshot per call: every chunk is scored by the same model version
+            model, version = self._current_model()
+            if model['pipeline'] is None:
+                logger.error("No trained model available")
+                return None
             
-            return {
+            if not self._is_chunked(new_data):
+                meta = self._flow_metadata(new_data)
+                return self._predict_batch(model, version, self._validate_data(new_data, model), meta)
+
+            predictions = []
+            scores = []
+            batch_meta = []
+            for chunk in new_data:
+                meta = self._flow_metadata(chunk)
+                batch = self._predict_batch(model, version, self._validate_data(chunk, model), meta)
+                predictions.append(batch['predictions'])
+                scores.append(batch['scores'])
+                batch_meta.append((len(batch['anomalies']), batch))
+
+            if not predictions:
+                logger.error("No data to predict on")
+                return None
+
+            predictions = np.concatenate(predictions)
+            results = {
                 'predictions': predictions,
-                'scores': scores,
-                'anomalies': np.where(predictions == -1)[0]
+                'scores': np.concatenate(scores),
+                'anomalies': np.where(predictions == -1)[0],
+                'model_version': version
             }
+            results.update(self._merge_anomaly_metadata(batch_meta))
+            return results
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
             return None
 
+    def _flow_metadata(self, data):
+        """Source IP and timestamp columns of a batch, keyed by result name."""
+        import pandas as pd
+        if not isinstance(data, pd.DataFrame):
+            return {}
+        columns = dict(zip(normalize_columns(data.columns), data.columns))
+        meta = {}
+        for key, name in (('sources', SCHEMA_CONFIG['source_ip_column']),
+                          ('seen', SCHEMA_CONFIG['timestamp_column'])):
+            if name in columns:
+                meta[key] = data[columns[name]].to_numpy()
+        return meta
+
+    def _merge_anomaly_metadata(self, batch_meta):
+        """Concatenate per-chunk anomaly metadata, padding chunks that lacked a column."""
+        keys = {key for _, batch in batch_meta for key in batch if key.startswith('anomaly_')}
+        merged = {}
+        for key in keys:
+            merged[key] = np.concatenate([
+                batch[key] if key in batch else np.full(count, None, dtype=object)
+                for count, batch in batch_meta
+            ])
+        return merged
+
+    def _predict_batch(self, model, version, new_data, meta=None):
+        """Score a single validated batch with one pass through the pipeline."""
+        scores = self.scorer.score(model, version, new_data)
+        predictions = np.where(scores < model['threshold'], -1, 1)
+        anomalies = np.where(predictions == -1)[0]
+        ANOMALIES.inc(len(anomalies))
+
+        results = {
+            'predictions': predictions,
+            'scores': scores,
+            'anomalies': anomalies,
+            'model_version': version
+        }
+        # Keep metadata only for anomalous rows so memory tracks offenders, not traffic
+        for key, values in (meta or {}).items():
+            results[f'anomaly_{key}'] = values[anomalies]
+        return results
+
     def predict_file(self, file_path):
         """Predict anomalies from a CSV file."""
         try:
@@ -138,14 +650,14 @@ class EnhancedAnomalyDetector:
                 logger.error(f"File not found: {file_path}")
                 return None
             
-            data = pd.read_csv(file_path)
-            original_data = data.copy()
+            # predict() works on its own float32 block, so the frame needs no copy
+            import pandas as pd
+            result_df = pd.read_csv(file_path)
             
-            results = self.predict(data)
+            results = self.predict(result_df)
             if results is None:
                 return None
             
-            result_df = original_data.copy()
             result_df['anomaly_score'] = results['scores']
             result_df['is_anomaly'] = results['predictions'] == -1
             
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from config import CACHE_CONFIG, CACHE_DIR, INGEST_CONFIG
+from detector.schema import read_features
+from utils.filelock import FileLock
+from utils.logger import logger
+
+# Bumped whenever the on-disk layout or column selection changes
+CACHE_FORMAT = 4
+
+class TextColumn:
+    """Memory-mapped metadata column (source IP, timestamp) of any length and script.
+
+    Values are stored as UTF-8, each ended by a NUL byte, next to an int64
+    array of the byte offset where each row starts (plus the end). Slicing
+    decodes just the rows asked for into an array of str.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("TextColumn supports slices only")
+        start, stop, step = key.indices(len(self))
+        if stop <= start:
+            return np.empty(0, dtype=str)
+        begin, end = int(self.offsets[start]), int(self.offsets[stop])
+        values = bytes(self.blob[begin:end]).decode('utf-8').split('\0')[:-1]
+        return np.array(values[::step], dtype=str)
+
+    def astype(self, dtype):
+        return self[:].astype(dtype)
+
+class FeatureCache:
+    """On-disk float32 cache of the feature columns of each source CSV.
+
+    Every CSV is parsed once into a raw row-major float32 matrix under
+    ``CACHE_DIR``, plus one ``TextColumn`` per metadata column. An index
+    keyed by the source path records its size, mtime, content hash, column
+    names and row count; later loads memory-map the arrays instead of
+    parsing the text again.
+
+    Processes sharing the cache (training and the GUI) merge their changes
+    into the index under a lock file rather than overwriting each other's.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._index = self._read_index()
+
+    def _read_index(self):
+        """Load the cache index, starting fresh if it is missing or corrupt."""
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Discarding unreadable feature cache index: {str(e)}")
+            return {}
+
+    def _write_index(self, changed=(), removed=()):
+        """Atomically persist changed and removed entries, merged with the index on disk.
+
+        The index is reread under a lock file, so entries written by other
+        processes since this one loaded it are kept, and adopted.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with FileLock(self.index_path + ".lock"):
+            index = self._read_index()
+            for source in removed:
+                index.pop(source, None)
+            for source in changed:
+                if source in self._index:
+                    index[source] = self._index[source]
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self.index_path)
+            except BaseException:
+                self._discard([tmp_path])
+                raise
+        self._index = index
+
+    @staticmethod
+    def _discard(paths):
+        """Delete files, ignoring ones already gone."""
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _content_hash(self, path):
+        """Hash the full contents of a source file."""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(CACHE_CONFIG['hash_block_size']), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _matrix_path(self, source):
+        """Cache file location for a source path."""
+        name = hashlib.blake2b(os.fsencode(source), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.f32")
+
+    def _open(self, entry):
+        """Memory-map a cached matrix and its metadata arrays."""
+        rows = entry['rows']
+        if rows == 0:
+            matrix = np.empty((0, len(entry['columns'])), dtype=np.float32)
+            return matrix, {name: np.empty(0, dtype=str) for name in entry['meta']}
+
+        matrix = np.memmap(entry['file'], dtype=np.float32, mode='r',
+                           shape=(rows, len(entry['columns'])))
+        meta = {
+            name: TextColumn(np.memmap(blob, dtype=np.uint8, mode='r'),
+                             np.memmap(offsets, dtype=np.int64, mode='r', shape=(rows + 1,)))
+            for name, (blob, offsets) in entry['meta'].items()
+        }
+        return matrix, meta
+
+    def _is_fresh(self, source, entry, stat):
+        """Check a cache entry against the current state of its source."""
+        if entry.get('format') != CACHE_FORMAT or not os.path.exists(entry['file']):
+            return False
+        if entry['size'] != stat.st_size:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+
+        # Touched but possibly unchanged: fall back to the content hash
+        if entry['hash'] is None or self._content_hash(source) != entry['hash']:
+            return False
+        entry['mtime_ns'] = stat.st_mtime_ns
+        self._write_index(changed=[source])
+        return True
+
+    def _remove(self, source):
+        """Drop an entry and its cached files."""
+        entry = self._index.pop(source, None)
+        if entry is not None:
+            paths = [entry['file']]
+            for meta_paths in entry.get('meta', {}).values():
+                paths.extend(meta_paths if isinstance(meta_paths, list) else [meta_paths])
+            self._discard(paths)
+
+    def _build(self, source, stat, chunk_size):
+        """Parse a CSV once and write its feature columns as float32."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        matrix_path = self._matrix_path(source)
+        rows = 0
+
+        columns, chunks = read_features(source, chunksize=chunk_size)
+        meta_paths = {}     # name -> [values path, offsets path]
+        outputs = {}
+        written = {}        # name -> bytes of values written so far
+        # Per process, so two processes caching the same file do not write into one another's
+        suffix = f".{os.getpid()}.tmp"
+        tmp_paths = [matrix_path + suffix]
+        try:
+            try:
+                outputs[None] = open(tmp_paths[0], "wb")
+                for chunk in chunks:
+                    if rows == 0:
+                        for i, name in enumerate(chunk.columns[len(columns):]):
+                            meta_paths[name] = [f"{matrix_path[:-4]}.meta{i}", f"{matrix_path[:-4]}.meta{i}.idx"]
+                            tmp_paths.extend(path + suffix for path in meta_paths[name])
+                            outputs[name] = [open(path + suffix, "wb") for path in meta_paths[name]]
+                            written[name] = 0
+                            np.zeros(1, dtype=np.int64).tofile(outputs[name][1])
+                    np.ascontiguousarray(chunk[columns].to_numpy(dtype=np.float32)).tofile(outputs[None])
+                    for name in meta_paths:
+                        values = chunk[name].fillna('').astype(str).str.replace('\0', '', regex=False)
+                        blob = ('\0'.join(values) + '\0').encode('utf-8') if len(values) else b""
+                        ends = np.flatnonzero(np.frombuffer(blob, dtype=np.uint8) == 0) + 1 + written[name]
+                        outputs[name][0].write(blob)
+                        ends.astype(np.int64).tofile(outputs[name][1])
+                        written[name] += len(blob)
+                    rows += len(chunk)
+            finally:
+                for out in outputs.values():
+                    for f in (out if isinstance(out, list) else [out]):
+                        f.close()
+
+            os.replace(tmp_paths[0], matrix_path)
+            for paths in meta_paths.values():
+                for path in paths:
+                    os.replace(path + suffix, path)
+        except BaseException:
+            # A parse error or full disk leaves no partial files behind
+            self._discard(tmp_paths)
+            raise
+
+        # The stat was taken before parsing; a file that changed since must not be vouched for by its hash
+        content_hash = self._content_hash(source)
+        after = os.stat(source)
+        if (after.st_size, after.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            logger.info(f"{os.path.basename(source)} changed while it was cached; it will be parsed again")
+            content_hash = None
+
+        self._index[source] = {
+            'format': CACHE_FORMAT,
+            'file': matrix_path,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': content_hash,
+            'columns': columns,
+            'meta': meta_paths,
+            'rows': rows
+        }
+        self._write_index(changed=[source])
+        logger.info(f"Cached {rows} rows from {os.path.basename(source)}")
+
+    def load(self, path, chunk_size=None):
+        """Return ``(matrix, columns, meta)`` for a CSV, building the cache if stale.
+
+        ``meta`` maps each metadata column name to a ``TextColumn``.
+        """
+        if chunk_size is None:
+            chunk_size = INGEST_CONFIG['chunk_size']
+
+        source = os.path.abspath(path)
+        stat = os.stat(source)
+        with self._lock:
+            entry = self._index.get(source)
+            if entry is None or not self._is_fresh(source, entry, stat):
+                if entry is not None:
+                    logger.info(f"Source changed, rebuilding cache for {os.path.basename(source)}")
+                    self._remove(source)
+                self._build(source, stat, chunk_size)
+                entry = self._index[source]
+            matrix, meta = self._open(entry)
+            return matrix, entry['columns'], meta
+
+    def evict(self, path):
+        """Drop the cache of one source file, so its next load parses it again."""
+        with self._lock:
+            source = os.path.abspath(path)
+            if source in self._index:
+                self._remove(source)
+                self._write_index(removed=[source])
+
+    def prune(self):
+        """Evict entries whose source file no longer exists."""
+        with self._lock:
+            missing = [source for source in self._index if not os.path.exists(source)]
+            for source in missing:
+                self._remove(source)
+                logger.info(f"Evicted feature cache for missing {source}")
+            if missing:
+                self._write_index(removed=missing)
+            return len(missing)
+
+# Create a singleton instance
+feature_cache = FeatureCache()
@@ -0,0 +1,109 @@
+import csv
+import io
+import os
+import numpy as np
+from config import DATA_DIR, MONITOR_CONFIG
+from detector.schema import column_positions, feature_columns, meta_columns, normalize_columns
+from utils.logger import logger
+from utils.metrics import STAGE_SECONDS, STAGE_ROWS
+
+class IncrementalReader:
+    """Tail CSV files in a directory, returning only rows not seen before.
+
+    A per-file watermark records the byte offset of the last complete line
+    consumed and the number of data rows read so far. Truncated or replaced
+    files are read again from the start.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, feature_names=None):
+        self.data_dir = data_dir
+        self.feature_names = feature_names
+        self.watermarks = {}
+
+    def _csv_paths(self):
+        """List CSV files in the data directory."""
+        if not os.path.isdir(self.data_dir):
+            return []
+        return [
+            os.path.join(self.data_dir, f)
+            for f in sorted(os.listdir(self.data_dir))
+            if f.endswith('.csv')
+        ]
+
+    def _watermark(self, path, stat):
+        """Current watermark for a file, reset if it was truncated or replaced."""
+        mark = self.watermarks.get(path)
+        if mark is None or mark['inode'] != stat.st_ino or stat.st_size < mark['offset']:
+            if mark is not None:
+                logger.info(f"{os.path.basename(path)} was replaced, rereading from start")
+            mark = {'inode': stat.st_ino, 'offset': 0, 'rows': 0, 'columns': None, 'usecols': None, 'features': None, 'dtype': None, 'loose_dtype': None}
+            self.watermarks[path] = mark
+        return mark
+
+    def iter_new(self, block_size=None):
+        """Yield feature frames (plus metadata columns) of rows appended since the last call.
+
+        Each frame is indexed by the row number within its source file. The
+        watermark only advances once the consumer asks for the next frame.
+        """
+        import pandas as pd
+        if block_size is None:
+            block_size = MONITOR_CONFIG['read_block_size']
+
+        for path in self._csv_paths():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            mark = self._watermark(path, stat)
+            if stat.st_size == mark['offset']:
+                continue
+
+            with open(path, 'rb') as f:
+                f.seek(mark['offset'])
+                while True:
+                    data = f.read(block_size)
+                    if not data:
+                        break
+                    end = data.rfind(b'\n')
+                    if end < 0:
+                        if len(data) < block_size:
+                            # Only a partial line has been written so far
+                            break
+                        data += f.readline()
+                        end = data.rfind(b'\n')
+                        if end < 0:
+                            break
+                    f.seek(mark['offset'] + end + 1)
+                    body = data[:end + 1]
+                    offset = mark['offset'] + end + 1
+
+                    if mark['columns'] is None:
+                        header, _, body = body.partition(b'\n')
+                        columns = normalize_columns(next(csv.reader([header.decode('utf-8-sig')])))
+                        features = self.feature_names or feature_columns(columns)
+                        order = list(features) + meta_columns(columns)
+                        mark['usecols'] = column_positions(columns, order, path)
+                        mark['columns'] = columns
+                        mark['features'] = order
+                        mark['loose_dtype'] = dict.fromkeys(order[len(features):], str)
+                        mark['dtype'] = {**dict.fromkeys(features, np.float32), **mark['loose_dtype']}
+
+                    if body.strip():
+                        options = dict(header=None, names=mark['columns'], usecols=mark['usecols'])
+                        with STAGE_SECONDS.time(stage='parse'):
+                            try:
+                                chunk = pd.read_csv(io.BytesIO(body), dtype=mark['dtype'], **options)
+                            except ValueError:
+                                # Stray text in a numeric column: treat it as missing rather than rereading these bytes forever
+                                logger.warning(f"Non-numeric values in {os.path.basename(path)}, coercing them to NaN")
+                                chunk = pd.read_csv(io.BytesIO(body), dtype=mark['loose_dtype'], **options)
+                                features = [name for name in mark['features'] if name not in mark['loose_dtype']]
+                                chunk[features] = chunk[features].apply(pd.to_numeric, errors='coerce').astype(np.float32)
+                            chunk = chunk[mark['features']]
+                        STAGE_ROWS.inc(len(chunk), stage='parse')
+                        chunk.index = pd.RangeIndex(mark['rows'], mark['rows'] + len(chunk))
+                        yield chunk
+                        mark['rows'] += len(chunk)
+                    mark['offset'] = offset
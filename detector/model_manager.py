@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+import time
+from config import INFERENCE_CONFIG, MODEL_PATH
+from utils.logger import logger
+from utils.metrics import metrics
+
+MODEL_INFO = metrics.gauge('shcs_model_info', "Version of the live model (always 1)", ('version',))
+MODEL_RELOADS = metrics.counter('shcs_model_reloads_total', "Model versions swapped in")
+
+class ModelManager:
+    """Keep one loaded model in memory and hot-swap it when the artifact changes.
+
+    Readers call ``current()`` and get a ``(model, version)`` pair taken from
+    a single reference, so a swap is atomic from their point of view. The
+    artifact is checked by mtime/size at most every ``reload_check_interval``
+    seconds; a change is confirmed by content hash and the new artifact is
+    loaded on a background thread while readers keep the previous one.
+    """
+
+    def __init__(self, model_path=MODEL_PATH):
+        self.model_path = model_path
+        self._current = None       # (model, version)
+        self._stat = None          # (mtime_ns, size) of the loaded artifact
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._loader = None
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.model_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _file_hash(self):
+        digest = hashlib.blake2b(digest_size=8)
+        with open(self.model_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def reload(self):
+        """Load the artifact if it changed since the last load; return True on swap."""
+        with self._lock:
+            stat = self._file_stat()
+            if stat is None or stat == self._stat:
+                return False
+
+            version = self._file_hash()
+            if self._current is not None and version == self._current[1]:
+                self._stat = stat
+                return False
+
+            import joblib
+            model = joblib.load(self.model_path)
+            self._set_current(model, version)
+            self._stat = stat
+            logger.info(f"Loaded model version {version} from {self.model_path}")
+            return True
+
+    def _set_current(self, model, version):
+        self._current = (model, version)
+        MODEL_INFO.clear()
+        MODEL_INFO.set(1, version=version)
+        MODEL_RELOADS.inc()
+
+    def _reload_in_background(self):
+        def run():
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Model reload failed, keeping previous version: {str(e)}")
+
+        if self._loader is None or not self._loader.is_alive():
+            self._loader = threading.Thread(target=run, name="model-reload", daemon=True)
+            self._loader.start()
+
+    def current(self):
+        """Return ``(model, version)``, or ``(None, None)`` if no artifact exists."""
+        if self._current is None:
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Failed to load model: {str(e)}")
+            return self._current or (None, None)
+
+        now = time.monotonic()
+        if now - self._last_check >= INFERENCE_CONFIG['reload_check_interval']:
+            self._last_check = now
+            if self._file_stat() != self._stat:
+                self._reload_in_background()
+        return self._current
+
+    def publish(self, model):
+        """Atomically write a new artifact and make it the live model."""
+        import joblib
+        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        tmp_path = f"{self.model_path}.{os.getpid()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, self.model_path)
+
+        with self._lock:
+            self._stat = self._file_stat()
+            version = self._file_hash()
+            self._set_current(model, version)
+        logger.info(f"Published model version {version} to {self.model_path}")
+        return version
+
+    def install(self, path):
+        """Atomically move an artifact written elsewhere into place and make it the live model."""
+        os.replace(path, self.model_path)
+        self.reload()
+        version = self._current[1]
+        logger.info(f"Published model version {version} to {self.model_path}")
+        return version
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import INFERENCE_CONFIG
+from utils.logger import logger
+from utils.metrics import STAGE_SECONDS, STAGE_ROWS
+
+# Model held by each worker process, installed once by the pool initializer
+_worker_model = None
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+def _score_shard(shard):
+    return _worker_model['pipeline'].decision_function(shard)
+
+class ParallelScorer:
+    """Score large batches by splitting them into row shards across processes.
+
+    Each worker receives its own read-only copy of the model once, when the
+    pool starts; shards are scored independently and concatenated back in
+    their original row order. The pool is rebuilt when the model version
+    changes.
+    """
+
+    def __init__(self, n_workers=None, shard_size=None):
+        if n_workers is None:
+            n_workers = INFERENCE_CONFIG['n_workers']
+        if n_workers <= 0:
+            n_workers = os.cpu_count() or 1
+        self.n_workers = n_workers
+        self.shard_size = shard_size or INFERENCE_CONFIG['shard_size']
+        self._pool = None
+        self._version = None
+
+    def _pool_for(self, model, version):
+        """Return a pool whose workers hold ``model``."""
+        if self._pool is None or self._version != version:
+            self.close()
+            # Forking would copy the locks of the logging, metrics and reload threads in whatever state they are in
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=multiprocessing.get_context(INFERENCE_CONFIG['start_method']),
+                initializer=_init_worker,
+                initargs=(model,)
+            )
+            self._version = version
+            logger.info(f"Started {self.n_workers} scoring workers for model version {version}")
+        return self._pool
+
+    def score(self, model, version, data):
+        """Return decision scores for ``data`` in row order."""
+        n_rows = len(data)
+        STAGE_ROWS.inc(n_rows, stage='score')
+        if self.n_workers <= 1 or n_rows <= self.shard_size:
+            # Same as pipeline.decision_function, with scaling and scoring timed apart
+            pipeline = model['pipeline']
+            with STAGE_SECONDS.time(stage='scale'):
+                scaled = pipeline[:-1].transform(data)
+            with STAGE_SECONDS.time(stage='score'):
+                return pipeline[-1].decision_function(scaled)
+
+        # Workers scale and score in one call, so the whole fan-out counts as scoring
+        with STAGE_SECONDS.time(stage='score'):
+            pool = self._pool_for(model, version)
+            shards = [data[start:start + self.shard_size] for start in range(0, n_rows, self.shard_size)]
+            return np.concatenate(list(pool.map(_score_shard, shards)))
+
+    def close(self):
+        """Shut down the worker pool."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._version = None
@@ -0,0 +1,132 @@
+import numpy as np
+
+def parse_times(values):
+    """Unix times of timestamp strings, NaN where a value does not parse."""
+    import pandas as pd
+    times = pd.to_datetime(pd.Series(values), errors='coerce')
+    return ((times - pd.Timestamp(0)) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+class _Reservoir:
+    """Uniform sample of at most ``capacity`` rows of one stream (Algorithm R)."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.rows = None
+        self.filled = 0
+        self.seen = 0
+
+    def _reserve(self, needed, n_features):
+        """Grow the row buffer geometrically, never past ``capacity``."""
+        if self.rows is None:
+            self.rows = np.empty((min(needed, self.capacity), n_features), dtype=np.float32)
+        elif needed > len(self.rows):
+            rows = np.empty((min(max(needed, 2 * len(self.rows)), self.capacity), n_features), dtype=np.float32)
+            rows[:self.filled] = self.rows[:self.filled]
+            self.rows = rows
+
+    def add(self, block, rng):
+        n = len(block)
+        if n == 0:
+            return
+        take = min(self.capacity - self.filled, n)
+        if take:
+            self._reserve(self.filled + take, block.shape[1])
+            self.rows[self.filled:self.filled + take] = block[:take]
+            self.filled += take
+
+        rest = n - take
+        if rest:
+            # Row t of the stream (0-based) replaces a random slot with probability capacity / (t + 1)
+            slots = rng.integers(0, self.seen + take + np.arange(1, rest + 1))
+            accepted = np.flatnonzero(slots < self.capacity)
+            if len(accepted):
+                slots = slots[accepted]
+                # A later row wins a slot drawn more than once, as it would one row at a time
+                _, last = np.unique(slots[::-1], return_index=True)
+                keep = len(slots) - 1 - last
+                self.rows[slots[keep]] = block[take + accepted[keep]]
+        self.seen += n
+
+    def shrink(self, capacity, rng):
+        """Reduce to ``capacity`` rows; a uniform subset of a uniform sample stays uniform."""
+        if capacity >= self.capacity:
+            return
+        if self.filled > capacity:
+            self.rows = self.rows[np.sort(rng.choice(self.filled, capacity, replace=False))]
+            self.filled = capacity
+        elif self.rows is not None and len(self.rows) > capacity:
+            self.rows = self.rows[:capacity].copy()
+        self.capacity = capacity
+
+class ReservoirSampler:
+    """Keep a fixed-size uniform sample of an unbounded stream of row blocks.
+
+    Every row seen has the same chance of being in the sample, and memory
+    stays at ``size`` rows however long the stream is, so fitting on the
+    sample costs the same whether the archive holds a day or a year.
+
+    With a ``window`` (seconds), rows are grouped by time window and every
+    window gets an equal share of the sample, so busy periods do not crowd
+    out quiet ones. Each window keeps its own reservoir, sized to its share
+    when it appears; older windows are thinned to the current share in one
+    pass once the rows held reach twice the sample size, and before the
+    sample is taken. Rows without a valid time share one extra group.
+    """
+
+    def __init__(self, size, window=None, seed=None):
+        self.size = size
+        self.window = window
+        self._rng = np.random.default_rng(seed)
+        self._strata = {}   # window number, or None for rows without a time -> _Reservoir
+        self._held = 0      # Rows held across all reservoirs
+
+    @property
+    def seen(self):
+        """Rows offered to the sampler so far."""
+        return sum(reservoir.seen for reservoir in self._strata.values())
+
+    @property
+    def windows(self):
+        return len(self._strata)
+
+    def _offer(self, key, block):
+        reservoir = self._strata.get(key)
+        if reservoir is None:
+            reservoir = self._strata[key] = _Reservoir(max(1, self.size // (len(self._strata) + 1)))
+        filled = reservoir.filled
+        reservoir.add(block, self._rng)
+        self._held += reservoir.filled - filled
+        if self._held > 2 * max(self.size, len(self._strata)):
+            self._rebalance()
+
+    def _rebalance(self):
+        """Thin every window's reservoir to an equal share of the sample."""
+        quota = max(1, self.size // max(len(self._strata), 1))
+        for reservoir in self._strata.values():
+            reservoir.shrink(quota, self._rng)
+        self._held = sum(reservoir.filled for reservoir in self._strata.values())
+
+    def add(self, block, times=None):
+        """Offer a float32 block of rows, with their Unix times when stratifying."""
+        if self.window is None or times is None:
+            self._offer(None, block)
+            return
+
+        keys = np.floor(np.asarray(times, dtype=np.float64) / self.window)
+        known = ~np.isnan(keys)
+        if not known.all():
+            self._offer(None, block[~known])
+        for key in np.unique(keys[known]):
+            self._offer(int(key), block[keys == key])
+
+    def sample(self):
+        """The sampled rows as one block, oldest window first, or None if nothing was seen."""
+        self._rebalance()
+        parts = [
+            self._strata[key].rows[:self._strata[key].filled]
+            for key in sorted(self._strata, key=lambda key: (key is None, key))
+            if self._strata[key].filled
+        ]
+        if not parts:
+            return None
+        return np.concatenate(parts)
@@ -0,0 +1,60 @@
+import numpy as np
+
+class Sanitizer:
+    """Replace NaN and +/-inf cells of a float32 feature block in place.
+
+    Fill values are per column: the median for NaN and the largest/smallest
+    finite value for +inf/-inf, all learned from the training data. An
+    unfitted sanitizer fills NaN with 0 and infinities with the batch's own
+    finite column max/min.
+    """
+
+    def __init__(self, nan_fill=None, posinf_fill=None, neginf_fill=None):
+        self.nan_fill = nan_fill
+        self.posinf_fill = posinf_fill
+        self.neginf_fill = neginf_fill
+
+    @classmethod
+    def fit(cls, block):
+        """Learn fill values from the finite cells of a training block."""
+        finite = np.where(np.isfinite(block), block, np.nan)
+        empty = np.all(np.isnan(finite), axis=0)
+        finite[:, empty] = 0  # Columns without a finite value fall back to 0
+        return cls(
+            nan_fill=np.nanmedian(finite, axis=0).astype(np.float32),
+            posinf_fill=np.nanmax(finite, axis=0).astype(np.float32),
+            neginf_fill=np.nanmin(finite, axis=0).astype(np.float32)
+        )
+
+    def _fills(self, block, cols):
+        """Fill vectors for the given columns, falling back to batch statistics."""
+        if self.nan_fill is not None:
+            return self.nan_fill[cols], self.posinf_fill[cols], self.neginf_fill[cols]
+
+        finite = np.where(np.isfinite(block[:, cols]), block[:, cols], np.nan)
+        with np.errstate(all='ignore'):
+            posinf = np.nan_to_num(np.nanmax(finite, axis=0), nan=0.0)
+            neginf = np.nan_to_num(np.nanmin(finite, axis=0), nan=0.0)
+        return np.zeros(len(cols), dtype=block.dtype), posinf, neginf
+
+    def transform(self, block):
+        """Repair ``block`` in place; return counts of NaN, +inf and -inf cells fixed."""
+        bad = ~np.isfinite(block)
+        if not bad.any():
+            return 0, 0, 0
+
+        rows, cols = np.nonzero(bad)
+        values = block[rows, cols]
+        is_nan = np.isnan(values)
+        is_pos = values > 0
+
+        bad_cols, col_pos = np.unique(cols, return_inverse=True)
+        nan_fill, posinf_fill, neginf_fill = self._fills(block, bad_cols)
+        block[rows, cols] = np.where(
+            is_nan, nan_fill[col_pos],
+            np.where(is_pos, posinf_fill[col_pos], neginf_fill[col_pos])
+        )
+
+        n_nan = int(is_nan.sum())
+        n_pos = int(is_pos.sum())
+        return n_nan, n_pos, len(values) - n_nan - n_pos
@@ -0,0 +1,153 @@
+import csv
+import re
+import numpy as np
+from config import SCHEMA_CONFIG
+from utils.logger import logger
+
+DUPLICATE_SUFFIX = re.compile(r"^(.*)\.(\d+)$")
+
+class SchemaMismatchError(ValueError):
+    """Incoming data does not provide the features a model was trained on."""
+
+def normalize_columns(names):
+    """Strip and collapse whitespace in column names, suffixing repeats as pandas does.
+
+    ``" Destination Port"`` becomes ``"Destination Port"`` and a second
+    ``"Fwd Header Length"`` becomes ``"Fwd Header Length.1"``.
+    """
+    seen = {}
+    columns = []
+    for name in names:
+        name = " ".join(str(name).split())
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        columns.append(name if count == 0 else f"{name}.{count}")
+    return columns
+
+def read_header(path):
+    """Return the normalized column names of a CSV file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return normalize_columns(next(csv.reader(f), []))
+
+def feature_columns(columns):
+    """Pick model features from normalized columns.
+
+    Excluded columns (the ``Label``) are dropped, as are duplicated columns
+    such as ``Fwd Header Length.1`` whose base column is also present.
+    """
+    present = set(columns)
+    excluded = set(SCHEMA_CONFIG['exclude_columns'])
+    features = []
+    for name in columns:
+        if name in excluded:
+            continue
+        match = DUPLICATE_SUFFIX.match(name)
+        if match and match.group(1) in present:
+            continue
+        features.append(name)
+    return features
+
+def column_positions(columns, feature_names, source="input"):
+    """Positions of ``feature_names`` within ``columns``; reject missing features."""
+    index = {name: i for i, name in enumerate(columns)}
+    missing = [name for name in feature_names if name not in index]
+    if missing:
+        raise SchemaMismatchError(f"{source} is missing feature columns: {missing}")
+    return [index[name] for name in feature_names]
+
+class FeatureSchema:
+    """Names, order, dtypes and fill values of the features a model was trained on.
+
+    The schema is saved inside the model artifact. Each distinct incoming
+    header is compiled once into an integer index array, so aligning a batch
+    is a single column gather instead of name-based reindexing.
+    """
+
+    def __init__(self, names, dtypes=None, fill_values=None):
+        self.names = list(names)
+        self.dtypes = list(dtypes) if dtypes is not None else ['float32'] * len(self.names)
+        self.fill_values = fill_values or {}
+        self._compiled = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_compiled'] = {}
+        return state
+
+    def compile(self, columns):
+        """Index array mapping incoming ``columns`` onto the schema, or None if already aligned."""
+        key = tuple(columns)
+        if key not in self._compiled:
+            positions = column_positions(normalize_columns(key), self.names)
+            identity = positions == list(range(len(key)))
+            self._compiled[key] = None if identity else np.asarray(positions, dtype=np.intp)
+        return self._compiled[key]
+
+    def align(self, data):
+        """Project and reorder a DataFrame or array onto the schema as float32."""
+        import pandas as pd
+        if isinstance(data, pd.DataFrame):
+            index = self.compile(data.columns)
+            if index is not None:
+                data = data.iloc[:, index]
+            return data.to_numpy(dtype=np.float32)
+
+        data = np.asarray(data)
+        if data.ndim != 2 or data.shape[1] != len(self.names):
+            raise SchemaMismatchError(
+                f"Expected {len(self.names)} feature columns, got array of shape {data.shape}"
+            )
+        return data
+
+def meta_columns(columns):
+    """Flow metadata columns (source IP, timestamp) present in ``columns``."""
+    wanted = [SCHEMA_CONFIG['source_ip_column'], SCHEMA_CONFIG['timestamp_column']]
+    return [name for name in wanted if name in columns]
+
+def _coerce(chunk, feature_names, order):
+    """Parse a chunk with stray non-numeric feature cells as float32, treating them as NaN."""
+    import pandas as pd
+    chunk[feature_names] = chunk[feature_names].apply(pd.to_numeric, errors='coerce').astype(np.float32)
+    return chunk[order]
+
+def read_features(path, feature_names=None, chunksize=None):
+    """Read only the feature columns of a CSV, parsed straight to float32.
+
+    Returns ``(feature_names, data)`` where ``data`` is a DataFrame, or an
+    iterator of DataFrames when ``chunksize`` is given, with columns in
+    ``feature_names`` order followed by any metadata columns as strings.
+    """
+    import pandas as pd
+    columns = read_header(path)
+    if feature_names is None:
+        feature_names = feature_columns(columns)
+    meta = meta_columns(columns)
+    order = list(feature_names) + meta
+    usecols = column_positions(columns, order, source=path)
+    options = dict(header=0, names=columns, usecols=usecols, engine='c')
+    dtype = dict.fromkeys(feature_names, np.float32)
+    dtype.update(dict.fromkeys(meta, str))
+    loose_dtype = dict.fromkeys(meta, str)
+
+    if chunksize is None:
+        try:
+            data = pd.read_csv(path, dtype=dtype, **options)
+        except ValueError:
+            logger.warning(f"Non-numeric values in {path}, coercing them to NaN")
+            return feature_names, _coerce(pd.read_csv(path, dtype=loose_dtype, **options), feature_names, order)
+        return feature_names, data[order]
+
+    def chunks():
+        rows = 0
+        try:
+            for chunk in pd.read_csv(path, dtype=dtype, chunksize=chunksize, **options):
+                rows += len(chunk)
+                yield chunk[order]
+        except ValueError:
+            # Resume after the rows already delivered, without the strict dtype
+            logger.warning(f"Non-numeric values in {path}, coercing them to NaN")
+            skip = range(1, rows + 1)
+            for chunk in pd.read_csv(path, dtype=loose_dtype, chunksize=chunksize, skiprows=skip, **options):
+                yield _coerce(chunk, feature_names, order)
+
+    return feature_names, chunks()
@@ -0,0 +1,191 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from config import MODEL_CONFIG, TRAINING_CONFIG
+from detector.anomaly_detector import anomaly_detector, TrainingCancelled
+from utils.logger import logger
+from utils.metrics import metrics
+
+TRAINING_JOBS = metrics.counter('shcs_training_jobs_total', "Training jobs finished, by outcome", ('status',))
+TRAINING_SECONDS = metrics.gauge('shcs_training_last_seconds', "Run time of the last finished training job")
+
+def _run_job(messages, cancel, artifact_path, model_config, mode):
+    """Training process body: fit an artifact, write it to ``artifact_path`` and report back."""
+    # The parent's settings may differ from the config this process imported
+    MODEL_CONFIG.update(model_config)
+
+    def progress(stage, done=None, total=None):
+        messages.put(('progress', stage, done, total))
+
+    try:
+        fit = anomaly_detector.refresh_artifact if mode == 'refresh' else anomaly_detector.fit_artifact
+        artifact = fit(progress=progress, cancelled=cancel.is_set)
+        if artifact is None:
+            messages.put(('failed', "No model was produced; see the log for details"))
+            return
+        progress('saving')
+        import joblib
+        joblib.dump(artifact, artifact_path)
+        messages.put(('done', [anomaly_detector.repair_counts[key] for key in ('nan', 'posinf', 'neginf')]))
+    except TrainingCancelled:
+        messages.put(('cancelled',))
+    except Exception as e:
+        messages.put(('failed', str(e)))
+
+class TrainingJob:
+    """Fit a model in a separate process and publish it when it is done.
+
+    The process loads the training data, fits the pipeline and writes the
+    artifact next to the model file; the parent then moves it into place
+    with one rename and swaps it into ``detector``'s model manager, so
+    detection keeps serving the previous model until that moment. A watcher
+    thread relays ``on_progress(job, stage, done, total)`` as the process
+    reports it and calls ``on_finish(job)`` once, whatever the outcome.
+    Both run on the watcher thread.
+
+    ``mode`` is ``"full"`` to fit a new model or ``"refresh"`` to refresh
+    the live one with recent data.
+    """
+
+    def __init__(self, detector=None, on_progress=None, on_finish=None, mode='full'):
+        self.detector = detector or anomaly_detector
+        self.mode = mode
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.status = 'pending'     # pending, running, succeeded, failed or cancelled
+        self.stage = None
+        self.error = None
+        self.version = None
+        self.timings = {}           # Seconds spent in each stage
+        self.started = None
+        self.finished = None
+        self._process = None
+        self._cancel = None
+        self._cancel_time = None
+        self._done = threading.Event()
+        model_path = self.detector.model_manager.model_path
+        self._artifact_path = f"{model_path}.train-{os.getpid()}-{id(self)}.tmp"
+
+    @property
+    def running(self):
+        return self.status == 'running'
+
+    @property
+    def elapsed(self):
+        """Seconds since the job started, or its total run time once finished."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def start(self):
+        """Start the training process and the thread watching it."""
+        context = multiprocessing.get_context(TRAINING_CONFIG['start_method'])
+        messages = context.Queue()
+        self._cancel = context.Event()
+        self._process = context.Process(
+            target=_run_job,
+            args=(messages, self._cancel, self._artifact_path, dict(MODEL_CONFIG), self.mode),
+            name="model-training",
+            # Not a daemon, so the fit may still use its own worker processes
+            daemon=False
+        )
+        self.status = 'running'
+        self.started = self._stage_start = time.monotonic()
+        self._process.start()
+        atexit.register(self._terminate)
+        logger.info(f"Started training job in process {self._process.pid}")
+        threading.Thread(target=self._watch, args=(messages,), name="training-watcher", daemon=True).start()
+        return self
+
+    def cancel(self):
+        """Ask the job to stop; it is terminated if it has not stopped within the grace period."""
+        if self.running and self._cancel_time is None:
+            self._cancel.set()
+            self._cancel_time = time.monotonic()
+            logger.info("Cancelling training job")
+
+    def _terminate(self):
+        """Stop the training process when the interpreter exits."""
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; return True if a new model was published."""
+        self._done.wait(timeout)
+        return self.status == 'succeeded'
+
+    def _enter_stage(self, stage):
+        now = time.monotonic()
+        if self.stage is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + now - self._stage_start
+        self.stage = stage
+        self._stage_start = now
+
+    def _watch(self, messages):
+        outcome = None
+        exited = False
+        try:
+            while outcome is None:
+                try:
+                    message = messages.get(timeout=0.2)
+                except queue.Empty:
+                    if self._cancel_time is not None and \
+                            time.monotonic() - self._cancel_time >= TRAINING_CONFIG['cancel_grace']:
+                        self._process.terminate()
+                        outcome = ('cancelled',)
+                    elif exited:
+                        # A whole timeout has passed since it exited, so no final message is coming
+                        outcome = ('failed', f"Training process exited with code {self._process.exitcode}")
+                    else:
+                        exited = not self._process.is_alive()
+                    continue
+
+                if message[0] != 'progress':
+                    outcome = message
+                    continue
+                _, stage, done, total = message
+                if stage != self.stage:
+                    self._enter_stage(stage)
+                if self.on_progress is not None:
+                    self.on_progress(self, stage, done, total)
+
+            if outcome[0] == 'done':
+                self._enter_stage('publishing')
+                self.version = self.detector.model_manager.install(self._artifact_path)
+                self.detector._record_repairs(outcome[1])
+                self.status = 'succeeded'
+            elif outcome[0] == 'cancelled':
+                self.status = 'cancelled'
+            else:
+                self.status = 'failed'
+                self.error = outcome[1]
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+        finally:
+            self._enter_stage(None)
+            self._process.join(timeout=TRAINING_CONFIG['cancel_grace'])
+            atexit.unregister(self._terminate)
+            if os.path.exists(self._artifact_path):
+                os.remove(self._artifact_path)
+            self.finished = time.monotonic()
+            TRAINING_JOBS.inc(status=self.status)
+            TRAINING_SECONDS.set(self.elapsed)
+
+        timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.timings.items())
+        if self.status == 'succeeded':
+            logger.info(f"Training job published model version {self.version} in {self.elapsed:.1f}s ({timings})")
+        elif self.status == 'cancelled':
+            logger.info(f"Training job cancelled after {self.elapsed:.1f}s")
+        else:
+            logger.error(f"Training job failed: {self.error}")
+
+        self._done.set()
+        if self.on_finish is not None:
+            try:
+                self.on_finish(self)
+            except Exception as e:
+                logger.error(f"Training completion handler failed: {str(e)}")
@@ -1,13 +1,15 @@
-import os
+from security.firewall import firewall
 
 def block_ip(ip_address):
     """
-    Blocks the IP using iptables.
+    Blocks the IP through the configured firewall backend.
     """
     try:
         print(f"[FIREWALL] Blocking IP: {ip_address}")
-        # Run iptables command to block the IP address
-        os.system(f"sudo iptables -A INPUT -s {ip_address} -j DROP")
-        print(f"Blocked IP: {ip_address}")
+        # Queue the block; batching backends apply it in one transaction
+        if firewall.block(ip_address):
+            print(f"Blocked IP: {ip_address}")
+        else:
+            print(f"[ERROR] Failed to block IP {ip_address}")
     except Exception as e:
         print(f"[ERROR] Failed to block IP {ip_address}: {e}")
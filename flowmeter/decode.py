@@ -0,0 +1,100 @@
+import struct
+
+TCP = 6
+UDP = 17
+
+# Link-layer header types (tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+VLAN_TAGS = (0x8100, 0x88a8, 0x9100)
+IPV6_EXTENSIONS = (0, 43, 44, 51, 60)  # Hop-by-hop, routing, fragment, AH and destination options headers
+
+_ports = struct.Struct('!HH')
+_tcp = struct.Struct('!HHIIBBH')
+
+def _network(linktype, frame):
+    """Offset of the IP header in ``frame``, or -1 if it does not carry IPv4/IPv6."""
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype = frame[12] << 8 | frame[13]
+        while ethertype in VLAN_TAGS:
+            offset += 4
+            ethertype = frame[offset] << 8 | frame[offset + 1]
+        return offset + 2 if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else -1
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16 if frame[14] << 8 | frame[15] in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else -1
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20 if frame[0] << 8 | frame[1] in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else -1
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        # Address family in host (NULL) or network (LOOP) byte order; only its low byte matters
+        family = frame[0] or frame[3]
+        return 4 if family in (2, 10, 24, 28, 30) else -1
+    return -1
+
+def decode(linktype, frame):
+    """``(src, dst, sport, dport, proto, payload, header, flags, window)`` of a TCP/UDP packet, else None.
+
+    Addresses are the raw 4 or 16 address bytes. Payload size comes from
+    the IP length fields rather than the captured bytes, so captures taken
+    with a small snap length still give true sizes. ``header`` is the
+    transport header length, ``flags`` the TCP flag byte and ``window`` the
+    TCP window; both are 0 for UDP.
+    Non-first IP fragments and other protocols are skipped.
+    """
+    try:
+        offset = _network(linktype, frame)
+        if offset < 0:
+            return None
+        version = frame[offset] >> 4
+        if version == 4:
+            ihl = (frame[offset] & 0x0f) * 4
+            if frame[offset + 6] & 0x1f or frame[offset + 7]:
+                return None
+            proto = frame[offset + 9]
+            remaining = (frame[offset + 2] << 8 | frame[offset + 3]) - ihl
+            src = frame[offset + 12:offset + 16]
+            dst = frame[offset + 16:offset + 20]
+            offset += ihl
+        elif version == 6:
+            proto = frame[offset + 6]
+            remaining = frame[offset + 4] << 8 | frame[offset + 5]
+            src = frame[offset + 8:offset + 24]
+            dst = frame[offset + 24:offset + 40]
+            offset += 40
+            while proto in IPV6_EXTENSIONS:
+                if proto == 44:
+                    if (frame[offset + 2] << 8 | frame[offset + 3]) & 0xfff8:
+                        return None
+                    length = 8
+                elif proto == 51:
+                    length = (frame[offset + 1] + 2) * 4
+                else:
+                    length = (frame[offset + 1] + 1) * 8
+                proto = frame[offset]
+                offset += length
+                remaining -= length
+        else:
+            return None
+
+        if proto == TCP:
+            sport, dport, _, _, data_offset, flags, window = _tcp.unpack_from(frame, offset)
+            header = (data_offset >> 4) * 4
+            return src, dst, sport, dport, TCP, max(remaining - header, 0), header, flags, window
+        if proto == UDP:
+            sport, dport = _ports.unpack_from(frame, offset)
+            return src, dst, sport, dport, UDP, max(remaining - 8, 0), 8, 0, 0
+    except (IndexError, struct.error):
+        # Truncated by the snap length before the transport header
+        pass
+    return None
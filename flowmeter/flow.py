@@ -0,0 +1,251 @@
+import math
+import socket
+from array import array
+from datetime import datetime, timezone
+from flowmeter.decode import TCP
+
+# Feature columns exactly as in the CICIDS2017 exports, leading spaces and the repeated header length included
+FEATURE_COLUMNS = (
+    ' Destination Port', ' Flow Duration', ' Total Fwd Packets', ' Total Backward Packets',
+    'Total Length of Fwd Packets', ' Total Length of Bwd Packets', ' Fwd Packet Length Max', ' Fwd Packet Length Min',
+    ' Fwd Packet Length Mean', ' Fwd Packet Length Std', 'Bwd Packet Length Max', ' Bwd Packet Length Min',
+    ' Bwd Packet Length Mean', ' Bwd Packet Length Std', 'Flow Bytes/s', ' Flow Packets/s',
+    ' Flow IAT Mean', ' Flow IAT Std', ' Flow IAT Max', ' Flow IAT Min',
+    'Fwd IAT Total', ' Fwd IAT Mean', ' Fwd IAT Std', ' Fwd IAT Max',
+    ' Fwd IAT Min', 'Bwd IAT Total', ' Bwd IAT Mean', ' Bwd IAT Std',
+    ' Bwd IAT Max', ' Bwd IAT Min', 'Fwd PSH Flags', ' Bwd PSH Flags',
+    ' Fwd URG Flags', ' Bwd URG Flags', ' Fwd Header Length', ' Bwd Header Length',
+    'Fwd Packets/s', ' Bwd Packets/s', ' Min Packet Length', ' Max Packet Length',
+    ' Packet Length Mean', ' Packet Length Std', ' Packet Length Variance', 'FIN Flag Count',
+    ' SYN Flag Count', ' RST Flag Count', ' PSH Flag Count', ' ACK Flag Count',
+    ' URG Flag Count', ' CWE Flag Count', ' ECE Flag Count', ' Down/Up Ratio',
+    ' Average Packet Size', ' Avg Fwd Segment Size', ' Avg Bwd Segment Size', ' Fwd Header Length',
+    'Fwd Avg Bytes/Bulk', ' Fwd Avg Packets/Bulk', ' Fwd Avg Bulk Rate', ' Bwd Avg Bytes/Bulk',
+    ' Bwd Avg Packets/Bulk', 'Bwd Avg Bulk Rate', 'Subflow Fwd Packets', ' Subflow Fwd Bytes',
+    ' Subflow Bwd Packets', ' Subflow Bwd Bytes', 'Init_Win_bytes_forward', ' Init_Win_bytes_backward',
+    ' act_data_pkt_fwd', ' min_seg_size_forward', 'Active Mean', ' Active Std',
+    ' Active Max', ' Active Min', 'Idle Mean', ' Idle Std',
+    ' Idle Max', ' Idle Min',
+)
+# Flow metadata written ahead of the features; all of it is excluded from the model's inputs
+META_COLUMNS = ('Flow ID', ' Source IP', ' Destination IP', ' Timestamp')
+COLUMNS = META_COLUMNS + FEATURE_COLUMNS
+
+FIN, SYN, RST, PSH, ACK, URG, ECE, CWR = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80
+
+# Running statistics are six doubles each in a flow's ``stats`` array: count, mean, M2 (Welford), min, max, sum
+WIDTH = 6
+FWD_LEN, BWD_LEN, ALL_LEN, FLOW_IAT, FWD_IAT, BWD_IAT, ACTIVE, IDLE = range(0, 8 * WIDTH, WIDTH)
+_EMPTY_STATS = array('d', [0.0] * (8 * WIDTH))
+
+# Bulk transfer state per direction in a flow's ``bulk`` array (backward starts at BULK_WIDTH)
+BULK_WIDTH = 8
+BULKS, BULK_BYTES, BULK_PACKETS, BULK_DURATION, RUN_START, RUN_PACKETS, RUN_BYTES, RUN_LAST = range(BULK_WIDTH)
+_EMPTY_BULK = array('d', [0.0] * (2 * BULK_WIDTH))
+BULK_MIN_PACKETS = 4        # Consecutive payload packets in one direction that make a bulk transfer
+BULK_MAX_GAP = 1000000      # Microseconds between packets of one bulk transfer
+
+def observe(stats, i, x):
+    """Add ``x`` to the running statistics at offset ``i`` (Welford's update)."""
+    n = stats[i] + 1.0
+    stats[i] = n
+    delta = x - stats[i + 1]
+    mean = stats[i + 1] + delta / n
+    stats[i + 1] = mean
+    stats[i + 2] += delta * (x - mean)
+    if n == 1.0:
+        stats[i + 3] = stats[i + 4] = x
+    elif x < stats[i + 3]:
+        stats[i + 3] = x
+    elif x > stats[i + 4]:
+        stats[i + 4] = x
+    stats[i + 5] += x
+
+def summary(stats, i):
+    """``(mean, sample std, sample variance, max, min, sum)`` at offset ``i``; zeros when empty."""
+    n = stats[i]
+    variance = stats[i + 2] / (n - 1) if n > 1 else 0.0
+    return stats[i + 1], math.sqrt(variance), variance, stats[i + 4], stats[i + 3], stats[i + 5]
+
+def _address(raw):
+    return socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+
+class Flow:
+    """Bidirectional TCP/UDP flow being metered; the first packet's sender is forward.
+
+    Every per-packet statistic is kept as a running summary in two flat
+    arrays of doubles, so a flow costs the same few hundred bytes however
+    many packets it has, and ``row()`` turns it into a CICFlowMeter-style
+    feature row. Times are integer microseconds.
+    """
+
+    __slots__ = (
+        'key', 'src', 'dst', 'sport', 'dport', 'proto', 'start', 'last', 'fwd_last', 'bwd_last',
+        'stats', 'bulk', 'fwd_header', 'bwd_header', 'min_fwd_header', 'fwd_psh', 'bwd_psh',
+        'fwd_urg', 'bwd_urg', 'flag_counts', 'init_win_fwd', 'init_win_bwd', 'act_data_fwd',
+        'active_start', 'active_end'
+    )
+
+    def __init__(self, key, timestamp, src, dst, sport, dport, proto):
+        self.key = key
+        self.src, self.dst, self.sport, self.dport, self.proto = src, dst, sport, dport, proto
+        self.start = self.last = self.active_start = self.active_end = timestamp
+        self.fwd_last = self.bwd_last = None
+        self.stats = array('d', _EMPTY_STATS)
+        self.bulk = array('d', _EMPTY_BULK)
+        self.fwd_header = self.bwd_header = 0
+        self.min_fwd_header = 0
+        self.fwd_psh = self.bwd_psh = self.fwd_urg = self.bwd_urg = 0
+        self.flag_counts = array('I', bytes(4 * 8))   # Packets with each TCP flag bit set, FIN first
+        self.init_win_fwd = self.init_win_bwd = -1
+        self.act_data_fwd = 0
+
+    def add(self, timestamp, forward, payload, header, flags, window, activity_timeout):
+        """Account one packet of this flow."""
+        stats = self.stats
+        if stats[ALL_LEN]:
+            observe(stats, FLOW_IAT, timestamp - self.last)
+            # A gap longer than the activity timeout ends an active period and counts as idle time
+            if timestamp - self.active_end > activity_timeout:
+                if self.active_end > self.active_start:
+                    observe(stats, ACTIVE, self.active_end - self.active_start)
+                observe(stats, IDLE, timestamp - self.active_end)
+                self.active_start = timestamp
+            self.active_end = timestamp
+        self.last = timestamp
+        observe(stats, ALL_LEN, payload)
+
+        if forward:
+            observe(stats, FWD_LEN, payload)
+            if self.fwd_last is not None:
+                observe(stats, FWD_IAT, timestamp - self.fwd_last)
+            else:
+                self.init_win_fwd = window if self.proto == TCP else -1
+                self.min_fwd_header = header
+            self.fwd_last = timestamp
+            self.fwd_header += header
+            if header < self.min_fwd_header:
+                self.min_fwd_header = header
+            if payload:
+                self.act_data_fwd += 1
+            if flags & PSH:
+                self.fwd_psh += 1
+            if flags & URG:
+                self.fwd_urg += 1
+            self._bulk(0, BULK_WIDTH, timestamp, payload)
+        else:
+            observe(stats, BWD_LEN, payload)
+            if self.bwd_last is not None:
+                observe(stats, BWD_IAT, timestamp - self.bwd_last)
+            else:
+                self.init_win_bwd = window if self.proto == TCP else -1
+            self.bwd_last = timestamp
+            self.bwd_header += header
+            if flags & PSH:
+                self.bwd_psh += 1
+            if flags & URG:
+                self.bwd_urg += 1
+            self._bulk(BULK_WIDTH, 0, timestamp, payload)
+
+        if flags:
+            counts = self.flag_counts
+            for bit in range(8):
+                if flags >> bit & 1:
+                    counts[bit] += 1
+
+    def _bulk(self, base, other, timestamp, payload):
+        """Track bulk transfers: runs of payload packets in one direction, as CICFlowMeter does."""
+        bulk = self.bulk
+        if bulk[other + RUN_LAST] > bulk[base + RUN_START]:
+            # The other direction sent data since this run began
+            bulk[base + RUN_START] = 0.0
+        if payload <= 0:
+            return
+        if not bulk[base + RUN_START] or timestamp - bulk[base + RUN_LAST] > BULK_MAX_GAP:
+            bulk[base + RUN_START] = bulk[base + RUN_LAST] = timestamp
+            bulk[base + RUN_PACKETS] = 1
+            bulk[base + RUN_BYTES] = payload
+            return
+        bulk[base + RUN_PACKETS] += 1
+        bulk[base + RUN_BYTES] += payload
+        if bulk[base + RUN_PACKETS] == BULK_MIN_PACKETS:
+            bulk[base + BULKS] += 1
+            bulk[base + BULK_PACKETS] += BULK_MIN_PACKETS
+            bulk[base + BULK_BYTES] += bulk[base + RUN_BYTES]
+            bulk[base + BULK_DURATION] += timestamp - bulk[base + RUN_START]
+        elif bulk[base + RUN_PACKETS] > BULK_MIN_PACKETS:
+            bulk[base + BULK_PACKETS] += 1
+            bulk[base + BULK_BYTES] += payload
+            bulk[base + BULK_DURATION] += timestamp - bulk[base + RUN_LAST]
+        bulk[base + RUN_LAST] = timestamp
+
+    def _bulk_features(self, base):
+        bulk = self.bulk
+        count = bulk[base + BULKS]
+        if not count:
+            return 0.0, 0.0, 0.0
+        duration = bulk[base + BULK_DURATION]
+        rate = bulk[base + BULK_BYTES] / (duration / 1e6) if duration else 0.0
+        return bulk[base + BULK_BYTES] / count, bulk[base + BULK_PACKETS] / count, rate
+
+    def finish(self):
+        """Close the last active period; call once, when the flow ends."""
+        if self.active_end > self.active_start:
+            observe(self.stats, ACTIVE, self.active_end - self.active_start)
+            self.active_start = self.active_end
+
+    def row(self):
+        """Metadata and feature values in ``COLUMNS`` order."""
+        stats = self.stats
+        fwd_packets = int(stats[FWD_LEN])
+        bwd_packets = int(stats[BWD_LEN])
+        packets = fwd_packets + bwd_packets
+        fwd_mean, fwd_std, _, fwd_max, fwd_min, fwd_bytes = summary(stats, FWD_LEN)
+        bwd_mean, bwd_std, _, bwd_max, bwd_min, bwd_bytes = summary(stats, BWD_LEN)
+        all_mean, all_std, all_var, all_max, all_min, _ = summary(stats, ALL_LEN)
+        flow_iat = summary(stats, FLOW_IAT)
+        fwd_iat = summary(stats, FWD_IAT)
+        bwd_iat = summary(stats, BWD_IAT)
+        active = summary(stats, ACTIVE)
+        idle = summary(stats, IDLE)
+        duration = self.last - self.start
+        seconds = duration / 1e6
+        fwd_bytes, bwd_bytes = int(fwd_bytes), int(bwd_bytes)
+        total_bytes = fwd_bytes + bwd_bytes
+        if seconds:
+            byte_rate, packet_rate = total_bytes / seconds, packets / seconds
+            fwd_rate, bwd_rate = fwd_packets / seconds, bwd_packets / seconds
+        else:
+            # Single-instant flows: CICFlowMeter reports these rates as Infinity (or NaN for no bytes)
+            byte_rate = math.inf if total_bytes else math.nan
+            packet_rate = math.inf
+            fwd_rate = math.inf if fwd_packets else 0.0
+            bwd_rate = math.inf if bwd_packets else 0.0
+        flags = self.flag_counts
+        src, dst = _address(self.src), _address(self.dst)
+
+        return [
+            f"{src}-{dst}-{self.sport}-{self.dport}-{self.proto}", src, dst,
+            datetime.fromtimestamp(self.start / 1e6, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f'),
+            self.dport, duration, fwd_packets, bwd_packets,
+            fwd_bytes, bwd_bytes, fwd_max, fwd_min,
+            fwd_mean, fwd_std, bwd_max, bwd_min,
+            bwd_mean, bwd_std, byte_rate, packet_rate,
+            flow_iat[0], flow_iat[1], flow_iat[3], flow_iat[4],
+            fwd_iat[5], fwd_iat[0], fwd_iat[1], fwd_iat[3],
+            fwd_iat[4], bwd_iat[5], bwd_iat[0], bwd_iat[1],
+            bwd_iat[3], bwd_iat[4], self.fwd_psh, self.bwd_psh,
+            self.fwd_urg, self.bwd_urg, self.fwd_header, self.bwd_header,
+            fwd_rate, bwd_rate, all_min, all_max,
+            all_mean, all_std, all_var, flags[0],
+            flags[1], flags[2], flags[3], flags[4],
+            flags[5], flags[7], flags[6], bwd_packets // fwd_packets if fwd_packets else 0,
+            total_bytes / packets, fwd_mean, bwd_mean, self.fwd_header,
+            *self._bulk_features(0),
+            *self._bulk_features(BULK_WIDTH),
+            # Subflow columns equal the flow totals in the CICIDS2017 exports the models are trained on
+            fwd_packets, fwd_bytes, bwd_packets, bwd_bytes,
+            self.init_win_fwd, self.init_win_bwd, self.act_data_fwd, self.min_fwd_header,
+            active[0], active[1], active[3], active[4],
+            idle[0], idle[1], idle[3], idle[4],
+        ]
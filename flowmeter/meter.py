@@ -0,0 +1,193 @@
+import argparse
+import csv
+import os
+import time
+from config import FLOWMETER_CONFIG
+from detector.schema import normalize_columns
+from flowmeter.decode import decode, TCP
+from flowmeter.flow import COLUMNS, FIN, RST, Flow
+from flowmeter.pcap import read_packets
+from flowmeter.wheel import TimeoutWheel
+from utils.logger import logger
+from utils.metrics import metrics, STAGE_SECONDS, STAGE_ROWS
+
+PACKETS = metrics.counter('shcs_flowmeter_packets_total', "Captured packets read by the flow meter", ('result',))
+FLOWS = metrics.counter('shcs_flowmeter_flows_total', "Flows completed by the flow meter, by what ended them", ('reason',))
+
+class FlowMeter:
+    """Turn captured packets into completed-flow feature rows, one pass, bounded memory.
+
+    Open flows live in a dict keyed by their direction-independent 5-tuple
+    and are completed when idle for ``idle_timeout`` seconds (found through
+    a timeout wheel driven by capture time), when older than
+    ``active_timeout``, at a FIN/RST, or, past ``max_flows`` open flows,
+    oldest first. Completed rows collect in ``completed`` until read.
+    """
+
+    def __init__(self, idle_timeout=None, active_timeout=None, activity_timeout=None,
+                 terminate_on_fin=None, max_flows=None, wheel_tick=None):
+        seconds = lambda value, key: int((FLOWMETER_CONFIG[key] if value is None else value) * 1000000)
+        self.idle_timeout = seconds(idle_timeout, 'idle_timeout')
+        self.active_timeout = seconds(active_timeout, 'active_timeout')
+        self.activity_timeout = seconds(activity_timeout, 'activity_timeout')
+        self.terminate_on_fin = FLOWMETER_CONFIG['terminate_on_fin'] if terminate_on_fin is None else terminate_on_fin
+        self.max_flows = max_flows or FLOWMETER_CONFIG['max_flows']
+        tick = seconds(wheel_tick, 'wheel_tick')
+        self.wheel = TimeoutWheel(tick, self.idle_timeout // tick + 2)
+        self._next_tick = self.wheel.next_tick()
+        self.flows = {}
+        self.completed = []
+        self.packets = 0
+        self.skipped = 0
+
+    def _finish(self, flow, reason):
+        del self.flows[flow.key]
+        flow.finish()
+        self.completed.append(flow.row())
+        FLOWS.inc(reason=reason)
+
+    def expire(self, now):
+        """Complete flows idle since ``now - idle_timeout`` (microseconds)."""
+        for flow in self.wheel.advance(now):
+            if self.flows.get(flow.key) is not flow:
+                # Completed some other way since it was scheduled
+                continue
+            deadline = flow.last + self.idle_timeout
+            if deadline <= now:
+                self._finish(flow, 'idle')
+            else:
+                self.wheel.schedule(flow, deadline)
+        self._next_tick = self.wheel.next_tick()
+
+    def add(self, timestamp, packet):
+        """Account a decoded packet (see ``flowmeter.decode.decode``) seen at ``timestamp`` microseconds."""
+        src, dst, sport, dport, proto, payload, header, flags, window = packet
+        if timestamp >= self._next_tick:
+            self.expire(timestamp)
+        key = (proto, src, sport, dst, dport) if (src, sport) <= (dst, dport) else (proto, dst, dport, src, sport)
+        flow = self.flows.get(key)
+        if flow is not None and timestamp - flow.start > self.active_timeout:
+            self._finish(flow, 'active')
+            flow = None
+        if flow is None:
+            if len(self.flows) >= self.max_flows:
+                # Dicts keep insertion order, so the first key is the oldest open flow
+                self._finish(self.flows[next(iter(self.flows))], 'evicted')
+            flow = self.flows[key] = Flow(key, timestamp, src, dst, sport, dport, proto)
+            # Scheduled once; when the slot comes round, expire() checks the real deadline
+            self.wheel.schedule(flow, timestamp + self.idle_timeout)
+        flow.add(timestamp, src == flow.src and sport == flow.sport, payload, header, flags, window,
+                 self.activity_timeout)
+        if flags & (FIN | RST) and proto == TCP and self.terminate_on_fin:
+            self._finish(flow, 'fin')
+
+    def read(self, path):
+        """Meter every packet of a pcap/pcapng file, yielding rows of flows as they complete.
+
+        Flows still open at the end of the file stay open, so consecutive
+        files of a rotated capture continue them; call ``flush`` after the last.
+        """
+        packets = skipped = 0
+        try:
+            for timestamp, linktype, frame in read_packets(path):
+                packet = decode(linktype, frame)
+                if packet is None:
+                    skipped += 1
+                    continue
+                packets += 1
+                self.add(timestamp, packet)
+                if self.completed:
+                    yield from self.completed
+                    self.completed.clear()
+        finally:
+            self.packets += packets
+            self.skipped += skipped
+            PACKETS.inc(packets, result='metered')
+            PACKETS.inc(skipped, result='skipped')
+
+    def flush(self):
+        """Complete every open flow and return their rows."""
+        for flow in list(self.flows.values()):
+            self._finish(flow, 'end')
+        self.wheel.drain()
+        rows, self.completed = self.completed, []
+        return rows
+
+def iter_rows(paths, meter=None):
+    """Feature rows (in ``flowmeter.flow.COLUMNS`` order) of every flow in the captures ``paths``, in order."""
+    meter = meter or FlowMeter()
+    for path in paths:
+        yield from meter.read(path)
+    yield from meter.flush()
+
+def iter_frames(paths, chunk_rows=None, meter=None):
+    """DataFrames of up to ``chunk_rows`` completed flows, ready for ``anomaly_detector.predict``.
+
+    Columns are normalized as if read from a CSV export, so the detector
+    aligns them to the model's features and keeps Source IP and Timestamp
+    as flow metadata for blocking.
+    """
+    import pandas as pd
+    chunk_rows = chunk_rows or FLOWMETER_CONFIG['chunk_rows']
+    columns = normalize_columns(COLUMNS)
+    rows = []
+    started = time.perf_counter()
+    for row in iter_rows(paths, meter):
+        rows.append(row)
+        if len(rows) >= chunk_rows:
+            frame = pd.DataFrame.from_records(rows, columns=columns)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='flowmeter')
+            STAGE_ROWS.inc(len(rows), stage='flowmeter')
+            rows = []
+            yield frame
+            started = time.perf_counter()
+    if rows:
+        frame = pd.DataFrame.from_records(rows, columns=columns)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='flowmeter')
+        STAGE_ROWS.inc(len(rows), stage='flowmeter')
+        yield frame
+
+def write_csv(paths, output, meter=None):
+    """Write the flows of the captures ``paths`` to a CICIDS-style CSV; return the number of flows."""
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    count = 0
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in iter_rows(paths, meter):
+            writer.writerow(row)
+            count += 1
+    # Appears complete or not at all to anything watching the data directory
+    os.replace(tmp_path, output)
+    return count
+
+def main(argv=None):
+    """Command line: ``python -m flowmeter.meter capture.pcap [-o flows.csv] [--score]``."""
+    parser = argparse.ArgumentParser(description="Extract CICIDS-style flow features from pcap/pcapng captures")
+    parser.add_argument("captures", nargs="+", help="Capture files, read in order as one capture")
+    parser.add_argument("-o", "--output", help="CSV file to write (default: the first capture with .csv)")
+    parser.add_argument("--score", action="store_true", help="Score the flows with the current model instead of writing them")
+    parser.add_argument("--block", action="store_true", help="With --score, block the sources of anomalous flows")
+    args = parser.parse_args(argv)
+
+    meter = FlowMeter()
+    if not args.score:
+        output = args.output or os.path.splitext(args.captures[0])[0] + ".csv"
+        count = write_csv(args.captures, output, meter)
+        logger.info(f"Wrote {count} flows from {meter.packets} packets to {output} ({meter.skipped} packets skipped)")
+        return 0
+
+    from detector.anomaly_detector import anomaly_detector
+    results = anomaly_detector.predict(iter_frames(args.captures, meter=meter))
+    if results is None:
+        return 1
+    logger.info(f"Scored {len(results['predictions'])} flows from {meter.packets} packets: "
+                f"{len(results['anomalies'])} anomalous")
+    if args.block and len(results['anomalies']):
+        from security.response import security_response
+        blocked = security_response.respond_to_anomalies(results)
+        logger.info(f"Blocked {len(blocked)} source IPs")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+import struct
+
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1),      # Microsecond timestamps, little-endian
+    b'\xa1\xb2\xc3\xd4': ('>', 1),
+    b'\x4d\x3c\xb2\xa1': ('<', 1000),   # Nanosecond timestamps
+    b'\xa1\xb2\x3c\x4d': ('>', 1000),
+}
+PCAPNG_SECTION = b'\x0a\x0d\x0d\x0a'
+
+class CaptureError(ValueError):
+    """A capture file is not pcap/pcapng or is damaged beyond the packets already read."""
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        # A capture still being written, or cut short: stop at the last whole record
+        return None
+    return data
+
+def _pcap_packets(f, header):
+    order, divisor = PCAP_MAGIC[header[:4]]
+    linktype = struct.unpack(order + 'I', header[20:24])[0] & 0x0fffffff
+    record = struct.Struct(order + 'IIII')
+    while True:
+        data = _read_exact(f, 16)
+        if data is None:
+            return
+        seconds, fraction, caplen, _ = record.unpack(data)
+        frame = _read_exact(f, caplen)
+        if frame is None:
+            return
+        yield seconds * 1000000 + fraction // divisor, linktype, frame
+
+def _tsresol(value):
+    """``(numerator, denominator)`` turning ticks of an ``if_tsresol`` option into microseconds."""
+    units = 2 ** (value & 0x7f) if value & 0x80 else 10 ** value
+    return 1000000, units
+
+def _interface(body, order):
+    """Link type and (numerator, denominator, offset) timestamp scaling of an interface description block."""
+    linktype = struct.unpack(order + 'H', body[:2])[0]
+    scale, offset = (1000000, 1000000), 0
+    position = 8
+    while position + 4 <= len(body):
+        code, length = struct.unpack(order + 'HH', body[position:position + 4])
+        value = body[position + 4:position + 4 + length]
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            scale = _tsresol(value[0])
+        elif code == 14 and length >= 8:
+            offset = struct.unpack(order + 'q', value[:8])[0] * 1000000
+        position += 4 + (length + 3) // 4 * 4
+    return linktype, scale, offset
+
+def _pcapng_packets(f, first):
+    order = '<'
+    interfaces = []
+    timestamp = 0
+    block = first
+    while block is not None:
+        if block[:4] == PCAPNG_SECTION:
+            # The byte-order magic decides how this section (and its block lengths) are read
+            order = '<' if block[8:12] == b'\x4d\x3c\x2b\x1a' else '>'
+            interfaces = []
+        kind, length = struct.unpack(order + 'II', block[:8])
+        if length < max(12, len(block)) or length % 4:
+            raise CaptureError(f"Bad pcapng block length {length}")
+        rest = _read_exact(f, length - len(block))
+        if rest is None:
+            return
+        body = block[8:] + rest
+        body = body[:-4]  # Trailing copy of the block length
+
+        if kind == 1:
+            interfaces.append(_interface(body, order))
+        elif kind in (6, 2):
+            if kind == 6:
+                interface, high, low, caplen, _ = struct.unpack(order + 'IIIII', body[:20])
+            else:
+                # Obsolete packet block: 16-bit interface id and drop count
+                interface, _, high, low, caplen, _ = struct.unpack(order + 'HHIIII', body[:20])
+            if interface < len(interfaces):
+                linktype, (numerator, denominator), offset = interfaces[interface]
+                timestamp = ((high << 32) | low) * numerator // denominator + offset
+                yield timestamp, linktype, body[20:20 + caplen]
+        elif kind == 3 and interfaces:
+            # Simple packet block: no timestamp, so it shares the previous packet's
+            original = struct.unpack(order + 'I', body[:4])[0]
+            yield timestamp, interfaces[0][0], body[4:4 + original]
+        block = _read_exact(f, 8)
+
+def read_packets(path, buffer_size=1 << 20):
+    """Yield ``(timestamp_us, linktype, frame)`` for each packet of a pcap or pcapng file.
+
+    Records are read one at a time through a buffered file, so memory does
+    not grow with the capture. A truncated final record (a capture still
+    being written) ends the iteration quietly.
+    """
+    with open(path, 'rb', buffering=buffer_size) as f:
+        head = f.read(24)
+        if head[:4] in PCAP_MAGIC and len(head) == 24:
+            yield from _pcap_packets(f, head)
+        elif head[:4] == PCAPNG_SECTION and len(head) >= 12:
+            # Hand over the 8-byte block header plus what was read ahead of the body
+            yield from _pcapng_packets(f, head)
+        else:
+            raise CaptureError(f"{path} is not a pcap or pcapng capture")
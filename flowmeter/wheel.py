@@ -0,0 +1,58 @@
+class TimeoutWheel:
+    """Hashed timing wheel of ``(deadline, item)`` entries, ``tick`` units per slot.
+
+    Scheduling is an append to one slot and advancing visits only the slots
+    whose tick has passed, so the cost per packet does not depend on how
+    many flows are open. Entries more than a revolution ahead stay in their
+    slot until a later pass reaches their deadline. Deadlines are not
+    updated in place: callers check whether a due item is really due and
+    schedule it again if not.
+    """
+
+    def __init__(self, tick, slots):
+        self.tick = tick
+        self.slots = max(int(slots), 1)
+        self._buckets = [[] for _ in range(self.slots)]
+        self._cursor = None     # Last tick whose slot has been visited
+        self.size = 0
+
+    def schedule(self, item, deadline):
+        # Slot of the first tick at or after the deadline, so an entry is never visited before it is due
+        position = -(-deadline // self.tick)
+        if self._cursor is not None and position <= self._cursor:
+            # Already overdue: fire on the next advance
+            position = self._cursor + 1
+        self._buckets[int(position) % self.slots].append((deadline, item))
+        self.size += 1
+
+    def next_tick(self):
+        """Time at which ``advance`` next has a slot to visit."""
+        return 0 if self._cursor is None else (self._cursor + 1) * self.tick
+
+    def advance(self, now):
+        """Remove and return the items whose deadline is at or before ``now``."""
+        target = int(now // self.tick)
+        if self._cursor is None:
+            # Entries scheduled before the first advance may be due in any slot: visit each once
+            self._cursor = target - self.slots
+        due = []
+        steps = min(target - self._cursor, self.slots)
+        for step in range(1, steps + 1):
+            index = (self._cursor + step) % self.slots
+            bucket = self._buckets[index]
+            if not bucket:
+                continue
+            waiting = [entry for entry in bucket if entry[0] > now]
+            if len(waiting) != len(bucket):
+                due.extend(item for deadline, item in bucket if deadline <= now)
+                self._buckets[index] = waiting
+        self._cursor = max(self._cursor, target)
+        self.size -= len(due)
+        return due
+
+    def drain(self):
+        """Remove and return every scheduled item."""
+        items = [item for bucket in self._buckets for _, item in bucket]
+        self._buckets = [[] for _ in range(self.slots)]
+        self.size = 0
+        return items
@@ -0,0 +1,195 @@
+import bisect
+import math
+import tkinter as tk
+from tkinter import ttk
+from config import GUI_CONFIG
+from security.blocklist import Blocklist
+
+COLUMNS = ("IP Address", "Block Time", "Reason", "Duration")
+
+def _values(rule, entry):
+    """Table row for a block entry."""
+    duration = f"{entry['duration']}s" if 'duration' in entry else "Permanent"
+    return (rule, entry['block_time'], entry['reason'] or "", duration)
+
+class BlockedView:
+    """Paged Blocked IPs table that applies only the rules that changed.
+
+    Every blocked rule lives in a sorted, filtered model keyed by rule, but
+    only the current page exists as Treeview rows. A refresh fetches the
+    rules changed since the previous one, updates the model with a binary
+    search per change and re-renders just the visible page, so its cost
+    tracks the number of changes rather than the size of the blocklist.
+    Sorting (click a column heading) and filtering run on the model.
+    """
+
+    def __init__(self, parent, source, page_size=None):
+        self.source = source
+        self.page_size = page_size or GUI_CONFIG['blocked_page_size']
+        self.entries = {}       # rule -> row values, for every blocked rule
+        self.keys = {}          # rule -> sort key, for rules passing the filter
+        self.order = []         # sorted (sort key, rule) of rules passing the filter
+        self.sort_column = 0
+        self.descending = False
+        self.filter_text = ""
+        self.page = 0
+        self.change_number = None
+        self._shown = []        # Rules rendered on the current page, in order
+        self._shown_values = {}
+
+        # Filter box
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.set_filter(self.filter_var.get()))
+        ttk.Entry(filter_frame, textvariable=self.filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        # Create treeview for blocked IPs
+        self.tree = ttk.Treeview(parent, columns=COLUMNS, show="headings")
+        for index, col in enumerate(COLUMNS):
+            self.tree.heading(col, text=col, command=lambda index=index: self.sort_by(index))
+            self.tree.column(col, width=100)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        # Add scrollbar
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        # Page navigation
+        page_frame = ttk.Frame(parent)
+        page_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(page_frame, text="< Prev", command=lambda: self.go_to_page(self.page - 1)).pack(side=tk.LEFT)
+        self.page_var = tk.StringVar(value="Page 1 of 1")
+        ttk.Label(page_frame, textvariable=self.page_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(page_frame, text="Next >", command=lambda: self.go_to_page(self.page + 1)).pack(side=tk.LEFT)
+
+    def _sort_key(self, rule, values):
+        if self.sort_column == 0:
+            return Blocklist.sort_key(rule)
+        if self.sort_column == 3:
+            return math.inf if values[3] == "Permanent" else int(values[3][:-1])
+        return values[self.sort_column]
+
+    def _matches(self, rule, values):
+        return not self.filter_text or self.filter_text in rule or self.filter_text in values[2].lower()
+
+    def _add(self, rule, values):
+        self.entries[rule] = values
+        if self._matches(rule, values):
+            key = self._sort_key(rule, values)
+            self.keys[rule] = key
+            bisect.insort(self.order, (key, rule))
+
+    def _discard(self, rule):
+        self.entries.pop(rule, None)
+        key = self.keys.pop(rule, None)
+        if key is not None:
+            del self.order[bisect.bisect_left(self.order, (key, rule))]
+
+    def _rebuild(self):
+        """Re-sort and re-filter the whole model after the sort or filter changed."""
+        self.keys = {}
+        order = []
+        for rule, values in self.entries.items():
+            if self._matches(rule, values):
+                key = self._sort_key(rule, values)
+                self.keys[rule] = key
+                order.append((key, rule))
+        order.sort()
+        self.order = order
+        self._render()
+
+    def reload(self):
+        """Load every blocked rule from scratch."""
+        self.change_number, blocked = self.source.blocked_snapshot()
+        self.entries = {rule: _values(rule, entry) for rule, entry in blocked.items()}
+        self._rebuild()
+
+    def refresh(self):
+        """Apply the rules changed since the last refresh."""
+        if self.change_number is None:
+            self.reload()
+            return
+        number, changed = self.source.changes_since(self.change_number)
+        if changed is None:
+            self.reload()
+            return
+        if not changed:
+            return
+
+        for rule, entry in changed.items():
+            self._discard(rule)
+            if entry is not None:
+                self._add(rule, _values(rule, entry))
+        self.change_number = number
+        self._render()
+
+    def _visible(self):
+        """Rules on the current page, in display order."""
+        total = len(self.order)
+        start = self.page * self.page_size
+        if self.descending:
+            window = self.order[max(total - start - self.page_size, 0):max(total - start, 0)]
+            window.reverse()
+        else:
+            window = self.order[start:start + self.page_size]
+        return [rule for _, rule in window]
+
+    def _render(self):
+        """Bring the Treeview rows in line with the current page."""
+        pages = max(1, math.ceil(len(self.order) / self.page_size))
+        self.page = min(max(self.page, 0), pages - 1)
+        self.page_var.set(f"Page {self.page + 1} of {pages} ({len(self.order)} rules)")
+
+        visible = self._visible()
+        changed_values = [rule for rule in visible if self._shown_values.get(rule) != self.entries[rule]]
+        if visible == self._shown and not changed_values:
+            return
+
+        visible_set = set(visible)
+        stale = [rule for rule in self._shown if rule not in visible_set]
+        if stale:
+            self.tree.delete(*stale)
+            for rule in stale:
+                del self._shown_values[rule]
+
+        for rule in changed_values:
+            if rule in self._shown_values:
+                self.tree.item(rule, values=self.entries[rule])
+            else:
+                self.tree.insert("", tk.END, iid=rule, values=self.entries[rule])
+            self._shown_values[rule] = self.entries[rule]
+
+        # Reorder only if the page's order differs from what Tk shows
+        if list(self.tree.get_children()) != visible:
+            for index, rule in enumerate(visible):
+                self.tree.move(rule, "", index)
+        self._shown = visible
+
+    def sort_by(self, column):
+        """Sort by a column; clicking the same heading again reverses the order."""
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            self.sort_column = column
+            self.descending = False
+        self.page = 0
+        self._rebuild()
+
+    def set_filter(self, text):
+        """Show only rules whose address or reason contains ``text``."""
+        text = text.strip().lower()
+        if text != self.filter_text:
+            self.filter_text = text
+            self.page = 0
+            self._rebuild()
+
+    def go_to_page(self, page):
+        self.page = page
+        self._render()
+
+    def selected_rules(self):
+        """Rules of the selected rows."""
+        return list(self.tree.selection())
@@ -0,0 +1,59 @@
+import queue
+from config import GUI_CONFIG
+from utils.logger import logger
+
+class EventBus:
+    """Carry events from worker threads to the Tk thread.
+
+    Workers call ``post`` from any thread; it never blocks and never touches
+    a widget. The Tk thread drains the queue with ``after()`` at most
+    ``max_fps`` times a second, and each subscriber receives all payloads of
+    its kind posted since the previous frame in one call, so a burst turns
+    into a single redraw.
+    """
+
+    def __init__(self, root, max_fps=None, max_events=None):
+        self.root = root
+        self.interval = max(1, int(1000 / (max_fps or GUI_CONFIG['max_fps'])))
+        self.max_events = max_events or GUI_CONFIG['max_events_per_frame']
+        self._queue = queue.SimpleQueue()
+        self._handlers = {}
+        self._after_id = None
+
+    def subscribe(self, kind, handler):
+        """Call ``handler(payloads)`` on the Tk thread for events of ``kind``."""
+        self._handlers[kind] = handler
+
+    def post(self, kind, payload=None):
+        """Queue an event; safe to call from any thread."""
+        self._queue.put((kind, payload))
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        # Bound the work per frame; anything left waits for the next one
+        pending = {}
+        for _ in range(self.max_events):
+            try:
+                kind, payload = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.setdefault(kind, []).append(payload)
+
+        for kind, payloads in pending.items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                continue
+            try:
+                handler(payloads)
+            except Exception as e:
+                logger.error(f"GUI handler for {kind} events failed: {str(e)}")
+
+        self._after_id = self.root.after(self.interval, self._drain)
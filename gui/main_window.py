@@ -1,12 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import threading
-import time
 from datetime import datetime
-from config import DATA_DIR, MODEL_PATH
+from config import DATA_DIR, GUI_CONFIG, METRICS_CONFIG, MODEL_CONFIG, MODEL_PATH, SECURITY_CONFIG
 from detector.anomaly_detector import anomaly_detector
+from detector.incremental import IncrementalReader
+from detector.training import TrainingJob
+from gui.blocked_view import BlockedView
+from gui.events import EventBus
 from security.response import security_response
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.threat_log import threat_log
+from utils.watcher import DirectoryWatcher
 import os
 
 class SecuritySystemGUI:
@@ -34,6 +40,22 @@ class SecuritySystemGUI:
         self.setup_gui()
         self.is_running = False
         self.update_thread = None
+        self.total_anomalies = 0
+        self.training_job = None
+        self.monitor_after_training = False
+        self.fit_if_refresh_fails = False
+        self.last_snapshot = None
+
+        # Worker threads post events; the Tk thread applies them at a bounded rate
+        self.events = EventBus(root)
+        self.events.subscribe('detection', self.on_detection)
+        self.events.subscribe('blocked', self.on_blocked)
+        self.events.subscribe('refresh', self.on_refresh)
+        self.events.subscribe('log', self.on_log)
+        self.events.subscribe('training', self.on_training)
+        self.events.subscribe('model_stale', self.on_model_stale)
+        self.events.start()
+        self.refresh_metrics()
 
     def setup_gui(self):
         # Create notebook for tabs
@@ -66,6 +88,9 @@ class SecuritySystemGUI:
         
         self.train_button = ttk.Button(control_frame, text="Train Model", command=self.train_model)
         self.train_button.pack(side=tk.LEFT, padx=5)
+
+        self.refresh_model_button = ttk.Button(control_frame, text="Refresh Model", command=self.refresh_model)
+        self.refresh_model_button.pack(side=tk.LEFT, padx=5)
         
         # Statistics frame
         stats_frame = ttk.LabelFrame(self.dashboard_tab, text="System Statistics", padding="10")
@@ -76,6 +101,12 @@ class SecuritySystemGUI:
             "Total Anomalies": tk.StringVar(value="0"),
             "Blocked IPs": tk.StringVar(value="0"),
             "Model Status": tk.StringVar(value="Not Trained"),
+            "Model Version": tk.StringVar(value="-"),
+            "Rows/s": tk.StringVar(value="0"),
+            "Batch Latency (p95)": tk.StringVar(value="-"),
+            "Blocks/s": tk.StringVar(value="0"),
+            "Log Queue": tk.StringVar(value="0"),
+            "Busiest Stage": tk.StringVar(value="-"),
             "Last Update": tk.StringVar(value="Never")
         }
         
@@ -89,6 +120,16 @@ class SecuritySystemGUI:
         log_frame = ttk.LabelFrame(self.dashboard_tab, text="System Logs", padding="10")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # Threat search, answered from the threat log's index
+        search_frame = ttk.Frame(log_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(search_frame, text="Threat search (IP):").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        search_entry.bind("<Return>", lambda event: self.search_threats())
+        ttk.Button(search_frame, text="Search", command=self.search_threats).pack(side=tk.LEFT)
+
         self.log_text = scrolledtext.ScrolledText(log_frame, height=10)
         self.log_text.pack(fill=tk.BOTH, expand=True)
         self.log_text.config(state=tk.DISABLED)
@@ -98,20 +139,8 @@ class SecuritySystemGUI:
         blocked_frame = ttk.LabelFrame(self.monitoring_tab, text="Blocked IPs", padding="10")
         blocked_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        # Create treeview for blocked IPs
-        columns = ("IP Address", "Block Time", "Reason", "Duration")
-        self.blocked_tree = ttk.Treeview(blocked_frame, columns=columns, show="headings")
-        
-        for col in columns:
-            self.blocked_tree.heading(col, text=col)
-            self.blocked_tree.column(col, width=100)
-        
-        self.blocked_tree.pack(fill=tk.BOTH, expand=True)
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(blocked_frame, orient=tk.VERTICAL, command=self.blocked_tree.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.blocked_tree.configure(yscrollcommand=scrollbar.set)
+        # Paged table that only applies changed rules
+        self.blocked_view = BlockedView(blocked_frame, security_response)
         
         # Control buttons
         button_frame = ttk.Frame(blocked_frame)
@@ -157,13 +186,16 @@ class SecuritySystemGUI:
                     "The model needs to be trained before starting monitoring. Would you like to train it now?"
                 )
                 if response:
-                    self.train_model()
+                    # Monitoring starts once the model is published
+                    self.monitor_after_training = True
+                    if self.training_job is None or not self.training_job.running:
+                        self.train_model()
                 else:
                     messagebox.showwarning(
                         "Warning",
                         "Monitoring cannot start without a trained model. Please train the model first."
                     )
-                    return
+                return
             
             self.is_running = True
             self.start_button.config(state=tk.DISABLED)
@@ -181,84 +213,120 @@ class SecuritySystemGUI:
             self.status_var.set("Monitoring Stopped")
 
     def monitoring_loop(self):
-        while self.is_running:
-            try:
-                # Load and analyze data
-                test_data = anomaly_detector.load_data()
-                
-                if test_data is not None:
-                    results = anomaly_detector.predict(test_data)
-                    if results is not None:
-                        self.update_statistics(results)
-                        self.process_anomalies(results)
-                else:
-                    # Even if no new data, update statistics to reflect current state
-                    self.update_statistics({'anomalies': []})
-                
-                # Always update blocked list and force GUI refresh
-                self.update_blocked_list()
-                self.root.update()
-                
-                time.sleep(5)  # Update every 5 seconds
-            except Exception as e:
-                self.log_message(f"Error in monitoring loop: {str(e)}", "ERROR")
-                time.sleep(5)
+        reader = IncrementalReader(DATA_DIR)
+        watcher = DirectoryWatcher(DATA_DIR)
+        changed = True  # Score whatever is already on disk first
+        try:
+            while self.is_running:
+                try:
+                    if changed:
+                        # Score only rows appended since the last pass
+                        for chunk in reader.iter_new():
+                            results = anomaly_detector.predict(chunk)
+                            if results is not None:
+                                self.events.post('detection', len(results['anomalies']))
+                                self.process_anomalies(results)
+                    # Even if no new data, refresh statistics and the blocked list
+                    self.events.post('refresh')
+                    
+                    # Wake up on file changes, or periodically to refresh status
+                    changed = watcher.wait()
+                except Exception as e:
+                    self.log_message(f"Error in monitoring loop: {str(e)}", "ERROR")
+                    changed = watcher.wait()
+        finally:
+            watcher.close()
 
-    def update_statistics(self, results):
+    def update_statistics(self):
         # Update anomalies count
-        if 'anomalies' in results:
-            self.stats_vars["Total Anomalies"].set(str(len(results['anomalies'])))
+        self.stats_vars["Total Anomalies"].set(str(self.total_anomalies))
         
         # Update blocked IPs count - get directly from security_response
-        blocked_ips = security_response.get_blocked_ips()
-        self.stats_vars["Blocked IPs"].set(str(len(blocked_ips)))
+        self.stats_vars["Blocked IPs"].set(str(security_response.blocked_count()))
         
         # Update last update timestamp
         self.stats_vars["Last Update"].set(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         
         # Update model status
-        if os.path.exists(MODEL_PATH):
+        if self.training_job is not None and self.training_job.running:
+            self.stats_vars["Model Status"].set("Training..." if not os.path.exists(MODEL_PATH)
+                                                else "Trained (retraining)")
+        elif os.path.exists(MODEL_PATH):
             self.stats_vars["Model Status"].set("Trained")
         else:
             self.stats_vars["Model Status"].set("Not Trained")
-        
-        # Force GUI update
-        self.root.update()
+
+    def refresh_metrics(self):
+        """Show pipeline metrics, with rates taken over the time since the last refresh."""
+        try:
+            snapshot = metrics.snapshot()
+            previous = self.last_snapshot or snapshot
+            self.last_snapshot = snapshot
+            elapsed = snapshot['timestamp'] - previous['timestamp']
+
+            def delta(name, label=""):
+                now = snapshot.get(name, {}).get(label, 0)
+                before = previous.get(name, {}).get(label, 0)
+                if isinstance(now, dict):
+                    now, before = now['sum'], before['sum'] if before else 0
+                return now - before
+
+            versions = [label.split("=", 1)[1] for label in snapshot.get('shcs_model_info', {})]
+            self.stats_vars["Model Version"].set(versions[0][:12] if versions else "-")
+            if elapsed > 0:
+                self.stats_vars["Rows/s"].set(f"{delta('shcs_stage_rows_total', 'stage=score') / elapsed:,.0f}")
+                self.stats_vars["Blocks/s"].set(f"{delta('shcs_blocks_total') / elapsed:.1f}")
+
+            latency = snapshot.get('shcs_stage_seconds', {}).get('stage=score', {}).get('p95')
+            self.stats_vars["Batch Latency (p95)"].set("-" if latency is None else f"{latency * 1000:.1f} ms")
+            self.stats_vars["Log Queue"].set(str(snapshot.get('shcs_log_queue_depth', {}).get("", 0)))
+
+            # The stage that took the largest share of time since the last refresh
+            stages = {
+                label.split("=", 1)[1]: delta('shcs_stage_seconds', label)
+                for label in snapshot.get('shcs_stage_seconds', {})
+            }
+            busiest = max(stages, key=stages.get, default=None)
+            if busiest is not None and stages[busiest] > 0 and elapsed > 0:
+                self.stats_vars["Busiest Stage"].set(f"{busiest} ({stages[busiest] / elapsed:.0%} of wall time)")
+        except Exception as e:
+            logger.error(f"Failed to refresh metrics: {str(e)}")
+        self.root.after(METRICS_CONFIG['stats_interval'], self.refresh_metrics)
+
+    def on_detection(self, counts):
+        self.total_anomalies += sum(counts)
+        self.update_statistics()
+
+    def on_refresh(self, payloads):
+        self.update_statistics()
+        self.update_blocked_list()
+
+    def on_blocked(self, batches):
+        self.on_log([
+            (timestamp, "INFO", f"Blocked IP {ip} due to anomalous traffic")
+            for timestamp, ips in batches for ip in ips
+        ])
+        self.update_statistics()
+        self.update_blocked_list()
 
     def process_anomalies(self, results):
-        for idx in results['anomalies']:
-            malicious_ip = f"192.168.1.{100 + idx}"
-            try:
-                security_response.block_ip(
-                    malicious_ip,
-                    reason=f"Anomaly detected in row {idx} with score {results['scores'][idx]:.2f}"
-                )
-                self.log_message(f"Blocked IP {malicious_ip} due to anomaly", "INFO")
-            except Exception as e:
-                self.log_message(f"Failed to block IP {malicious_ip}: {str(e)}", "ERROR")
+        try:
+            blocked = security_response.respond_to_anomalies(results)
+            if blocked:
+                self.events.post('blocked', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), blocked))
+        except Exception as e:
+            self.log_message(f"Failed to respond to anomalies: {str(e)}", "ERROR")
 
     def update_blocked_list(self):
-        # Clear existing items
-        for item in self.blocked_tree.get_children():
-            self.blocked_tree.delete(item)
-        
-        # Add current blocked IPs
-        for ip, info in security_response.get_blocked_ips().items():
-            self.blocked_tree.insert("", tk.END, values=(
-                ip,
-                info['block_time'],
-                info['reason'],
-                f"{info['duration']}s" if 'duration' in info else "Permanent"
-            ))
+        self.blocked_view.refresh()
 
     def unblock_selected(self):
-        selected = self.blocked_tree.selection()
+        selected = self.blocked_view.selected_rules()
         if not selected:
             messagebox.showwarning("Warning", "Please select an IP to unblock")
             return
         
-        for item in selected:
-            ip = self.blocked_tree.item(item)['values'][0]
+        for ip in selected:
             if security_response.unblock_ip(ip):
                 self.log_message(f"Unblocked IP {ip}", "INFO")
             else:
@@ -266,30 +334,99 @@ class SecuritySystemGUI:
         
         self.update_blocked_list()
 
-    def train_model(self):
+    def train_model(self, mode='full'):
+        """Start a background training job, or cancel the one that is running.
+
+        ``mode`` is ``"full"`` to fit a new model or ``"refresh"`` to refresh
+        the live one with the data changed since it was written.
+        """
+        if self.training_job is not None and self.training_job.running:
+            self.training_job.cancel()
+            self.status_var.set("Cancelling training...")
+            return
+
         try:
-            self.status_var.set("Training Model...")
-            self.root.update()
-            
-            # Train model using the imported singleton instance
-            success = anomaly_detector.train()
-            
-            if success:
-                # Verify model was saved
-                if os.path.exists(MODEL_PATH):
-                    self.status_var.set("Model Trained Successfully")
-                    messagebox.showinfo("Success", "Model trained successfully!")
-                else:
-                    self.status_var.set("Model Training Failed")
-                    messagebox.showerror("Error", "Model training completed but model file was not saved!")
-            else:
-                self.status_var.set("Model Training Failed")
-                messagebox.showerror("Error", "Model training failed. Check logs for details.")
-                
+            self.training_job = TrainingJob(
+                on_progress=lambda job, stage, done, total: self.events.post('training', (stage, done, total, job.elapsed)),
+                on_finish=lambda job: self.events.post('training', None),
+                mode=mode
+            ).start()
         except Exception as e:
             logger.error(f"Error training model: {str(e)}")
             self.status_var.set("Model Training Failed")
             messagebox.showerror("Error", f"Error training model: {str(e)}")
+            return
+
+        self.train_button.config(text="Cancel Training")
+        self.refresh_model_button.config(state=tk.DISABLED)
+        self.status_var.set("Training Model...")
+        action = "refresh" if mode == 'refresh' else "training"
+        self.log_message(f"Model {action} started; detection keeps using the current model", "INFO")
+        self.update_statistics()
+
+    def refresh_model(self):
+        """Refresh the live model with recent data in the background."""
+        self.train_model(mode='refresh')
+
+    def check_model(self):
+        """Train or refresh in the background if the model is missing or was trained on other data or settings.
+
+        Checking loads the model, so it runs off the Tk thread and the window
+        comes up right away; scoring then starts with the model already loaded.
+        """
+        def run():
+            try:
+                mode = anomaly_detector.update_mode()
+                if mode is not None:
+                    self.events.post('model_stale', mode)
+            except Exception as e:
+                logger.error(f"Failed to check the model: {str(e)}")
+
+        threading.Thread(target=run, name="model-check", daemon=True).start()
+
+    def on_model_stale(self, payloads):
+        if self.training_job is None or not self.training_job.running:
+            # A refresh that cannot run (too little recent data) falls back to a full fit
+            self.fit_if_refresh_fails = payloads[-1] == 'refresh'
+            self.train_model(mode=payloads[-1])
+
+    def on_training(self, payloads):
+        # Only the latest progress report matters; None means the job finished
+        if None not in payloads:
+            stage, done, total, elapsed = payloads[-1]
+            if stage == 'fitting':
+                detail = f"{done}/{total} trees"
+            elif stage == 'loading':
+                detail = f"{done} rows"
+            else:
+                detail = ""
+            self.status_var.set(f"Training Model: {stage} {detail} ({elapsed:.0f}s)")
+            return
+
+        job = self.training_job
+        self.train_button.config(text="Train Model")
+        self.refresh_model_button.config(state=tk.NORMAL)
+        self.update_statistics()
+        if job.mode == 'refresh' and job.status == 'failed' and self.fit_if_refresh_fails:
+            self.fit_if_refresh_fails = False
+            self.log_message(f"Model refresh failed ({job.error}); training a new model", "WARNING")
+            self.train_model()
+            return
+        self.fit_if_refresh_fails = False
+        if job.status == 'succeeded':
+            self.status_var.set(f"Model Trained Successfully ({job.elapsed:.1f}s)")
+            self.log_message(f"Model version {job.version} trained in {job.elapsed:.1f}s and now in use", "INFO")
+            if self.monitor_after_training:
+                self.monitor_after_training = False
+                self.start_monitoring()
+        elif job.status == 'cancelled':
+            self.monitor_after_training = False
+            self.status_var.set("Model Training Cancelled")
+            self.log_message("Model training cancelled", "INFO")
+        else:
+            self.monitor_after_training = False
+            self.status_var.set("Model Training Failed")
+            messagebox.showerror("Error", f"Model training failed: {job.error}")
 
     def save_settings(self):
         try:
@@ -305,16 +442,57 @@ class SecuritySystemGUI:
             self.log_message(f"Error saving settings: {str(e)}", "ERROR")
             messagebox.showerror("Error", f"Failed to save settings: {str(e)}")
 
+    def search_threats(self):
+        # Archived events are decompressed to answer, so search off the Tk thread
+        ip = self.search_var.get().strip() or None
+        threading.Thread(target=self._search_threats, args=(ip,), name="threat-search", daemon=True).start()
+
+    def _search_threats(self, ip):
+        """Run a threat search and report the matches through the log view; safe off the Tk thread."""
+        try:
+            events = threat_log.query(ip=ip, limit=50)
+        except Exception as e:
+            self.log_message(f"Threat search failed: {str(e)}", "ERROR")
+            return
+
+        self.log_message(f"{len(events)} threat events for {ip or 'all addresses'} (newest first)", "INFO")
+        for event in events:
+            details = event.get('details') or {}
+            self.log_message(
+                f"{event['timestamp']} {event['threat_type']} {event['ip_address']}: {details.get('reason', '')}",
+                "THREAT"
+            )
+
     def log_message(self, message, level="INFO"):
-        self.log_text.config(state=tk.NORMAL)
+        # Safe from any thread; the line appears with the next frame
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {level}: {message}\n")
+        self.events.post('log', (timestamp, level, message))
+
+    def on_log(self, entries):
+        if not entries:
+            return
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, "".join(
+            f"[{timestamp}] {level}: {message}\n" for timestamp, level, message in entries
+        ))
+        # Keep the panel bounded
+        lines = int(self.log_text.index("end-1c").split(".")[0])
+        excess = lines - GUI_CONFIG['log_max_lines']
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
 
-def main():
+def main(train=False):
+    # Bring back blocks that were active when the system last stopped
+    security_response.recover()
+    if METRICS_CONFIG['port'] and metrics.serve() is None:
+        logger.warning(f"Could not serve metrics on port {METRICS_CONFIG['port']}")
     root = tk.Tk()
     app = SecuritySystemGUI(root)
+    if train:
+        # Retrains in the background only if needed; the window is usable right away
+        app.check_model()
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,482 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import signal
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import DAEMON_CONFIG
+from detector.anomaly_detector import anomaly_detector
+from detector.schema import column_positions, feature_columns, meta_columns, normalize_columns
+from security.response import security_response
+from utils.logger import logger
+from utils.metrics import metrics, STAGE_SECONDS, STAGE_ROWS
+
+RECORDS = metrics.counter('shcs_ingest_records_total', "Flow records received by the ingestion daemon", ('format',))
+REJECTED = metrics.counter('shcs_ingest_rejected_total', "Flow records or streams the daemon could not use", ('reason',))
+LATENCY = metrics.histogram(
+    'shcs_ingest_latency_seconds', "Time from a batch's first record arriving to its anomalies being handled")
+
+def _line_stats(body):
+    """Per line of a block of complete lines: start, end, comma count, and whether it is quoted or blank.
+
+    Commas and quotes are counted by locating them once and bisecting at
+    each line end, so only lines without a comma are looked at in Python.
+    """
+    data = np.frombuffer(body, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord("\n"))
+    starts = np.concatenate(([0], ends[:-1] + 1))[:len(ends)]
+
+    def per_line(byte):
+        return np.diff(np.searchsorted(np.flatnonzero(data == byte), ends), prepend=0)
+
+    commas = per_line(ord(","))
+    quoted = per_line(ord('"')) > 0
+    blank = np.zeros(len(ends), dtype=bool)
+    for i in np.flatnonzero(commas == 0):
+        blank[i] = not body[starts[i]:ends[i]].strip()
+    return starts, ends, commas, quoted, blank
+
+def _record_lines(body):
+    """Number of non-blank lines in a block of complete lines."""
+    return int((~_line_stats(body)[4]).sum())
+
+def _well_formed(body, n_fields):
+    """``(body, dropped)``: CSV lines that do not have exactly ``n_fields`` fields removed.
+
+    Reading only some columns makes the parser truncate overlong rows
+    instead of skipping them, and it fills short rows with NaN, so field
+    counts are checked here, per line. Quoted lines are left to the parser.
+    """
+    starts, ends, commas, quoted, blank = _line_stats(body)
+    bad = (commas != n_fields - 1) & ~quoted & ~blank
+    if not bad.any():
+        return body, 0
+    kept = b"".join(body[start:end + 1] for start, end in zip(starts[~bad], ends[~bad]))
+    return kept, int(bad.sum())
+
+class _Stream:
+    """Format of one connection or pipe, decided by its first line.
+
+    A line starting with ``{`` makes it NDJSON, one flow object per line;
+    anything else is taken as the header row of CSV lines that follow.
+    """
+
+    __slots__ = ('kind', 'columns')
+
+    def __init__(self, first_line):
+        line = first_line.decode('utf-8-sig').strip()
+        if line.startswith('{'):
+            self.kind = 'json'
+            self.columns = None
+        else:
+            self.kind = 'csv'
+            self.columns = tuple(normalize_columns(next(csv.reader([line]))))
+
+class _Batch:
+    __slots__ = ('parts', 'rows', 'arrived')
+
+    def __init__(self, parts, rows, arrived):
+        self.parts = parts          # (stream, bytes of complete lines, line count) in arrival order
+        self.rows = rows
+        self.arrived = arrived      # Monotonic time the first line arrived
+
+class MicroBatcher:
+    """Collect lines from every stream into batches of ``batch_size`` rows or ``deadline`` seconds.
+
+    Lines are kept as raw bytes; parsing happens on the scoring thread. A
+    finished batch goes into a bounded queue, and ``add`` waits while that
+    queue is full, so readers stop reading and senders are slowed by their
+    own socket buffers filling up.
+    """
+
+    def __init__(self, queue, batch_size=None, deadline=None):
+        self.queue = queue
+        self.batch_size = batch_size or DAEMON_CONFIG['batch_size']
+        self.deadline = DAEMON_CONFIG['batch_deadline'] if deadline is None else deadline
+        self._parts = []
+        self._rows = 0
+        self._arrived = None
+        self._started = asyncio.Event()
+
+    async def add(self, stream, body, rows):
+        if self._arrived is None:
+            self._arrived = time.monotonic()
+            self._started.set()
+        self._parts.append((stream, body, rows))
+        self._rows += rows
+        if self._rows >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._parts:
+            return
+        batch = _Batch(self._parts, self._rows, self._arrived)
+        self._parts, self._rows, self._arrived = [], 0, None
+        self._started.clear()
+        await self.queue.put(batch)
+
+    async def run_deadlines(self):
+        """Flush a partial batch once its first line is ``deadline`` seconds old."""
+        while True:
+            await self._started.wait()
+            arrived = self._arrived
+            delay = arrived + self.deadline - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # A size-triggered flush may already have taken that batch
+            if self._arrived == arrived:
+                await self.flush()
+
+class IngestDaemon:
+    """Receive flow records over sockets and pipes, score them in micro-batches and block offenders.
+
+    Records arrive as NDJSON or CSV lines on a Unix socket, a TCP port on
+    localhost and any number of named pipes (FIFOs). They are grouped into
+    batches of ``batch_size`` rows, or whatever arrived within
+    ``batch_deadline`` seconds. One thread parses batches while another
+    scores the previous one (both release the GIL for most of their work)
+    and hands its anomalies to ``SecurityResponse``. At most
+    ``queue_batches`` batches wait for parsing; beyond that the daemon stops
+    reading, which pushes back on senders instead of buffering without bound.
+    """
+
+    def __init__(self, detector=None, response=None, unix_socket=None, tcp_host=None, tcp_port=None,
+                 pipes=None, batch_size=None, batch_deadline=None, queue_batches=None, block=None):
+        self.detector = detector or anomaly_detector
+        self.response = response or security_response
+        self.unix_socket = DAEMON_CONFIG['unix_socket'] if unix_socket is None else unix_socket
+        self.tcp_host = tcp_host or DAEMON_CONFIG['tcp_host']
+        self.tcp_port = DAEMON_CONFIG['tcp_port'] if tcp_port is None else tcp_port
+        self.pipes = list(DAEMON_CONFIG['pipes'] if pipes is None else pipes)
+        self.batch_size = batch_size or DAEMON_CONFIG['batch_size']
+        self.batch_deadline = DAEMON_CONFIG['batch_deadline'] if batch_deadline is None else batch_deadline
+        self.queue_batches = queue_batches or DAEMON_CONFIG['queue_batches']
+        self.block = DAEMON_CONFIG['block'] if block is None else block
+        self.stats = {'records': 0, 'batches': 0, 'anomalies': 0, 'blocked': 0, 'rejected': 0}
+        self.bound_port = None
+        self._servers = []
+        self._tasks = []
+        self._handlers = set()
+        self._queue = None
+        self._parsed = None
+        self._batcher = None
+        self._workers = []          # Deadline, parsing and scoring tasks
+        self._stopping = None
+        self._loop = None
+        self._parse_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-parse")
+        self._score_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-score")
+        self._layouts = {}          # CSV header -> (features, metadata columns, their positions)
+
+    async def start(self):
+        """Open every configured listener and start the batching and scoring tasks."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        # Load the model before accepting records, so the first batch does not wait for it
+        if await self._loop.run_in_executor(self._score_thread, lambda: self.detector.pipeline) is None:
+            logger.warning("No trained model yet; received records cannot be scored until one is published")
+        self._queue = asyncio.Queue(self.queue_batches)
+        # One parsed batch may wait while the previous one is scored
+        self._parsed = asyncio.Queue(1)
+        self._batcher = MicroBatcher(self._queue, self.batch_size, self.batch_deadline)
+        metrics.gauge('shcs_ingest_queue_batches', "Batches waiting to be parsed and scored").set_function(
+            lambda: self._queue.qsize() + self._parsed.qsize())
+        self._workers = [
+            asyncio.create_task(self._batcher.run_deadlines(), name="ingest-deadlines"),
+            asyncio.create_task(self._parse_batches(), name="ingest-parsing"),
+            asyncio.create_task(self._score_batches(), name="ingest-scoring")
+        ]
+
+        if self.unix_socket and hasattr(asyncio, 'start_unix_server'):
+            directory = os.path.dirname(self.unix_socket)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.unix_socket):
+                # Left behind by a daemon that did not shut down cleanly
+                os.remove(self.unix_socket)
+            self._servers.append(await asyncio.start_unix_server(self._handle_connection, self.unix_socket))
+            logger.info(f"Ingestion daemon listening on {self.unix_socket}")
+        if self.tcp_port is not None:
+            server = await asyncio.start_server(self._handle_connection, self.tcp_host, self.tcp_port)
+            self.bound_port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            logger.info(f"Ingestion daemon listening on {self.tcp_host}:{self.bound_port}")
+        for path in self.pipes:
+            self._tasks.append(asyncio.create_task(self._read_pipe(path), name=f"ingest-pipe-{path}"))
+            logger.info(f"Ingestion daemon reading named pipe {path}")
+        return self
+
+    def stop(self):
+        """Ask the daemon to shut down; safe to call from any thread or a signal handler."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def serve(self):
+        """Run until ``stop()``, then drain what was received and close."""
+        await self.start()
+        try:
+            await self._stopping.wait()
+        finally:
+            await self.close()
+
+    def run(self):
+        """Run the daemon on a new event loop until SIGINT or SIGTERM."""
+        async def main():
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(signum, self.stop)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            self._loop = loop
+            await self.serve()
+
+        asyncio.run(main())
+
+    async def close(self):
+        """Stop accepting records, score everything already received and shut down."""
+        for server in self._servers:
+            server.close()
+        # Open connections are dropped first; newer Pythons wait for them in wait_closed()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Everything read so far is scored before the workers stop
+        deadlines, parsing, scoring = self._workers
+        deadlines.cancel()
+        await self._batcher.flush()
+        await self._queue.put(None)
+        await asyncio.gather(parsing, scoring)
+        self._workers = []
+        self._parse_thread.shutdown()
+        self._score_thread.shutdown()
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+        logger.info(f"Ingestion daemon stopped: {self.stats['records']} records in {self.stats['batches']} batches, "
+                    f"{self.stats['anomalies']} anomalies, {self.stats['blocked']} addresses blocked")
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or "unix socket"
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            await self._read_stream(reader, str(peer))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Ingestion stream from {peer} failed: {str(e)}")
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _read_pipe(self, path):
+        """Read a named pipe, creating it if needed; it stays open across writers."""
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        elif not stat.S_ISFIFO(os.stat(path).st_mode):
+            logger.error(f"{path} is not a named pipe")
+            return
+        # Opened read-write so the pipe never reports end-of-file between writers
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        pipe = os.fdopen(fd, 'rb', buffering=0)
+        reader = asyncio.StreamReader(limit=DAEMON_CONFIG['read_size'] * 2)
+        transport, _ = await self._loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        try:
+            await self._read_stream(reader, path)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Named pipe {path} failed: {str(e)}")
+        finally:
+            transport.close()
+
+    async def _read_stream(self, reader, source):
+        """Hand complete lines of one stream to the batcher until it ends."""
+        read_size = DAEMON_CONFIG['read_size']
+        max_line = DAEMON_CONFIG['max_line_bytes']
+        stream = None
+        pending = b""
+        skipping = False    # Dropping the rest of an overlong line
+        while True:
+            data = await reader.read(read_size)
+            eof = not data
+            if eof:
+                if not pending or skipping:
+                    break
+                # A last line without a newline still counts
+                data = b"\n"
+            data = pending + data
+            end = data.rfind(b"\n")
+            if end < 0:
+                if len(data) > max_line:
+                    REJECTED.inc(reason='line_too_long')
+                    self.stats['rejected'] += 1
+                    skipping = True
+                    data = b""
+                pending = data
+                continue
+            body, pending = data[:end + 1], data[end + 1:]
+            if skipping:
+                body = body[body.find(b"\n") + 1:]
+                skipping = False
+
+            if stream is None:
+                first, _, rest = body.lstrip().partition(b"\n")
+                if not first.strip():
+                    continue
+                try:
+                    stream = _Stream(first)
+                except Exception as e:
+                    REJECTED.inc(reason='bad_header')
+                    logger.error(f"Unreadable first line from {source}: {str(e)}")
+                    return
+                if stream.kind == 'csv':
+                    body = rest
+                logger.info(f"Receiving {stream.kind.upper()} flow records from {source}")
+
+            rows = body.count(b"\n")
+            if rows:
+                RECORDS.inc(rows, format=stream.kind)
+                await self._batcher.add(stream, body, rows)
+            if eof:
+                break
+
+    async def _parse_batches(self):
+        while True:
+            batch = await self._queue.get()
+            if batch is None:
+                await self._parsed.put(None)
+                return
+            try:
+                frame = await self._loop.run_in_executor(self._parse_thread, self._parse_batch, batch)
+            except Exception as e:
+                REJECTED.inc(batch.rows, reason='unparsable_batch')
+                logger.error(f"Failed to parse a batch of {batch.rows} flow records: {str(e)}")
+                continue
+            await self._parsed.put((batch, frame))
+
+    async def _score_batches(self):
+        while True:
+            item = await self._parsed.get()
+            if item is None:
+                return
+            try:
+                await self._loop.run_in_executor(self._score_thread, self._process, *item)
+            except Exception as e:
+                logger.error(f"Failed to score a batch of {item[0].rows} flow records: {str(e)}")
+
+    def _csv_layout(self, columns):
+        """Columns to parse from a CSV header: the features plus flow metadata."""
+        layout = self._layouts.get(columns)
+        if layout is None:
+            features = feature_columns(columns)
+            meta = meta_columns(columns)
+            order = features + meta
+            layout = self._layouts[columns] = (features, meta, column_positions(columns, order))
+        return layout
+
+    def _parse(self, batch):
+        """Turn a batch's raw lines into one frame; unusable lines are counted and dropped."""
+        import pandas as pd
+        frames = []
+        parts = batch.parts
+        start = 0
+        # Consecutive parts of the same format and header are parsed together
+        for end in range(1, len(parts) + 1):
+            stream = parts[start][0]
+            if end < len(parts) and parts[end][0].kind == stream.kind and parts[end][0].columns == stream.columns:
+                continue
+            body = b"".join(part[1] for part in parts[start:end])
+            start = end
+            if stream.kind == 'csv':
+                features, meta, usecols = self._csv_layout(stream.columns)
+                body, dropped = _well_formed(body, len(stream.columns))
+                lines = _record_lines(body)
+                options = dict(header=None, names=list(stream.columns), usecols=usecols, on_bad_lines='skip')
+                loose_dtype = dict.fromkeys(meta, str)
+                try:
+                    frame = pd.read_csv(io.BytesIO(body), dtype={**dict.fromkeys(features, np.float32), **loose_dtype},
+                                        **options)
+                except ValueError:
+                    # Stray text in a numeric column: parse loosely and treat it as missing
+                    REJECTED.inc(reason='non_numeric')
+                    frame = pd.read_csv(io.BytesIO(body), dtype=loose_dtype, **options)
+                    frame[features] = frame[features].apply(pd.to_numeric, errors='coerce')
+                # Rows the parser skipped as malformed count as rejected too
+                skipped = dropped + max(lines - len(frame), 0)
+                if skipped:
+                    REJECTED.inc(skipped, reason='bad_csv')
+                    self.stats['rejected'] += skipped
+                frames.append(frame[features + meta])
+            else:
+                records = []
+                for line in body.splitlines():
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        REJECTED.inc(reason='bad_json')
+                        self.stats['rejected'] += 1
+                frame = pd.DataFrame.from_records(records)
+                names = [" ".join(str(name).split()) for name in frame.columns]
+                if len(set(names)) < len(names):
+                    # Senders spelling a field differently (" Source IP", "Source IP") fill one column
+                    spellings = {}
+                    for name, column in zip(names, frame.columns):
+                        spellings.setdefault(name, []).append(column)
+                    frame = pd.DataFrame({
+                        name: frame[columns].bfill(axis=1).iloc[:, 0] for name, columns in spellings.items()
+                    })
+                else:
+                    frame.columns = names
+                meta = meta_columns(frame.columns)
+                schema = self.detector._current_model()[0]['schema']
+                if schema is not None:
+                    # Objects may leave a few fields out, repaired like empty cells
+                    frame = frame.reindex(columns=list(schema.names) + meta)
+                for name in frame.columns:
+                    if name not in meta and frame[name].dtype == object:
+                        frame[name] = pd.to_numeric(frame[name], errors='coerce')
+                if schema is not None:
+                    # ... but records missing most of the model's features are not scored
+                    n_features = len(schema.names)
+                    missing = frame[schema.names].isna().sum(axis=1).to_numpy()
+                    unusable = (missing == n_features) | (missing > DAEMON_CONFIG['max_missing_features'] * n_features)
+                    if unusable.any():
+                        REJECTED.inc(int(unusable.sum()), reason='missing_features')
+                        self.stats['rejected'] += int(unusable.sum())
+                        frame = frame[~unusable].reset_index(drop=True)
+                frames.append(frame)
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _parse_batch(self, batch):
+        with STAGE_SECONDS.time(stage='ingest_parse'):
+            frame = self._parse(batch)
+        STAGE_ROWS.inc(len(frame), stage='ingest_parse')
+        return frame
+
+    def _process(self, batch, frame):
+        """Score one parsed batch and respond to its anomalies; runs on the scoring thread."""
+        if frame.empty:
+            return
+        results = self.detector.predict(frame)
+        if results is None:
+            return
+        self.stats['records'] += len(frame)
+        self.stats['batches'] += 1
+        self.stats['anomalies'] += len(results['anomalies'])
+        if self.block and len(results['anomalies']):
+            self.stats['blocked'] += len(self.response.respond_to_anomalies(results))
+        LATENCY.observe(time.monotonic() - batch.arrived)
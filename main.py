@@ -1,24 +1,73 @@
 import os
 import sys
-from config import DATA_DIR, MODEL_PATH
+import time
+
+STARTED = time.monotonic()
+
+from config import DATA_DIR, METRICS_CONFIG, MODEL_PATH
 from detector.anomaly_detector import anomaly_detector
+from detector.training import TrainingJob
 from security.response import security_response
 from utils.logger import logger
+from utils.metrics import metrics
+
+def log_training_progress(job, stage, done, total):
+    # Loading is reported per file by the detector itself
+    if stage == 'fitting':
+        logger.info(f"Training: fitted {done}/{total} trees ({job.elapsed:.1f}s)")
+    elif stage != 'loading':
+        logger.info(f"Training: {stage} ({job.elapsed:.1f}s)")
+
+def run_training_job(mode):
+    """Train in a separate process and wait for it; Ctrl+C cancels it. Return True if a model was published."""
+    job = TrainingJob(on_progress=log_training_progress, mode=mode).start()
+    try:
+        return job.wait()
+    except KeyboardInterrupt:
+        job.cancel()
+        job.wait()
+        raise
+
+def log_stage_timings():
+    """Log where the run spent its time, slowest stage first."""
+    stages = metrics.snapshot().get('shcs_stage_seconds', {})
+    for label, timing in sorted(stages.items(), key=lambda item: -item[1]['sum']):
+        logger.info(f"Stage {label.split('=', 1)[1]}: {timing['sum']:.3f}s over {timing['count']} calls "
+                    f"(p95 {timing['p95'] * 1000:.1f} ms)")
 
 def main():
     try:
         # Train the model with sample data
         logger.info("Starting the anomaly detection system...")
+
+        # Bring back blocks that were active when the system last stopped
+        security_response.recover()
+
+        if METRICS_CONFIG['port'] and metrics.serve() is None:
+            logger.warning(f"Could not serve metrics on port {METRICS_CONFIG['port']}")
         
-        # Force training with sample data
-        logger.info("Training the model with sample data...")
-        if not anomaly_detector.train():
-            logger.error("Failed to train model. Exiting.")
-            sys.exit(1)
+        # Reuse the model if it was trained on the data and settings in place now
+        mode = anomaly_detector.update_mode()
+        if mode is not None:
+            trained = False
+            if mode == 'refresh':
+                logger.info("Refreshing the model with recent data...")
+                trained = run_training_job('refresh')
+                if not trained:
+                    logger.warning("Could not refresh the model; training a new one")
+            if not trained:
+                logger.info("Training the model with sample data...")
+                trained = run_training_job('full')
+            if not trained:
+                # The previous model, if any, is still published
+                if anomaly_detector.pipeline is None:
+                    logger.error("Failed to train model. Exiting.")
+                    sys.exit(1)
+                logger.warning("Training did not complete; using the previous model")
         
         # Load and preprocess test data
         logger.info("Loading test data...")
-        test_data = anomaly_detector.load_data()
+        test_data = anomaly_detector.load_data(stream=True)
         if test_data is None:
             logger.error("No test data available. Exiting.")
             sys.exit(1)
@@ -30,25 +79,15 @@ def main():
             logger.error("Prediction failed. Exiting.")
             sys.exit(1)
 
-        # Process anomalies
-        for idx in results['anomalies']:
-            # Simulate malicious IP (in real scenario, this would come from the data)
-            malicious_ip = f"192.168.1.{100 + idx}"
-            
-            try:
-                # Block the IP with a reason
-                security_response.block_ip(
-                    malicious_ip,
-                    reason=f"Anomaly detected in row {idx} with score {results['scores'][idx]:.2f}"
-                )
-                
-                logger.info(f"Successfully processed threat from IP {malicious_ip}")
-            except Exception as e:
-                logger.error(f"Failed to process threat from IP {malicious_ip}: {str(e)}")
+        # Process anomalies, one block decision per offending source IP
+        blocked = security_response.respond_to_anomalies(results)
+        for ip in blocked:
+            logger.info(f"Successfully processed threat from IP {ip}")
 
         # Print summary
         total_anomalies = len(results['anomalies'])
-        logger.info(f"Analysis complete. Found {total_anomalies} anomalies.")
+        logger.info(f"Analysis complete. Found {total_anomalies} anomalies "
+                    f"({time.monotonic() - STARTED:.1f}s after start).")
         
         if total_anomalies > 0:
             logger.info("Blocked IPs:")
@@ -56,6 +95,7 @@ def main():
                 logger.info(f"- {ip} (Blocked at: {info['block_time']}, Reason: {info['reason']})")
         else:
             logger.info("No anomalies detected in this analysis.")
+        log_stage_timings()
 
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
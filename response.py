@@ -1,22 +1,23 @@
-import os
-import time
+from security.firewall import firewall
+from utils.logger import logger
 
 def block_ip(ip_address):
     """
-    Blocks the malicious IP using iptables.
+    Blocks the malicious IP through the configured firewall backend.
     """
     print(f"[ALERT] Blocking malicious IP: {ip_address}")
     try:
-        # Block the IP using iptables (requires superuser privileges)
-        os.system(f"sudo iptables -A INPUT -s {ip_address} -j DROP")
+        # Queue the block; batching backends apply it in one transaction
+        if not firewall.block(ip_address):
+            print(f"Error blocking IP {ip_address}")
+            return
         print(f"IP {ip_address} has been blocked.")
     except Exception as e:
         print(f"Error blocking IP {ip_address}: {str(e)}")
 
 def log_threat(ip_address):
     """
-    Logs the blocked IP address into a log file.
+    Logs the blocked IP address to the indexed threat log.
     """
-    with open("logs/threats.log", "a") as log_file:
-        log_file.write(f"Blocked IP: {ip_address} at {time.ctime()}\n")
+    logger.log_threat(ip_address, 'IP_BLOCKED', {'source': 'response.py'})
     print(f"[LOG] Threat from {ip_address} logged.")
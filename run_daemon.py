@@ -0,0 +1,40 @@
+import argparse
+from config import DAEMON_CONFIG, METRICS_CONFIG
+from detector.anomaly_detector import anomaly_detector
+from ingest.daemon import IngestDaemon
+from security.response import security_response
+from utils.logger import logger
+from utils.metrics import metrics
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score live flow records sent over sockets and named pipes")
+    parser.add_argument("--unix-socket", default=DAEMON_CONFIG['unix_socket'], help="Unix socket path; empty disables it")
+    parser.add_argument("--tcp-port", type=int, default=DAEMON_CONFIG['tcp_port'], help="TCP port; -1 disables it")
+    parser.add_argument("--pipe", action="append", default=None, help="Named pipe to read (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=DAEMON_CONFIG['batch_size'])
+    parser.add_argument("--batch-deadline", type=float, default=DAEMON_CONFIG['batch_deadline'], help="Seconds")
+    parser.add_argument("--no-block", action="store_true", help="Score and log anomalies without blocking")
+    args = parser.parse_args(argv)
+
+    # Bring back blocks that were active when the system last stopped
+    security_response.recover()
+    if METRICS_CONFIG['port'] and metrics.serve() is None:
+        logger.warning(f"Could not serve metrics on port {METRICS_CONFIG['port']}")
+
+    # Retrains only when the data or settings changed since the model was fitted
+    if not anomaly_detector.ensure_model():
+        logger.error("No trained model available. Exiting.")
+        return 1
+
+    IngestDaemon(
+        unix_socket=args.unix_socket,
+        tcp_port=None if args.tcp_port is not None and args.tcp_port < 0 else args.tcp_port,
+        pipes=args.pipe,
+        batch_size=args.batch_size,
+        batch_deadline=args.batch_deadline,
+        block=not args.no_block
+    ).run()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
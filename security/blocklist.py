@@ -0,0 +1,314 @@
+import socket
+from array import array
+from config import BLOCKLIST_CONFIG
+
+# Expiry values stored in the trie: deadlines in time.monotonic_ns() units
+NO_RULE = 0
+PERMANENT = (1 << 63) - 1
+
+_FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+class _PrefixTrie:
+    """Path-compressed binary prefix trie over fixed-width integer addresses.
+
+    Only rules and branching points get a node, so ``n`` rules need fewer
+    than ``2n`` nodes. Nodes live in flat typed arrays indexed by node number
+    (node 0 is the root and a child index of 0 means "no child"), so each
+    costs a few machine words instead of a Python object. Lookups visit at
+    most one node per prefix bit.
+    """
+
+    def __init__(self, bits):
+        self.bits = bits
+        # IPv6 keys do not fit a machine word and stay Python ints
+        self.keys = array('Q', [0]) if bits <= 64 else [0]
+        self.prefixlens = array('B', [0])
+        self.children = (array('q', [0]), array('q', [0]))
+        self.expiry = array('q', [NO_RULE])
+        self.hosts = array('q', [0])   # Host rules (full-length prefixes) in each subtree
+        self._free = []
+
+    def _new_node(self, key, prefixlen, expiry=NO_RULE):
+        if self._free:
+            node = self._free.pop()
+            self.keys[node] = key
+            self.prefixlens[node] = prefixlen
+            self.children[0][node] = self.children[1][node] = 0
+            self.expiry[node] = expiry
+            self.hosts[node] = 0
+            return node
+        self.keys.append(key)
+        self.prefixlens.append(prefixlen)
+        self.children[0].append(0)
+        self.children[1].append(0)
+        self.expiry.append(expiry)
+        self.hosts.append(0)
+        return len(self.expiry) - 1
+
+    def _bit(self, value, depth):
+        return (value >> (self.bits - 1 - depth)) & 1
+
+    def _common(self, a, b, limit):
+        """Length of the common prefix of ``a`` and ``b``, at most ``limit``."""
+        return min(self.bits - (a ^ b).bit_length(), limit)
+
+    def _descend(self, value, prefixlen):
+        """Nodes from the root towards ``value/prefixlen`` whose prefixes contain it."""
+        bits, keys, prefixlens, children = self.bits, self.keys, self.prefixlens, self.children
+        node = depth = 0
+        nodes = [node]
+        while depth < prefixlen:
+            child = children[(value >> (bits - 1 - depth)) & 1][node]
+            if child == 0:
+                break
+            child_len = prefixlens[child]
+            if child_len > prefixlen or (keys[child] ^ value) >> (bits - child_len):
+                break
+            node, depth = child, child_len
+            nodes.append(node)
+        return nodes
+
+    def _find(self, value, prefixlen):
+        """Path to the node for exactly ``value/prefixlen``, or None."""
+        nodes = self._descend(value, prefixlen)
+        return nodes if self.prefixlens[nodes[-1]] == prefixlen else None
+
+    def _top_within(self, value, prefixlen):
+        """Highest node whose prefix lies within ``value/prefixlen``, or None."""
+        nodes = self._descend(value, prefixlen)
+        node = nodes[-1]
+        if self.prefixlens[node] == prefixlen:
+            return node
+        child = self.children[self._bit(value, self.prefixlens[node])][node]
+        if child and self._common(self.keys[child], value, prefixlen) == prefixlen:
+            return child
+        return None
+
+    def get(self, value, prefixlen):
+        """Expiry of the rule at exactly ``value/prefixlen``, or NO_RULE."""
+        nodes = self._find(value, prefixlen)
+        return NO_RULE if nodes is None else self.expiry[nodes[-1]]
+
+    def hosts_within(self, value, prefixlen):
+        """Number of host rules inside ``value/prefixlen``."""
+        node = self._top_within(value, prefixlen)
+        return 0 if node is None else self.hosts[node]
+
+    def set(self, value, prefixlen, expiry):
+        """Create or update the rule at ``value/prefixlen``; return True if it is new."""
+        nodes = self._descend(value, prefixlen)
+        parent = nodes[-1]
+        if self.prefixlens[parent] == prefixlen:
+            created = self.expiry[parent] == NO_RULE
+            self.expiry[parent] = expiry
+        else:
+            created = True
+            side = self.children[self._bit(value, self.prefixlens[parent])]
+            child = side[parent]
+            node = attach = self._new_node(value, prefixlen, expiry)
+            if child:
+                common = self._common(self.keys[child], value, prefixlen)
+                if common == prefixlen:
+                    # The new rule sits between parent and child
+                    self.children[self._bit(self.keys[child], prefixlen)][node] = child
+                    self.hosts[node] = self.hosts[child]
+                else:
+                    # Branch where the new rule and the child diverge
+                    shift = self.bits - common
+                    attach = self._new_node(value >> shift << shift, common)
+                    self.children[self._bit(self.keys[child], common)][attach] = child
+                    self.children[self._bit(value, common)][attach] = node
+                    self.hosts[attach] = self.hosts[child]
+                    nodes.append(attach)
+            side[parent] = attach
+            nodes.append(node)
+
+        if created and prefixlen == self.bits:
+            for n in nodes:
+                self.hosts[n] += 1
+        return created
+
+    def clear(self, value, prefixlen):
+        """Remove the rule at ``value/prefixlen``; return its expiry or NO_RULE."""
+        nodes = self._find(value, prefixlen)
+        if nodes is None or self.expiry[nodes[-1]] == NO_RULE:
+            return NO_RULE
+
+        node = nodes[-1]
+        expiry = self.expiry[node]
+        self.expiry[node] = NO_RULE
+        if prefixlen == self.bits:
+            for n in nodes:
+                self.hosts[n] -= 1
+
+        # Drop nodes that no longer hold a rule or a branching point
+        for depth in range(len(nodes) - 1, 0, -1):
+            node = nodes[depth]
+            if self.expiry[node] != NO_RULE:
+                break
+            zero, one = self.children[0][node], self.children[1][node]
+            if zero and one:
+                break
+            parent = nodes[depth - 1]
+            self.children[self._bit(self.keys[node], self.prefixlens[parent])][parent] = zero or one
+            self._free.append(node)
+            if zero or one:
+                break
+        return expiry
+
+    def covering(self, value):
+        """Widest rule covering ``value`` as ``(prefixlen, expiry)``, or None."""
+        for node in self._descend(value, self.bits):
+            if self.expiry[node] != NO_RULE:
+                return self.prefixlens[node], self.expiry[node]
+        return None
+
+    def walk(self, value=0, prefixlen=0):
+        """Yield ``(value, prefixlen, expiry)`` for every rule at or below a prefix."""
+        top = self._top_within(value, prefixlen)
+        if top is None:
+            return
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            if self.expiry[node] != NO_RULE:
+                yield self.keys[node], self.prefixlens[node], self.expiry[node]
+            for bit in (1, 0):
+                child = self.children[bit][node]
+                if child:
+                    stack.append(child)
+
+class Blocklist:
+    """Blocked IPv4/IPv6 addresses and CIDR ranges with monotonic expiries.
+
+    Rules are keyed by their canonical string: a bare address for single
+    hosts and ``network/prefix`` for ranges. Expiries are
+    ``time.monotonic_ns()`` deadlines, or PERMANENT. Once
+    ``aggregate_threshold`` hosts are blocked inside one aggregate prefix,
+    the next one collapses them all into a single CIDR rule lasting as long
+    as the longest of them; a rule also absorbs any narrower rules below it.
+    """
+
+    def __init__(self, aggregate_threshold=None, aggregate_prefixes=None):
+        if aggregate_threshold is None:
+            aggregate_threshold = BLOCKLIST_CONFIG['aggregate_threshold']
+        self.aggregate_threshold = aggregate_threshold
+        self.aggregate_prefixes = aggregate_prefixes or {
+            4: BLOCKLIST_CONFIG['aggregate_prefix_v4'],
+            6: BLOCKLIST_CONFIG['aggregate_prefix_v6']
+        }
+        self._tries = {4: _PrefixTrie(32), 6: _PrefixTrie(128)}
+        self._count = 0
+
+    @staticmethod
+    def _parse(rule):
+        """Split an address or CIDR string into ``(version, value, prefixlen)``.
+
+        Host bits below the prefix are cleared, as ``ip_network(strict=False)``
+        would. Raises ValueError for anything that is not an address or range.
+        """
+        address, slash, prefix = str(rule).strip().partition('/')
+        version = 6 if ':' in address else 4
+        try:
+            packed = socket.inet_pton(_FAMILIES[version], address)
+        except OSError:
+            raise ValueError(f"Invalid IP address: {rule!r}") from None
+
+        bits = len(packed) * 8
+        prefixlen = int(prefix) if slash else bits
+        if not 0 <= prefixlen <= bits:
+            raise ValueError(f"Invalid prefix length: {rule!r}")
+        shift = bits - prefixlen
+        return version, int.from_bytes(packed, 'big') >> shift << shift, prefixlen
+
+    @staticmethod
+    def _format(version, value, prefixlen):
+        bits = 32 if version == 4 else 128
+        address = socket.inet_ntop(_FAMILIES[version], value.to_bytes(bits // 8, 'big'))
+        return address if prefixlen == bits else f"{address}/{prefixlen}"
+
+    @classmethod
+    def sort_key(cls, rule):
+        """Key ordering rules by family, then numerically by address and prefix."""
+        return cls._parse(rule)
+
+    @classmethod
+    def canonical(cls, rule):
+        """Canonical key for an address or CIDR string; raises ValueError if invalid."""
+        return cls._format(*cls._parse(rule))
+
+    def add(self, rule, expiry, aggregate=True):
+        """Block an address or range until ``expiry``.
+
+        Returns ``(key, created, replaced)``: the key of the rule now
+        covering ``rule``, whether that rule is new, and the ``(key, expiry)``
+        pairs of narrower rules it absorbed. An address already covered by a
+        wider rule extends that rule's expiry instead of adding a new one.
+        """
+        version, value, prefixlen = self._parse(rule)
+        trie = self._tries[version]
+
+        covered = trie.covering(value)
+        if covered is not None and covered[0] <= prefixlen:
+            depth, current = covered
+            value = value >> (trie.bits - depth) << (trie.bits - depth)
+            if depth == prefixlen or expiry > current:
+                trie.set(value, depth, expiry)
+            return self._format(version, value, depth), False, []
+
+        aggregate_prefix = self.aggregate_prefixes[version]
+        if aggregate and self.aggregate_threshold and prefixlen == trie.bits:
+            shift = trie.bits - aggregate_prefix
+            parent = value >> shift << shift
+            if trie.hosts_within(parent, aggregate_prefix) + 1 >= self.aggregate_threshold:
+                value, prefixlen = parent, aggregate_prefix
+
+        replaced = list(trie.walk(value, prefixlen))
+        for narrower, length, _ in replaced:
+            trie.clear(narrower, length)
+        expiry = max([expiry] + [e for _, _, e in replaced])
+        trie.set(value, prefixlen, expiry)
+        self._count += 1 - len(replaced)
+
+        replaced = [(self._format(version, v, p), e) for v, p, e in replaced]
+        return self._format(version, value, prefixlen), True, replaced
+
+    def remove(self, rule):
+        """Remove the rule with exactly this key; return True if it existed."""
+        version, value, prefixlen = self._parse(rule)
+        if self._tries[version].clear(value, prefixlen) == NO_RULE:
+            return False
+        self._count -= 1
+        return True
+
+    def expiry(self, rule):
+        """Expiry of the rule with exactly this key, or None."""
+        version, value, prefixlen = self._parse(rule)
+        expiry = self._tries[version].get(value, prefixlen)
+        return None if expiry == NO_RULE else expiry
+
+    def covering(self, address):
+        """``(key, expiry)`` of the rule covering an address, or None."""
+        version, value, _ = self._parse(address)
+        trie = self._tries[version]
+        covered = trie.covering(value)
+        if covered is None:
+            return None
+        depth, expiry = covered
+        value = value >> (trie.bits - depth) << (trie.bits - depth)
+        return self._format(version, value, depth), expiry
+
+    def __contains__(self, rule):
+        try:
+            return self.expiry(rule) is not None
+        except ValueError:
+            return False
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """Yield ``(key, expiry)`` for every rule."""
+        for version, trie in self._tries.items():
+            for value, prefixlen, expiry in trie.walk():
+                yield self._format(version, value, prefixlen), expiry
@@ -0,0 +1,378 @@
+import atexit
+import platform
+import shlex
+import shutil
+import subprocess
+import threading
+from config import FIREWALL_CONFIG
+from utils.logger import logger
+from utils.metrics import STAGE_SECONDS, STAGE_ROWS
+
+class FirewallBackend:
+    """Interface for applying block and unblock rules to the host firewall.
+
+    Backends that queue operations return True from ``block``/``unblock``
+    once an operation is accepted; operations they later give up on are
+    passed to ``on_failure`` as ``{rule: 'add' | 'del'}``.
+    """
+
+    on_failure = None
+
+    def _report_failure(self, operations):
+        if self.on_failure is not None and operations:
+            try:
+                self.on_failure(operations)
+            except Exception as e:
+                logger.error(f"Firewall failure handler failed: {str(e)}")
+
+    def block(self, ip_address):
+        """Block traffic from an IPv4/IPv6 address or CIDR range; return True if accepted."""
+        raise NotImplementedError
+
+    def unblock(self, ip_address):
+        """Lift a block on an address or CIDR range; return True if accepted."""
+        raise NotImplementedError
+
+    def list_blocked(self):
+        """Addresses and ranges currently blocked by this backend, or None if unknown."""
+        return None
+
+    def flush(self):
+        """Apply any queued operations now."""
+        return True
+
+    def remove_stale(self):
+        """Remove rules this backend left behind under an old configuration; return how many."""
+        return 0
+
+    def close(self):
+        """Apply queued operations and release resources."""
+        self.flush()
+
+class CommandBackend(FirewallBackend):
+    """One firewall command per operation (iptables on Linux, netsh on Windows)."""
+
+    def __init__(self, system=None, use_sudo=None):
+        self.system = system or platform.system().lower()
+        self.use_sudo = FIREWALL_CONFIG['use_sudo'] if use_sudo is None else use_sudo
+
+    def _sudo(self):
+        return ["sudo"] if self.use_sudo and self.system != 'windows' else []
+
+    def _iptables(self, ip_address):
+        return "ip6tables" if ':' in ip_address else "iptables"
+
+    def _get_block_command(self, ip_address):
+        """Get platform-specific block command."""
+        if self.system == 'linux':
+            return self._sudo() + [self._iptables(ip_address), "-A", "INPUT", "-s", ip_address, "-j", "DROP"]
+        elif self.system == 'windows':
+            return ["netsh", "advfirewall", "firewall", "add", "rule", f"name=Block IP {ip_address}",
+                    "dir=in", "action=block", f"remoteip={ip_address}", "enable=yes"]
+        else:
+            raise NotImplementedError(f"Platform {self.system} not supported")
+
+    def _get_check_command(self, ip_address):
+        """Get platform-specific command that succeeds if the block rule exists."""
+        if self.system == 'linux':
+            return self._sudo() + [self._iptables(ip_address), "-C", "INPUT", "-s", ip_address, "-j", "DROP"]
+        elif self.system == 'windows':
+            return ["netsh", "advfirewall", "firewall", "show", "rule", f"name=Block IP {ip_address}"]
+        else:
+            raise NotImplementedError(f"Platform {self.system} not supported")
+
+    def _get_unblock_command(self, ip_address):
+        """Get platform-specific unblock command."""
+        if self.system == 'linux':
+            return self._sudo() + [self._iptables(ip_address), "-D", "INPUT", "-s", ip_address, "-j", "DROP"]
+        elif self.system == 'windows':
+            return ["netsh", "advfirewall", "firewall", "delete", "rule", f"name=Block IP {ip_address}"]
+        else:
+            raise NotImplementedError(f"Platform {self.system} not supported")
+
+    def _run(self, command):
+        """Run a firewall command and report success."""
+        logger.info(f"Executing command: {shlex.join(command)}")
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.error(f"Failed to execute firewall command. Exit code: {result.returncode}")
+            return False
+        return True
+
+    def block(self, ip_address):
+        # Appending unconditionally would stack duplicate rules for one address
+        if subprocess.run(self._get_check_command(ip_address), capture_output=True).returncode == 0:
+            return True
+        return self._run(self._get_block_command(ip_address))
+
+    def unblock(self, ip_address):
+        return self._run(self._get_unblock_command(ip_address))
+
+    def list_blocked(self):
+        """Parse the DROP rules this backend adds back out of the live firewall."""
+        blocked = set()
+        if self.system == 'linux':
+            for iptables in ("iptables", "ip6tables"):
+                result = subprocess.run(self._sudo() + [iptables, "-S", "INPUT"], capture_output=True, text=True)
+                if result.returncode != 0:
+                    return None
+                for line in result.stdout.splitlines():
+                    parts = line.split()
+                    if len(parts) == 6 and parts[:3] == ["-A", "INPUT", "-s"] and parts[4:] == ["-j", "DROP"]:
+                        blocked.add(parts[3])
+        elif self.system == 'windows':
+            result = subprocess.run(["netsh", "advfirewall", "firewall", "show", "rule", "name=all"],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                return None
+            for line in result.stdout.splitlines():
+                name = line.partition(":")[2].strip()
+                if line.startswith("Rule Name:") and name.startswith("Block IP "):
+                    blocked.add(name[len("Block IP "):])
+        else:
+            return None
+        return blocked
+
+class IpsetBackend(FirewallBackend):
+    """Batch operations into one ``ipset restore`` transaction.
+
+    Blocked addresses and CIDR ranges live in one ``hash:net`` ipset per
+    address family, each matched by a single iptables/ip6tables rule, so the
+    kernel does a hash lookup per packet instead of walking one rule per
+    address. Operations queued within ``batch_window`` seconds are
+    coalesced per address and applied together by a timer thread. A batch
+    that fails is queued again (behind any newer operation for the same
+    address) and retried with exponential backoff; operations still failing
+    after ``retry_limit`` attempts are dropped and reported to ``on_failure``.
+
+    Match rules carry the comment ``rule_comment``, so after ``set_name``
+    changes ``remove_stale()`` can still find the rules pointing at the old
+    sets (which would otherwise keep blocking, invisible to
+    ``list_blocked()``) and delete them along with the sets. Rules created
+    before they were tagged are only recognized for the current set name;
+    ones for an earlier name have to be deleted by hand.
+    """
+
+    def __init__(self, set_name=None, batch_window=None, use_sudo=None, retry_limit=None, retry_max_delay=None):
+        self.set_name = set_name or FIREWALL_CONFIG['set_name']
+        self.batch_window = FIREWALL_CONFIG['batch_window'] if batch_window is None else batch_window
+        self.use_sudo = FIREWALL_CONFIG['use_sudo'] if use_sudo is None else use_sudo
+        self.comment = FIREWALL_CONFIG['rule_comment']
+        self.retry_limit = FIREWALL_CONFIG['retry_limit'] if retry_limit is None else retry_limit
+        self.retry_max_delay = FIREWALL_CONFIG['retry_max_delay'] if retry_max_delay is None else retry_max_delay
+        self._pending = {}    # ip -> 'add' | 'del', last operation wins
+        self._attempts = {}   # ip -> failed attempts of its pending operation
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()   # Held across a whole flush, restore call included
+        self._timer = None
+        self._ready = False
+        atexit.register(self.close)
+
+    def _command(self, *args):
+        return (["sudo"] if self.use_sudo else []) + list(args)
+
+    def _run(self, command, script=None):
+        """Run a command, optionally feeding it a restore script on stdin."""
+        result = subprocess.run(command, input=script, capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.error(f"Firewall command {shlex.join(command)} failed: {result.stderr.strip()}")
+            return False
+        return True
+
+    def _set_for(self, ip_address):
+        """Name of the set holding an address's family."""
+        return f"{self.set_name}6" if ':' in ip_address else self.set_name
+
+    def _ensure_ready(self):
+        """Create the sets and their match rules if they do not exist yet."""
+        if self._ready:
+            return True
+        families = ((self.set_name, "inet", "iptables"), (f"{self.set_name}6", "inet6", "ip6tables"))
+        for set_name, family, iptables in families:
+            if not self._run(self._command("ipset", "create", set_name, "hash:net", "family", family, "-exist")):
+                return False
+
+            rule = ["INPUT", "-m", "set", "--match-set", set_name, "src",
+                    "-m", "comment", "--comment", self.comment, "-j", "DROP"]
+            check = subprocess.run(self._command(iptables, "-C", *rule), capture_output=True)
+            if check.returncode != 0 and not self._run(self._command(iptables, "-I", *rule)):
+                return False
+
+        self._ready = True
+        return True
+
+    def remove_stale(self):
+        """Delete match rules (and their sets) left from an earlier ``set_name``.
+
+        Tagged rules pointing at any other set are removed, as are untagged
+        rules for the current sets that the tagged ones replaced.
+        """
+        if not self._ensure_ready():
+            return 0
+        current = {self.set_name, f"{self.set_name}6"}
+        removed = 0
+        for iptables in ("iptables", "ip6tables"):
+            result = subprocess.run(self._command(iptables, "-S", "INPUT"), capture_output=True, text=True)
+            if result.returncode != 0:
+                continue
+            for line in result.stdout.splitlines():
+                parts = shlex.split(line)
+                if parts[:2] != ["-A", "INPUT"] or "--match-set" not in parts or parts[-2:] != ["-j", "DROP"]:
+                    continue
+                set_name = parts[parts.index("--match-set") + 1]
+                tagged = "--comment" in parts and parts[parts.index("--comment") + 1] == self.comment
+                if tagged == (set_name in current):
+                    continue
+                if self._run(self._command(iptables, "-D", *parts[1:])):
+                    removed += 1
+                    logger.info(f"Removed stale firewall rule matching set {set_name}")
+                    if tagged:
+                        # The set is no longer referenced by this rule; it may still be by others
+                        subprocess.run(self._command("ipset", "destroy", set_name), capture_output=True)
+        return removed
+
+    def _schedule(self, delay):
+        """Start the flush timer; the caller holds the lock."""
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _queue(self, ip_address, operation):
+        with self._lock:
+            self._pending[ip_address] = operation
+            # A new operation starts its own retry count
+            self._attempts.pop(ip_address, None)
+            if self._timer is None:
+                self._schedule(self.batch_window)
+        return True
+
+    def block(self, ip_address):
+        return self._queue(ip_address, 'add')
+
+    def unblock(self, ip_address):
+        return self._queue(ip_address, 'del')
+
+    def list_blocked(self):
+        """Members of both sets, from one ``ipset save`` per set."""
+        blocked = set()
+        for set_name in (self.set_name, f"{self.set_name}6"):
+            result = subprocess.run(self._command("ipset", "save", set_name), capture_output=True, text=True)
+            if result.returncode != 0:
+                # The set does not exist yet, so it blocks nothing
+                continue
+            for line in result.stdout.splitlines():
+                parts = line.split()
+                if len(parts) >= 3 and parts[0] == "add" and parts[1] == set_name:
+                    blocked.add(parts[2])
+        return blocked
+
+    def flush(self):
+        """Apply all queued operations in one ``ipset restore`` call.
+
+        Flushes run one at a time, so batches reach ``ipset restore`` in the
+        order their operations were queued.
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return True
+
+        try:
+            applied = self._ensure_ready()
+            if applied:
+                script = "".join(
+                    f"{operation} {self._set_for(ip_address)} {ip_address} -exist\n"
+                    for ip_address, operation in pending.items()
+                )
+                with STAGE_SECONDS.time(stage='firewall_batch'):
+                    applied = self._run(self._command("ipset", "restore"), script)
+        except Exception as e:
+            logger.error(f"Failed to apply firewall batch: {str(e)}")
+            applied = False
+
+        if not applied:
+            self._retry(pending)
+            return False
+        with self._lock:
+            for ip_address in pending:
+                if ip_address not in self._pending:
+                    self._attempts.pop(ip_address, None)
+        STAGE_ROWS.inc(len(pending), stage='firewall_batch')
+        logger.info(f"Applied {len(pending)} firewall operations to sets {self.set_name}[6]")
+        return True
+
+    def _retry(self, failed):
+        """Queue a failed batch again with backoff, dropping operations out of attempts."""
+        dropped = {}
+        with self._lock:
+            attempts = 0
+            for ip_address, operation in failed.items():
+                if ip_address in self._pending:
+                    # Superseded by a newer operation for the same address
+                    continue
+                count = self._attempts.get(ip_address, 0) + 1
+                if count > self.retry_limit:
+                    self._attempts.pop(ip_address, None)
+                    dropped[ip_address] = operation
+                    continue
+                self._attempts[ip_address] = count
+                self._pending[ip_address] = operation
+                attempts = max(attempts, count)
+            if attempts:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._schedule(min(self.batch_window * 2 ** attempts, self.retry_max_delay))
+        if attempts:
+            logger.warning(f"Retrying {len(failed) - len(dropped)} firewall operations (attempt {attempts + 1})")
+        if dropped:
+            logger.error(f"Gave up on {len(dropped)} firewall operations after {self.retry_limit} retries")
+            self._report_failure(dropped)
+
+class FakeBackend(FirewallBackend):
+    """In-memory firewall for tests and benchmarks; needs no root."""
+
+    def __init__(self):
+        self.rules = set()
+        self.operations = []
+        self._lock = threading.Lock()
+
+    def block(self, ip_address):
+        with self._lock:
+            self.rules.add(ip_address)
+            self.operations.append(('add', ip_address))
+        return True
+
+    def unblock(self, ip_address):
+        with self._lock:
+            self.rules.discard(ip_address)
+            self.operations.append(('del', ip_address))
+        return True
+
+    def list_blocked(self):
+        with self._lock:
+            return set(self.rules)
+
+def create_backend(name=None):
+    """Build the firewall backend named in ``FIREWALL_CONFIG``."""
+    name = name or FIREWALL_CONFIG['backend']
+    if name == 'auto':
+        linux = platform.system().lower() == 'linux'
+        name = 'ipset' if linux and shutil.which('ipset') else 'command'
+
+    if name == 'ipset':
+        return IpsetBackend()
+    elif name == 'command':
+        return CommandBackend()
+    elif name == 'fake':
+        return FakeBackend()
+    raise ValueError(f"Unknown firewall backend: {name}")
+
+# Create a singleton instance
+firewall = create_backend()
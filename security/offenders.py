@@ -0,0 +1,42 @@
+def aggregate_offenders(results):
+    """Group the anomalous flows of a scoring result by source IP.
+
+    Returns a DataFrame indexed by source IP with the number of anomalous
+    flows, the worst (lowest) decision score and the earliest/latest time
+    the address was seen (timestamps when the data has them, row numbers
+    otherwise), most severe offenders first. Returns None when the scored
+    data carried no source IP column.
+    """
+    sources = results.get('anomaly_sources')
+    if sources is None:
+        return None
+
+    import pandas as pd
+
+    anomalies = results['anomalies']
+    seen = results.get('anomaly_seen')
+    first, last = 'min', 'max'
+    if seen is None:
+        seen = anomalies
+    else:
+        # Merged files, parallel shards and ingest batches are not in time order
+        times = pd.to_datetime(pd.Series(seen), errors='coerce')
+        if times.notna().any():
+            seen = times.to_numpy()
+        else:
+            first, last = 'first', 'last'
+
+    flows = pd.DataFrame({
+        'source_ip': sources,
+        'score': results['scores'][anomalies],
+        'seen': seen
+    })
+    flows = flows[flows['source_ip'].notna() & (flows['source_ip'] != '')]
+
+    offenders = flows.groupby('source_ip', sort=False).agg(
+        count=('score', 'size'),
+        worst_score=('score', 'min'),
+        first_seen=('seen', first),
+        last_seen=('seen', last)
+    )
+    return offenders.sort_values('worst_score')
@@ -1,47 +1,45 @@
-import os
-import platform
+import collections
+import threading
 import time
 from datetime import datetime, timedelta
-import json
-from config import SECURITY_CONFIG
+from config import BLOCKLIST_CONFIG, SECURITY_CONFIG
+from security.blocklist import Blocklist, PERMANENT
+from security.firewall import firewall as default_firewall
+from security.offenders import aggregate_offenders
+from security.scheduler import ExpiryScheduler
+from security.store import block_store
 from utils.logger import logger
+from utils.metrics import metrics, STAGE_SECONDS
+
+BLOCKS = metrics.counter('shcs_blocks_total', "Block rules applied through the firewall")
+UNBLOCKS = metrics.counter('shcs_unblocks_total', "Block rules lifted, by hand, by expiry or by aggregation")
+FIREWALL_FAILURES = metrics.counter('shcs_firewall_failures_total', "Firewall calls that were rejected", ('operation',))
 
 class SecurityResponse:
-    def __init__(self):
-        self.blocked_ips = {}
+    def __init__(self, firewall=None, store=None):
+        self.blocklist = Blocklist()
+        self.block_info = {}    # rule -> {'blocked_at': monotonic ns, 'reason': str}
         self.attempts = {}
-        self.system = platform.system().lower()
+        self.firewall = firewall or default_firewall
+        self.store = store or block_store
+        self._lock = threading.RLock()
+        self._changes = collections.OrderedDict()   # rule -> change number, oldest first
+        self._change_number = 0
+        self._changes_floor = 0                     # Changes up to here were trimmed
+        self.expiry_scheduler = ExpiryScheduler(self._expire_block, name="block-expiry")
+        # Queued firewall operations the backend gives up on are reported back here
+        self.firewall.on_failure = self._firewall_failed
 
     def _is_valid_ip(self, ip_address):
-        """Validate IP address format."""
-        parts = ip_address.split('.')
-        if len(parts) != 4:
-            return False
+        """Validate an IPv4 or IPv6 address, or a CIDR range."""
         try:
-            return all(0 <= int(part) <= 255 for part in parts)
+            Blocklist.canonical(ip_address)
+            return True
         except ValueError:
             return False
 
-    def _get_block_command(self, ip_address):
-        """Get platform-specific block command."""
-        if self.system == 'linux':
-            return f"sudo iptables -A INPUT -s {ip_address} -j DROP"
-        elif self.system == 'windows':
-            return f'netsh advfirewall firewall add rule name="Block IP {ip_address}" dir=in action=block remoteip={ip_address} enable=yes'
-        else:
-            raise NotImplementedError(f"Platform {self.system} not supported")
-
-    def _get_unblock_command(self, ip_address):
-        """Get platform-specific unblock command."""
-        if self.system == 'linux':
-            return f"sudo iptables -D INPUT -s {ip_address} -j DROP"
-        elif self.system == 'windows':
-            return f'netsh advfirewall firewall delete rule name="Block IP {ip_address}"'
-        else:
-            raise NotImplementedError(f"Platform {self.system} not supported")
-
-    def block_ip(self, ip_address, duration=None, reason=None):
-        """Block an IP address with optional duration."""
+    def block_ip(self, ip_address, duration=None, reason=None, score=None):
+        """Block an IP address or CIDR range with optional duration."""
         if not self._is_valid_ip(ip_address):
             logger.error(f"Invalid IP address format: {ip_address}")
             return False
@@ -50,24 +48,56 @@ class SecurityResponse:
             if duration is None:
                 duration = SECURITY_CONFIG['block_duration']
 
-            block_time = datetime.now()
-            unblock_time = block_time + timedelta(seconds=duration)
-
-            # Execute block command
-            block_command = self._get_block_command(ip_address)
-            logger.info(f"Executing command: {block_command}")
-            result = os.system(block_command)
-            
-            if result != 0:
-                logger.error(f"Failed to execute firewall command. Exit code: {result}")
-                return False
-
-            # Update blocked IPs registry
-            self.blocked_ips[ip_address] = {
-                'block_time': block_time.isoformat(),
-                'unblock_time': unblock_time.isoformat(),
-                'reason': reason
-            }
+            now = time.monotonic_ns()
+            wall = time.time()
+            expiry = now + int(duration * 1e9) if duration > 0 else PERMANENT
+
+            with self._lock:
+                rule, created, replaced = self.blocklist.add(ip_address, expiry)
+                if created:
+                    # Apply the block through the firewall backend
+                    with STAGE_SECONDS.time(stage='firewall'):
+                        applied = self.firewall.block(rule)
+                    if not applied:
+                        FIREWALL_FAILURES.inc(operation='block')
+                        self.blocklist.remove(rule)
+                        for key, old_expiry in replaced:
+                            self.blocklist.add(key, old_expiry, aggregate=False)
+                        logger.error(f"Firewall rejected block for {rule}")
+                        return False
+
+                    # Narrower rules are now covered by the new one
+                    BLOCKS.inc()
+                    for key, _ in replaced:
+                        with STAGE_SECONDS.time(stage='firewall'):
+                            self.firewall.unblock(key)
+                        UNBLOCKS.inc()
+                        self.expiry_scheduler.cancel(key)
+                        self.block_info.pop(key, None)
+                        self.store.record_lift(key, wall)
+                    if replaced:
+                        reason = f"Aggregated {len(replaced) + 1} blocks into {rule}; latest: {reason}"
+                        logger.info(f"Collapsed {len(replaced)} blocked addresses into {rule}")
+                    self.block_info[rule] = {'blocked_at': now, 'reason': reason}
+                    self._touch(*(key for key, _ in replaced))
+                    stored_reason = reason
+                elif rule == Blocklist.canonical(ip_address):
+                    self.block_info[rule] = {'blocked_at': now, 'reason': reason}
+                    stored_reason = reason
+                else:
+                    # Only the covering range's expiry changed
+                    stored_reason, score = None, None
+
+                # Schedule unblock if temporary; the expiry thread lifts it later
+                expiry = self.blocklist.expiry(rule)
+                if expiry != PERMANENT:
+                    self.expiry_scheduler.schedule(rule, (expiry - now) / 1e9)
+                    expires_at = wall + (expiry - now) / 1e9
+                else:
+                    self.expiry_scheduler.cancel(rule)
+                    expires_at = None
+                self.store.record_block(rule, wall, expires_at, stored_reason, score)
+                self._touch(rule)
 
             # Log the action
             logger.log_threat(
@@ -76,57 +106,259 @@ class SecurityResponse:
                 {
                     'duration': duration,
                     'reason': reason,
-                    'permanent': duration == 0
+                    'permanent': duration == 0,
+                    'rule': rule
                 }
             )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to block IP {ip_address}: {str(e)}")
+            return False
+
+    def respond_to_anomalies(self, results, duration=None):
+        """Block each offending source IP of a scoring result once.
+
+        Anomalous flows are aggregated per source IP first, so a batch issues
+        at most one block per address, and addresses that are already blocked
+        are left alone. Returns the list of newly blocked IPs.
+        """
+        offenders = aggregate_offenders(results)
+        if offenders is None:
+            if len(results['anomalies']):
+                logger.warning("Scored data has no source IP column; not blocking any address")
+            return []
+
+        blocked = []
+        for ip, count, worst_score, first_seen, last_seen in offenders.itertuples():
+            if self.is_blocked(ip):
+                continue
+            reason = (
+                f"{count} anomalous flows, worst score {worst_score:.2f}, "
+                f"seen {first_seen} to {last_seen}"
+            )
+            if self.block_ip(ip, duration, reason, score=float(worst_score)):
+                blocked.append(ip)
+        return blocked
+
+    def recover(self):
+        """Restore active blocks from the store and reconcile them with the firewall.
+
+        Unexpired open blocks are loaded back into the blocklist with their
+        expiries rescheduled. A single diff against the firewall's live rules
+        then adds only the missing ones and removes only rules this system
+        created whose blocks are no longer active.
+        """
+        try:
+            wall = time.time()
+            now = time.monotonic_ns()
+            desired = {}
+            expired = []
+            for row in self.store.active():
+                if row['expires_at'] is not None and row['expires_at'] <= wall:
+                    expired.append(row['rule'])
+                else:
+                    desired[row['rule']] = row
+            for rule in expired:
+                self.store.record_lift(rule, wall)
 
-            # Schedule unblock if temporary
-            if duration > 0:
-                time.sleep(duration)
-                self.unblock_ip(ip_address)
+            live = self.firewall.list_blocked()
+            if live is None:
+                logger.warning("Firewall backend cannot list its rules; reapplying every active block")
+                missing, stale = set(desired), set()
+            else:
+                live = {self._canonical_or_none(rule) for rule in live} - {None}
+                missing = set(desired) - live
+                stale = self.store.known(live - set(desired))
 
+            with self._lock:
+                # Rules left from a renamed ipset keep blocking unseen; drop them first
+                self.firewall.remove_stale()
+                rejected = set()
+                for rule in missing:
+                    if not self.firewall.block(rule):
+                        # Left open in the store, so the next recovery tries it again
+                        logger.error(f"Firewall rejected block for {rule}")
+                        FIREWALL_FAILURES.inc(operation='block')
+                        rejected.add(rule)
+                for rule in stale:
+                    self.firewall.unblock(rule)
+                self.firewall.flush()
+
+                for rule, row in desired.items():
+                    if rule in rejected:
+                        continue
+                    if row['expires_at'] is None:
+                        expiry = PERMANENT
+                    else:
+                        expiry = now + int((row['expires_at'] - wall) * 1e9)
+                        self.expiry_scheduler.schedule(rule, (expiry - now) / 1e9)
+                    self.blocklist.add(rule, expiry, aggregate=False)
+                    self.block_info[rule] = {
+                        'blocked_at': now - int((wall - row['blocked_at']) * 1e9),
+                        'reason': row['reason']
+                    }
+                    self._touch(rule)
+
+            logger.info(
+                f"Recovered {len(desired) - len(rejected)} active blocks: {len(missing) - len(rejected)} reapplied, "
+                f"{len(rejected)} rejected, {len(stale)} stale rules removed, {len(expired)} expired while stopped"
+            )
             return True
         except Exception as e:
-            logger.error(f"Failed to block IP {ip_address}: {str(e)}")
+            logger.error(f"Failed to recover blocklist: {str(e)}")
             return False
 
+    def _firewall_failed(self, operations):
+        """Undo the bookkeeping of queued firewall operations that were never applied."""
+        with self._lock:
+            for rule, operation in operations.items():
+                if operation != 'add':
+                    FIREWALL_FAILURES.inc(operation='unblock')
+                    # Still known to the store, so recover() removes it as stale on the next start
+                    logger.error(f"Firewall could not lift block for {rule}; it stays in place until recovery")
+                    continue
+                FIREWALL_FAILURES.inc(operation='block')
+                if not self.blocklist.remove(rule):
+                    continue
+                self.block_info.pop(rule, None)
+                self.expiry_scheduler.cancel(rule)
+                self.store.record_rollback(rule)
+                self._touch(rule)
+                logger.error(f"Firewall could not apply block for {rule}; block rolled back")
+
+    @staticmethod
+    def _canonical_or_none(rule):
+        try:
+            return Blocklist.canonical(rule)
+        except ValueError:
+            return None
+
+    def _expire_block(self, ip_address):
+        """Lift a temporary block once its duration has elapsed."""
+        with self._lock:
+            # Blocked again after the timer fired: the new block has its own expiry
+            expiry = self.blocklist.expiry(ip_address)
+            if expiry is None or expiry == PERMANENT:
+                return
+            now = time.monotonic_ns()
+            if expiry > now:
+                self.expiry_scheduler.schedule(ip_address, (expiry - now) / 1e9)
+                return
+            self.unblock_ip(ip_address)
+
     def unblock_ip(self, ip_address):
-        """Unblock a previously blocked IP address."""
+        """Unblock a previously blocked IP address or CIDR range."""
         try:
-            if ip_address in self.blocked_ips:
-                unblock_command = self._get_unblock_command(ip_address)
-                logger.info(f"Executing command: {unblock_command}")
-                result = os.system(unblock_command)
-                
-                if result != 0:
-                    logger.error(f"Failed to execute firewall command. Exit code: {result}")
+            with self._lock:
+                if ip_address not in self.blocklist:
                     return False
-                
-                del self.blocked_ips[ip_address]
-                logger.info(f"IP {ip_address} has been unblocked")
+
+                rule = Blocklist.canonical(ip_address)
+                with STAGE_SECONDS.time(stage='firewall'):
+                    lifted = self.firewall.unblock(rule)
+                if not lifted:
+                    FIREWALL_FAILURES.inc(operation='unblock')
+                    logger.error(f"Firewall rejected unblock for {rule}")
+                    return False
+
+                self.blocklist.remove(rule)
+                self.block_info.pop(rule, None)
+                self.expiry_scheduler.cancel(rule)
+                self.store.record_lift(rule)
+                self._touch(rule)
+                UNBLOCKS.inc()
+                logger.info(f"IP {rule} has been unblocked")
                 return True
-            return False
         except Exception as e:
             logger.error(f"Failed to unblock IP {ip_address}: {str(e)}")
             return False
 
     def is_blocked(self, ip_address):
-        """Check if an IP is currently blocked."""
-        if ip_address not in self.blocked_ips:
+        """Check if an IP is currently blocked, directly or by a covering range."""
+        try:
+            with self._lock:
+                covered = self.blocklist.covering(ip_address)
+        except ValueError:
+            return False
+        if covered is None:
             return False
 
-        block_info = self.blocked_ips[ip_address]
-        unblock_time = datetime.fromisoformat(block_info['unblock_time'])
-        
-        if datetime.now() > unblock_time:
-            self.unblock_ip(ip_address)
+        rule, expiry = covered
+        if expiry <= time.monotonic_ns():
+            self.unblock_ip(rule)
             return False
-        
+
         return True
 
+    def blocked_count(self):
+        """Number of active block rules (addresses and ranges)."""
+        return len(self.blocklist)
+
+    def _touch(self, *rules):
+        """Record that block rules were added, changed or removed."""
+        for rule in rules:
+            self._change_number += 1
+            self._changes[rule] = self._change_number
+            self._changes.move_to_end(rule)
+        while len(self._changes) > BLOCKLIST_CONFIG['change_journal_size']:
+            _, self._changes_floor = self._changes.popitem(last=False)
+
+    def _entry(self, rule, now, wall_now):
+        """Display entry for a rule, or None if it is not blocked."""
+        expiry = self.blocklist.expiry(rule)
+        if expiry is None:
+            return None
+        info = self.block_info.get(rule, {})
+        blocked_at = info.get('blocked_at', now)
+        entry = {
+            'block_time': (wall_now - timedelta(microseconds=(now - blocked_at) // 1000)).isoformat(),
+            'unblock_time': None,
+            'reason': info.get('reason')
+        }
+        if expiry != PERMANENT:
+            entry['unblock_time'] = (wall_now + timedelta(microseconds=(expiry - now) // 1000)).isoformat()
+            entry['duration'] = round((expiry - blocked_at) / 1e9)
+        return entry
+
     def get_blocked_ips(self):
-        """Get list of currently blocked IPs."""
-        return self.blocked_ips
+        """Get block rules with their wall-clock block and unblock times."""
+        return self.blocked_snapshot()[1]
+
+    def blocked_snapshot(self):
+        """``(change_number, blocked)``: every block entry and the change they reflect."""
+        now = time.monotonic_ns()
+        wall_now = datetime.now()
+        with self._lock:
+            blocked = {rule: self._entry(rule, now, wall_now) for rule, _ in self.blocklist}
+            return self._change_number, blocked
+
+    def changes_since(self, change_number):
+        """Rules changed after ``change_number`` as ``(latest_number, {rule: entry or None})``.
+
+        A None entry means the rule was lifted. The work is proportional to
+        the number of changes. If the journal no longer reaches back that
+        far the mapping is None and the caller should reload from
+        blocked_snapshot().
+        """
+        now = time.monotonic_ns()
+        wall_now = datetime.now()
+        with self._lock:
+            if change_number < self._changes_floor:
+                return self._change_number, None
+            changed = {}
+            for rule in reversed(self._changes):
+                if self._changes[rule] <= change_number:
+                    break
+                changed[rule] = self._entry(rule, now, wall_now)
+            return self._change_number, changed
+
+    def pending_expiries(self):
+        """Get ``(ip, seconds_remaining)`` for scheduled unblocks, soonest first."""
+        return self.expiry_scheduler.pending_expiries()
 
 # Create a singleton instance
 security_response = SecurityResponse() 
+metrics.gauge('shcs_blocked_rules', "Active block rules (addresses and ranges)").set_function(
+    security_response.blocked_count)
+metrics.gauge('shcs_pending_expiries', "Temporary blocks waiting to be lifted").set_function(
+    lambda: len(security_response.expiry_scheduler))
@@ -0,0 +1,107 @@
+import heapq
+import itertools
+import threading
+import time
+from utils.logger import logger
+
+class ExpiryScheduler:
+    """Fire a callback for each key once its deadline passes.
+
+    Deadlines live in a min-heap served by a single daemon thread, so
+    scheduling and rescheduling are O(log n). Cancelled or superseded heap
+    entries are skipped lazily and the heap is compacted once stale entries
+    outnumber live ones.
+    """
+
+    def __init__(self, callback, name="expiry-scheduler"):
+        self.callback = callback
+        self.name = name
+        self._heap = []       # (deadline, seq, key)
+        self._entries = {}    # key -> (deadline, seq) of the live heap entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def _ensure_thread(self):
+        """Start the worker thread on first use."""
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _compact(self):
+        """Drop stale heap entries once they dominate the heap."""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [
+                (deadline, seq, key) for key, (deadline, seq) in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def schedule(self, key, delay):
+        """Schedule ``key`` to expire ``delay`` seconds from now, replacing any earlier deadline."""
+        deadline = time.monotonic() + delay
+        with self._cond:
+            seq = next(self._seq)
+            self._entries[key] = (deadline, seq)
+            heapq.heappush(self._heap, (deadline, seq, key))
+            self._compact()
+            self._ensure_thread()
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+
+    def cancel(self, key):
+        """Forget a pending expiry; return True if one existed."""
+        with self._cond:
+            if self._entries.pop(key, None) is None:
+                return False
+            self._compact()
+            return True
+
+    def pending_expiries(self):
+        """List ``(key, seconds_remaining)`` for every pending expiry, soonest first."""
+        now = time.monotonic()
+        with self._cond:
+            pending = sorted(self._entries.items(), key=lambda item: item[1])
+        return [(key, max(0.0, deadline - now)) for key, (deadline, _) in pending]
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def _pop_due(self):
+        """Wait for and remove the next due key, or return None when stopped."""
+        with self._cond:
+            while self._running:
+                while self._heap and self._entries.get(self._heap[0][2]) != self._heap[0][:2]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, _, key = heapq.heappop(self._heap)
+                del self._entries[key]
+                return key
+            return None
+
+    def _run(self):
+        while True:
+            key = self._pop_due()
+            if key is None:
+                return
+            try:
+                self.callback(key)
+            except Exception as e:
+                logger.error(f"Expiry callback failed for {key}: {str(e)}")
+
+    def stop(self):
+        """Stop the worker thread, leaving pending expiries in place."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
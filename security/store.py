@@ -0,0 +1,196 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from config import STORE_CONFIG
+from utils.logger import logger
+from utils.metrics import metrics, STAGE_SECONDS, STAGE_ROWS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    rule TEXT NOT NULL,          -- Canonical address or CIDR range
+    blocked_at REAL NOT NULL,    -- Unix time the block was applied
+    expires_at REAL,             -- Unix time it lapses; NULL for permanent blocks
+    lifted_at REAL,              -- Unix time it was lifted; NULL while active
+    reason TEXT,
+    score REAL                   -- Worst anomaly score behind the block, if any
+);
+CREATE UNIQUE INDEX IF NOT EXISTS blocks_active ON blocks(rule) WHERE lifted_at IS NULL;
+CREATE INDEX IF NOT EXISTS blocks_rule ON blocks(rule, blocked_at);
+CREATE INDEX IF NOT EXISTS blocks_time ON blocks(blocked_at);
+CREATE INDEX IF NOT EXISTS blocks_reason ON blocks(reason);
+"""
+
+UPSERT = """
+INSERT INTO blocks (rule, blocked_at, expires_at, reason, score) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(rule) WHERE lifted_at IS NULL DO UPDATE SET
+    expires_at = excluded.expires_at,
+    reason = COALESCE(excluded.reason, reason),
+    score = COALESCE(excluded.score, score)
+"""
+
+LIFT = "UPDATE blocks SET lifted_at = ? WHERE rule = ? AND lifted_at IS NULL"
+
+ROLLBACK = "DELETE FROM blocks WHERE rule = ? AND lifted_at IS NULL"
+
+COLUMNS = ("rule", "blocked_at", "expires_at", "lifted_at", "reason", "score")
+
+class BlockStore:
+    """Persist block history in SQLite so active blocks survive restarts.
+
+    Each block is one row, closed by setting ``lifted_at`` when it is lifted
+    or expires; at most one row per rule is open at a time. Writes are queued
+    and committed together in one transaction, at most ``flush_interval``
+    seconds later or as soon as ``batch_size`` writes are pending. The
+    database runs in WAL mode so queries do not block the writer.
+    """
+
+    def __init__(self, path=None, flush_interval=None, batch_size=None):
+        self.path = path or STORE_CONFIG['path']
+        self.flush_interval = STORE_CONFIG['flush_interval'] if flush_interval is None else flush_interval
+        self.batch_size = batch_size or STORE_CONFIG['batch_size']
+        self._pending = []    # ('block' | 'lift' | 'rollback', params) in arrival order
+        self._lock = threading.Lock()
+        self._timer = None
+        self._conn = None
+        atexit.register(self.close)
+
+    def _connection(self):
+        """Open the database on first use."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # Lets "reason LIKE 'prefix%'" use the reason index
+            self._conn.execute("PRAGMA case_sensitive_like=ON")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _arm_timer(self):
+        """Flush ``flush_interval`` seconds from now unless a flush is already due; call with the lock held."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _queue(self, operation, params):
+        with self._lock:
+            self._pending.append((operation, params))
+            if len(self._pending) >= self.batch_size:
+                flush_now = True
+            else:
+                flush_now = False
+                self._arm_timer()
+        if flush_now:
+            self.flush()
+
+    def record_block(self, rule, blocked_at, expires_at=None, reason=None, score=None):
+        """Record a new or refreshed block; ``expires_at`` is None for permanent blocks."""
+        self._queue('block', (rule, blocked_at, expires_at, reason, score))
+
+    def record_lift(self, rule, lifted_at=None):
+        """Record that a block was lifted."""
+        self._queue('lift', (time.time() if lifted_at is None else lifted_at, rule))
+
+    def record_rollback(self, rule):
+        """Forget the open block of a rule that never reached the firewall."""
+        self._queue('rollback', (rule,))
+
+    def flush(self):
+        """Commit all queued writes in one transaction.
+
+        If the commit fails the writes stay queued, ahead of any queued
+        since, and are tried again with the next flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not pending:
+                return True
+
+            try:
+                conn = self._connection()
+                with STAGE_SECONDS.time(stage='store_flush'), conn:
+                    # Consecutive writes of one kind go to executemany together
+                    start = 0
+                    for end in range(1, len(pending) + 1):
+                        if end == len(pending) or pending[end][0] != pending[start][0]:
+                            sql = {'block': UPSERT, 'lift': LIFT, 'rollback': ROLLBACK}[pending[start][0]]
+                            conn.executemany(sql, [params for _, params in pending[start:end]])
+                            start = end
+                STAGE_ROWS.inc(len(pending), stage='store_flush')
+                return True
+            except Exception as e:
+                logger.error(f"Failed to write {len(pending)} block records, will retry: {str(e)}")
+                self._pending[:0] = pending
+                self._arm_timer()
+                return False
+
+    def active(self):
+        """All open blocks as dicts."""
+        return self.query(active=True, limit=None)
+
+    def query(self, ip=None, since=None, until=None, reason=None, active=None, limit=1000):
+        """Block records filtered by rule, block time range and reason prefix, newest first."""
+        self.flush()
+        clauses, params = [], []
+        if ip is not None:
+            clauses.append("rule = ?")
+            params.append(ip)
+        if since is not None:
+            clauses.append("blocked_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("blocked_at < ?")
+            params.append(until)
+        if reason is not None:
+            clauses.append(r"reason LIKE ? ESCAPE '\'")
+            params.append(reason.replace('%', r'\%').replace('_', r'\_') + '%')
+        if active is not None:
+            clauses.append("lifted_at IS NULL" if active else "lifted_at IS NOT NULL")
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM blocks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY blocked_at DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def known(self, rules):
+        """Subset of ``rules`` that this store has ever recorded."""
+        self.flush()
+        rules = list(rules)
+        found = set()
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(rules), 500):
+                batch = rules[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                found.update(row[0] for row in conn.execute(
+                    f"SELECT DISTINCT rule FROM blocks WHERE rule IN ({placeholders})", batch
+                ))
+        return found
+
+    def close(self):
+        """Flush queued writes and close the database."""
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Create a singleton instance
+block_store = BlockStore()
+metrics.gauge('shcs_store_pending', "Block history writes waiting to be committed").set_function(
+    lambda: len(block_store._pending))
@@ -0,0 +1,27 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The config module is the file "config,py", which import cannot find by
+# name. Load it as "config" with BASE_DIR in a scratch directory, so data,
+# models and logs written by the code under test stay out of the tree.
+SCRATCH = tempfile.mkdtemp(prefix="shcs-tests-")
+atexit.register(shutil.rmtree, SCRATCH, True)
+config = types.ModuleType("config")
+config.__file__ = os.path.join(SCRATCH, "config.py")
+with open(os.path.join(ROOT, "config,py")) as f:
+    exec(compile(f.read(), os.path.join(ROOT, "config,py"), "exec"), config.__dict__)
+config.FIREWALL_CONFIG['backend'] = 'fake'
+config.LOG_CONFIG['async'] = False
+sys.modules["config"] = config
+
+# The top-level detector.py would otherwise shadow the detector/ package
+detector = types.ModuleType("detector")
+detector.__path__ = [os.path.join(ROOT, "detector")]
+sys.modules["detector"] = detector
@@ -0,0 +1,94 @@
+import ipaddress
+import random
+import pytest
+from security.blocklist import Blocklist, PERMANENT
+
+def random_rules(rng, count):
+    """Random IPv4/IPv6 hosts and ranges, as strings."""
+    rules = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            prefixlen = rng.choice([8, 16, 20, 24, 28, 32])
+            rules.append(f"{ipaddress.IPv4Address(rng.getrandbits(32))}/{prefixlen}")
+        else:
+            prefixlen = rng.choice([32, 48, 64, 96, 128])
+            rules.append(f"{ipaddress.IPv6Address(rng.getrandbits(128))}/{prefixlen}")
+    return rules
+
+def test_canonical_matches_ipaddress():
+    assert Blocklist.canonical("10.1.2.3/8") == "10.0.0.0/8"
+    assert Blocklist.canonical("10.1.2.3/32") == "10.1.2.3"
+    assert Blocklist.canonical("2001:DB8::1/32") == "2001:db8::/32"
+    assert Blocklist.canonical("2001:db8:0:0::1") == "2001:db8::1"
+    for rule in ("10.0.0.300", "10.0.0.0/33", "::1/129", "not-an-ip"):
+        with pytest.raises(ValueError):
+            Blocklist.canonical(rule)
+
+def test_covering_agrees_with_ipaddress():
+    rng = random.Random(7)
+    blocklist = Blocklist(aggregate_threshold=0)
+    for rule in random_rules(rng, 300):
+        blocklist.add(rule, PERMANENT)
+    networks = [ipaddress.ip_network(rule) for rule, _ in blocklist]
+    assert len(networks) == len(blocklist)
+
+    # Probe addresses inside the rules as well as random ones
+    probes = [network[rng.randrange(network.num_addresses)] for network in networks]
+    probes += [ipaddress.IPv4Address(rng.getrandbits(32)) for _ in range(500)]
+    probes += [ipaddress.IPv6Address(rng.getrandbits(128)) for _ in range(500)]
+    for address in probes:
+        expected = [network for network in networks if address in network]
+        covered = blocklist.covering(str(address))
+        if not expected:
+            assert covered is None
+        else:
+            # Narrower rules are absorbed, so at most one rule covers an address
+            assert len(expected) == 1
+            assert ipaddress.ip_network(covered[0]) == expected[0]
+
+def test_wider_rule_absorbs_narrower_ones():
+    blocklist = Blocklist(aggregate_threshold=0)
+    blocklist.add("192.0.2.1", 100)
+    blocklist.add("192.0.2.128/25", 300)
+    rule, created, replaced = blocklist.add("192.0.2.0/24", 200)
+    assert (rule, created) == ("192.0.2.0/24", True)
+    assert sorted(replaced) == [("192.0.2.1", 100), ("192.0.2.128/25", 300)]
+    # The range lasts as long as the longest rule it absorbed
+    assert blocklist.expiry("192.0.2.0/24") == 300
+    assert len(blocklist) == 1
+
+    # An address already covered extends the range instead of adding a rule
+    rule, created, replaced = blocklist.add("192.0.2.7", 400)
+    assert (rule, created, replaced) == ("192.0.2.0/24", False, [])
+    assert blocklist.expiry("192.0.2.0/24") == 400
+    assert "192.0.2.7" not in blocklist
+
+def test_hosts_aggregate_into_prefix_at_threshold():
+    blocklist = Blocklist(aggregate_threshold=4, aggregate_prefixes={4: 24, 6: 64})
+    for host in range(1, 4):
+        rule, created, _ = blocklist.add(f"198.51.100.{host}", host)
+        assert (rule, created) == (f"198.51.100.{host}", True)
+    blocklist.add("203.0.113.1", 10)
+
+    rule, created, replaced = blocklist.add("198.51.100.9", 5)
+    assert (rule, created) == ("198.51.100.0/24", True)
+    assert sorted(key for key, _ in replaced) == ["198.51.100.1", "198.51.100.2", "198.51.100.3"]
+    assert blocklist.expiry("198.51.100.0/24") == 5
+    assert sorted(rule for rule, _ in blocklist) == ["198.51.100.0/24", "203.0.113.1"]
+
+    # Hosts restored with aggregation off stay separate
+    restored = Blocklist(aggregate_threshold=4, aggregate_prefixes={4: 24, 6: 64})
+    for host in range(1, 6):
+        restored.add(f"198.51.100.{host}", 1, aggregate=False)
+    assert len(restored) == 5
+
+def test_ipv6_hosts_and_removal():
+    blocklist = Blocklist(aggregate_threshold=0)
+    blocklist.add("2001:db8::1", PERMANENT)
+    blocklist.add("2001:db8:1::/48", 50)
+    assert blocklist.covering("2001:db8:1:2::3") == ("2001:db8:1::/48", 50)
+    assert blocklist.covering("2001:db8::2") is None
+    assert blocklist.remove("2001:db8::1")
+    assert not blocklist.remove("2001:db8::1")
+    assert blocklist.covering("2001:db8::1") is None
+    assert len(blocklist) == 1
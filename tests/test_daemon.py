@@ -0,0 +1,128 @@
+import asyncio
+import math
+import pytest
+from detector.schema import FeatureSchema
+from ingest.daemon import IngestDaemon, _record_lines, _well_formed
+
+HEADER = b"Flow ID, Source IP, Destination Port, Flow Duration, Total Fwd Packets, Label, Timestamp\n"
+FEATURES = ["Destination Port", "Flow Duration", "Total Fwd Packets"]
+
+class RecordingDetector:
+    """Stands in for the anomaly detector: keeps every frame it is asked to score."""
+
+    pipeline = object()
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self.frames = []
+
+    def _current_model(self):
+        return {'schema': self.schema}, 1
+
+    def predict(self, frame):
+        self.frames.append(frame)
+        return {'anomalies': frame.iloc[:0]}
+
+def run_daemon(detector, *payloads):
+    """Send each payload over its own TCP connection, then shut the daemon down once all are read.
+
+    The deadline is long, so everything sent is scored as one batch when the daemon closes.
+    """
+    daemon = IngestDaemon(detector=detector, response=object(), unix_socket="", tcp_port=0, pipes=[],
+                          batch_size=1000, batch_deadline=60, block=False)
+
+    async def main():
+        await daemon.start()
+        for payload in payloads:
+            _, writer = await asyncio.open_connection("127.0.0.1", daemon.bound_port)
+            # Split mid-line, so lines are put back together across reads
+            middle = len(payload) // 2
+            writer.write(payload[:middle])
+            await writer.drain()
+            await asyncio.sleep(0.01)
+            writer.write(payload[middle:])
+            writer.close()
+            await writer.wait_closed()
+        for _ in range(500):
+            if not daemon._handlers:
+                break
+            await asyncio.sleep(0.01)
+        await daemon.close()
+
+    asyncio.run(main())
+    return daemon
+
+@pytest.mark.parametrize("body, lines", [
+    (b"", 0),
+    (b"a\n", 1),
+    (b"a\nb\n", 2),
+    (b"\na\n\n\nb\n", 2),
+    (b"a\r\n\r\nb\r\n", 2),
+])
+def test_record_lines(body, lines):
+    assert _record_lines(body) == lines
+
+def test_well_formed_keeps_a_clean_body_as_is():
+    body = b"1,2,3\n4,5,6\n\n7,8,9\n"
+    assert _well_formed(body, 3) == (body, 0)
+
+def test_well_formed_drops_rows_with_the_wrong_field_count():
+    body = b'1,2,3\n4,5\n6,7,8,9\n\n"a,b",c\n10,11,12\n'
+    assert _well_formed(body, 3) == (b'1,2,3\n\n"a,b",c\n10,11,12\n', 2)
+    # Offsetting errors do not slip through the comma total
+    assert _well_formed(b"1,2\n3,4,5,6\n", 3) == (b"", 2)
+
+def test_csv_with_bad_rows():
+    detector = RecordingDetector()
+    payload = HEADER + (
+        b"f1,10.0.0.1,80,1000,3,BENIGN,2024-05-01 12:00:00\n"
+        b"f2,10.0.0.2,80,1000,3,BENIGN,2024-05-01 12:00:00,extra\n"
+        b"f3,10.0.0.3,80,1000\n"
+        b"f4,10.0.0.4,80,abc,3,BENIGN,2024-05-01 12:00:01\n"
+        b"\n"
+        b'f5,"10.0.0.5",443,5,1,BENIGN,2024-05-01 12:00:02\n'
+        b"f6,10.0.0.6,22,7,2,BENIGN,2024-05-01 12:00:03"
+    )
+    daemon = run_daemon(detector, payload)
+
+    assert len(detector.frames) == 1
+    frame = detector.frames[0]
+    assert list(frame.columns) == FEATURES + ["Source IP", "Timestamp"]
+    assert list(frame["Source IP"]) == ["10.0.0.1", "10.0.0.4", "10.0.0.5", "10.0.0.6"]
+    assert list(frame["Destination Port"]) == [80, 80, 443, 22]
+    duration = list(frame["Flow Duration"])
+    assert duration[0] == 1000 and math.isnan(duration[1]) and duration[2:] == [5, 7]
+    assert daemon.stats['records'] == 4
+    assert daemon.stats['rejected'] == 2
+
+def test_ndjson_with_bad_rows():
+    detector = RecordingDetector(FeatureSchema(FEATURES))
+    payload = b"\n".join([
+        b'{" Source IP": "10.0.0.1", "Destination Port": 80, "Flow Duration": 1000, "Total Fwd Packets": 3}',
+        b'{"Source IP": "10.0.0.2", "Destination Port": 80,',
+        b'{"Source IP": "10.0.0.3"}',
+        b'{"Source IP": "10.0.0.4", "Destination Port": "443", "Flow Duration": 5}',
+        b'{"Source IP": "10.0.0.5", "Destination Port": 22, "Flow Duration": "n/a", "Total Fwd Packets": 2}',
+        b'',
+    ])
+    daemon = run_daemon(detector, payload)
+
+    frame = detector.frames[0]
+    assert list(frame.columns) == FEATURES + ["Source IP"]
+    assert list(frame["Source IP"]) == ["10.0.0.1", "10.0.0.4", "10.0.0.5"]
+    assert list(frame["Destination Port"]) == [80, 443, 22]
+    # One feature of three missing is repaired later, like an empty cell
+    assert math.isnan(frame["Total Fwd Packets"][1])
+    assert math.isnan(frame["Flow Duration"][2])
+    assert daemon.stats['records'] == 3
+    assert daemon.stats['rejected'] == 2
+
+def test_streams_of_both_formats_share_a_batch():
+    detector = RecordingDetector(FeatureSchema(FEATURES))
+    csv_payload = HEADER + b"f1,10.0.0.1,80,1000,3,BENIGN,2024-05-01 12:00:00\n"
+    json_payload = b'{"Source IP": "10.0.0.2", "Destination Port": 53, "Flow Duration": 9, "Total Fwd Packets": 1}\n'
+    daemon = run_daemon(detector, csv_payload, json_payload)
+
+    rows = sorted(ip for frame in detector.frames for ip in frame["Source IP"])
+    assert rows == ["10.0.0.1", "10.0.0.2"]
+    assert daemon.stats['records'] == 2 and daemon.stats['rejected'] == 0
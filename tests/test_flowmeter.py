@@ -0,0 +1,222 @@
+import math
+import random
+import socket
+import struct
+import numpy as np
+import pytest
+from flowmeter.decode import LINKTYPE_ETHERNET, TCP, UDP, decode
+from flowmeter.flow import COLUMNS, WIDTH, observe, summary
+from flowmeter.meter import FlowMeter, iter_rows
+from flowmeter.pcap import CaptureError, read_packets
+from flowmeter.wheel import TimeoutWheel
+
+FIN, SYN, PSH, ACK = 0x01, 0x02, 0x08, 0x10
+START = 1700000000       # Capture start, Unix seconds
+
+def ipv4_frame(src, dst, proto, transport, payload):
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(transport) + payload, 0, 0x4000, 64, proto, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    return b'\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00' + ip + transport + bytes(payload)
+
+def ipv6_frame(src, dst, proto, transport, payload):
+    ip = struct.pack('!IHBB16s16s', 6 << 28, len(transport) + payload, proto, 64,
+                     socket.inet_pton(socket.AF_INET6, src), socket.inet_pton(socket.AF_INET6, dst))
+    return b'\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x86\xdd' + ip + transport + bytes(payload)
+
+def tcp(src, dst, sport, dport, flags, window=0, payload=0):
+    return ipv4_frame(src, dst, TCP, struct.pack('!HHIIBBHHH', sport, dport, 0, 0, 0x50, flags, window, 0, 0), payload)
+
+def udp(src, dst, sport, dport, payload=0, frame=ipv4_frame):
+    return frame(src, dst, UDP, struct.pack('!HHHH', sport, dport, 8 + payload, 0), payload)
+
+# (seconds after START, Ethernet frame)
+PACKETS = [
+    (0.0, tcp('10.0.0.1', '10.0.0.2', 40000, 80, SYN, window=1000)),
+    (0.1, tcp('10.0.0.2', '10.0.0.1', 80, 40000, SYN | ACK, window=2000)),
+    (0.2, tcp('10.0.0.1', '10.0.0.2', 40000, 80, PSH | ACK, window=1000, payload=100)),
+    (0.25, b'\xff' * 12 + b'\x08\x06' + bytes(28)),    # ARP: not metered
+    (0.5, tcp('10.0.0.2', '10.0.0.1', 80, 40000, PSH | ACK, window=2000, payload=300)),
+    (0.6, tcp('10.0.0.1', '10.0.0.2', 40000, 80, FIN | ACK, window=1000)),
+    (1.0, udp('10.0.0.3', '10.0.0.4', 5353, 53, payload=50)),
+    (1.3, udp('10.0.0.4', '10.0.0.3', 53, 5353, payload=70)),
+    (2.0, udp('2001:db8::1', '2001:db8::2', 1000, 2000, payload=10, frame=ipv6_frame)),
+]
+
+def write_pcap(path, packets):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for offset, frame in packets:
+            micros = round(offset * 1e6)
+            f.write(struct.pack('<IIII', START + micros // 1000000, micros % 1000000, len(frame), len(frame)))
+            f.write(frame)
+
+def write_pcapng(path, packets):
+    """Nanosecond timestamps (``if_tsresol`` 9), to check the scaling too."""
+    def block(kind, body):
+        body += bytes(-len(body) % 4)
+        return struct.pack('<II', kind, len(body) + 12) + body + struct.pack('<I', len(body) + 12)
+
+    with open(path, 'wb') as f:
+        f.write(block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        options = struct.pack('<HHB3x', 9, 1, 9) + struct.pack('<HH', 0, 0)
+        f.write(block(1, struct.pack('<HHI', LINKTYPE_ETHERNET, 0, 65535) + options))
+        for offset, frame in packets:
+            nanos = START * 10 ** 9 + round(offset * 1e9)
+            f.write(block(6, struct.pack('<IIIII', 0, nanos >> 32, nanos & 0xffffffff, len(frame), len(frame)) + frame))
+
+def by_name(row):
+    assert len(row) == len(COLUMNS)
+    return dict(zip(COLUMNS, row))
+
+def test_timeout_wheel_fires_each_item_once_and_never_early():
+    rng = random.Random(11)
+    tick = 10
+    wheel = TimeoutWheel(tick, 8)
+    deadlines = {}
+    latest = {}     # item -> time by which it must have fired
+    fired = set()
+
+    def schedule(item, deadline, now=None):
+        deadlines[item] = deadline
+        wheel.schedule(item, deadline)
+        # Due at the first tick at or after the deadline, or the next tick if already overdue
+        ticks = -(-deadline // tick)
+        latest[item] = tick * (ticks if now is None else max(ticks, now // tick + 1))
+
+    # Scheduled before the wheel has ever advanced, some already overdue
+    for item, deadline in enumerate([-15, 5, 35, 120, 500]):
+        schedule(item, deadline)
+    now = 4
+    for step in range(400):
+        for item in wheel.advance(now):
+            assert item not in fired
+            assert deadlines[item] <= now
+            fired.add(item)
+        for item in set(deadlines) - fired:
+            assert now < latest[item]
+        assert wheel.size == len(deadlines) - len(fired)
+
+        for _ in range(rng.randrange(4)):
+            # Mostly within a revolution, some well past it, some already overdue
+            offset = rng.choice([rng.randrange(80), rng.randrange(80, 400), -rng.randrange(1, 30)])
+            schedule(len(deadlines), now + offset, now)
+        now += rng.randrange(1, 25)
+
+    remaining = wheel.drain()
+    assert sorted(remaining) == sorted(set(deadlines) - fired)
+    assert wheel.size == 0 and wheel.advance(now + 10 ** 6) == []
+
+def test_running_statistics_match_numpy():
+    rng = np.random.default_rng(5)
+    stats = np.zeros(2 * WIDTH).tolist()
+    values = rng.exponential(1000.0, 500)
+    for value in values:
+        observe(stats, WIDTH, float(value))
+    mean, std, variance, maximum, minimum, total = summary(stats, WIDTH)
+    assert mean == pytest.approx(values.mean())
+    assert std == pytest.approx(values.std(ddof=1))
+    assert variance == pytest.approx(values.var(ddof=1))
+    assert (maximum, minimum) == (values.max(), values.min())
+    assert total == pytest.approx(values.sum())
+    # Empty and single-value statistics
+    assert summary(stats, 0) == (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    observe(stats, 0, 7.0)
+    assert summary(stats, 0) == (7.0, 0.0, 0.0, 7.0, 7.0, 7.0)
+
+def test_decode():
+    src, dst, sport, dport, proto, payload, header, flags, window = decode(LINKTYPE_ETHERNET, PACKETS[2][1])
+    assert (socket.inet_ntoa(src), socket.inet_ntoa(dst), sport, dport) == ('10.0.0.1', '10.0.0.2', 40000, 80)
+    assert (proto, payload, header, flags, window) == (TCP, 100, 20, PSH | ACK, 1000)
+    assert decode(LINKTYPE_ETHERNET, PACKETS[8][1])[4:] == (UDP, 10, 8, 0, 0)
+    assert decode(LINKTYPE_ETHERNET, PACKETS[3][1]) is None
+    # Cut short by the snap length before the ports
+    assert decode(LINKTYPE_ETHERNET, PACKETS[2][1][:36]) is None
+
+@pytest.mark.parametrize("writer", [write_pcap, write_pcapng])
+def test_flow_rows_from_a_capture(tmp_path, writer):
+    path = str(tmp_path / "capture")
+    writer(path, PACKETS)
+    meter = FlowMeter(idle_timeout=120, active_timeout=120, activity_timeout=5, terminate_on_fin=True)
+    rows = [by_name(row) for row in iter_rows([path], meter)]
+    assert (meter.packets, meter.skipped) == (8, 1)
+    assert [row['Flow ID'] for row in rows] == [
+        '10.0.0.1-10.0.0.2-40000-80-6', '10.0.0.3-10.0.0.4-5353-53-17', '2001:db8::1-2001:db8::2-1000-2000-17']
+
+    # The TCP flow, ended by its FIN; lengths fwd [0, 100, 0] and bwd [0, 300], arrivals at 0, .1, .2, .5, .6 s
+    expected = {
+        ' Source IP': '10.0.0.1', ' Destination IP': '10.0.0.2', ' Timestamp': '2023-11-14 22:13:20.000000',
+        ' Destination Port': 80, ' Flow Duration': 600000,
+        ' Total Fwd Packets': 3, ' Total Backward Packets': 2,
+        'Total Length of Fwd Packets': 100, ' Total Length of Bwd Packets': 300,
+        ' Fwd Packet Length Max': 100, ' Fwd Packet Length Min': 0,
+        ' Fwd Packet Length Mean': 100 / 3, ' Fwd Packet Length Std': np.std([0, 100, 0], ddof=1),
+        'Bwd Packet Length Max': 300, ' Bwd Packet Length Min': 0,
+        ' Bwd Packet Length Mean': 150, ' Bwd Packet Length Std': np.std([0, 300], ddof=1),
+        'Flow Bytes/s': 400 / 0.6, ' Flow Packets/s': 5 / 0.6,
+        ' Flow IAT Mean': 150000, ' Flow IAT Std': 100000, ' Flow IAT Max': 300000, ' Flow IAT Min': 100000,
+        'Fwd IAT Total': 600000, ' Fwd IAT Mean': 300000, ' Fwd IAT Std': np.std([200000, 400000], ddof=1),
+        ' Fwd IAT Max': 400000, ' Fwd IAT Min': 200000,
+        'Bwd IAT Total': 400000, ' Bwd IAT Mean': 400000, ' Bwd IAT Std': 0, ' Bwd IAT Max': 400000,
+        ' Bwd IAT Min': 400000,
+        'Fwd PSH Flags': 1, ' Bwd PSH Flags': 1, ' Fwd URG Flags': 0, ' Bwd URG Flags': 0,
+        ' Fwd Header Length': 60, ' Bwd Header Length': 40,
+        'Fwd Packets/s': 3 / 0.6, ' Bwd Packets/s': 2 / 0.6,
+        ' Min Packet Length': 0, ' Max Packet Length': 300, ' Packet Length Mean': 80,
+        ' Packet Length Std': math.sqrt(17000), ' Packet Length Variance': 17000,
+        'FIN Flag Count': 1, ' SYN Flag Count': 2, ' RST Flag Count': 0, ' PSH Flag Count': 2,
+        ' ACK Flag Count': 4, ' URG Flag Count': 0, ' CWE Flag Count': 0, ' ECE Flag Count': 0,
+        ' Down/Up Ratio': 0, ' Average Packet Size': 80,
+        ' Avg Fwd Segment Size': 100 / 3, ' Avg Bwd Segment Size': 150,
+        'Fwd Avg Bytes/Bulk': 0, ' Fwd Avg Packets/Bulk': 0, ' Fwd Avg Bulk Rate': 0,
+        ' Bwd Avg Bytes/Bulk': 0, ' Bwd Avg Packets/Bulk': 0, 'Bwd Avg Bulk Rate': 0,
+        'Subflow Fwd Packets': 3, ' Subflow Fwd Bytes': 100, ' Subflow Bwd Packets': 2, ' Subflow Bwd Bytes': 300,
+        'Init_Win_bytes_forward': 1000, ' Init_Win_bytes_backward': 2000,
+        ' act_data_pkt_fwd': 1, ' min_seg_size_forward': 20,
+        'Active Mean': 600000, ' Active Std': 0, ' Active Max': 600000, ' Active Min': 600000,
+        'Idle Mean': 0, ' Idle Std': 0, ' Idle Max': 0, ' Idle Min': 0,
+    }
+    assert set(expected) | {'Flow ID'} == set(COLUMNS)
+    for name, value in expected.items():
+        assert rows[0][name] == pytest.approx(value), name
+
+    # UDP, completed when the capture ends
+    udp_row = rows[1]
+    assert (udp_row[' Total Fwd Packets'], udp_row[' Total Backward Packets']) == (1, 1)
+    assert (udp_row['Total Length of Fwd Packets'], udp_row[' Total Length of Bwd Packets']) == (50, 70)
+    assert udp_row[' Flow Duration'] == 300000
+    assert udp_row[' Fwd Header Length'] == 8 and udp_row[' Bwd Header Length'] == 8
+    assert udp_row['Init_Win_bytes_forward'] == -1 and udp_row[' Init_Win_bytes_backward'] == -1
+    assert udp_row[' Timestamp'] == '2023-11-14 22:13:21.000000'
+
+    # A single packet: rates over no time at all
+    single = rows[2]
+    assert single[' Flow Duration'] == 0
+    assert single['Flow Bytes/s'] == math.inf and single[' Flow Packets/s'] == math.inf
+    assert single['Fwd Packets/s'] == math.inf and single[' Bwd Packets/s'] == 0.0
+
+def test_idle_and_active_timeouts_split_flows():
+    meter = FlowMeter(idle_timeout=2, active_timeout=10, activity_timeout=1, wheel_tick=1)
+    flow = udp('10.0.0.3', '10.0.0.4', 5353, 53, payload=20)
+    other = udp('10.0.0.5', '10.0.0.6', 1, 2, payload=20)
+    # Idle for 2.7 s after 1.8 s, then steady traffic that runs past the active timeout
+    times = [0.0, 0.5, 1.8] + [4.5 + 0.5 * i for i in range(25)]
+    for seconds in times:
+        meter.add(int(seconds * 1e6), decode(LINKTYPE_ETHERNET, flow))
+    meter.add(int(20 * 1e6), decode(LINKTYPE_ETHERNET, other))
+    rows = [by_name(row) for row in meter.flush()]
+    assert [row[' Total Fwd Packets'] for row in rows] == [3, 21, 4, 1]
+    assert [row[' Flow Duration'] for row in rows] == [1800000, 10000000, 1500000, 0]
+    # A gap over the activity timeout ends an active period and counts as idle time
+    assert rows[0]['Active Mean'] == 500000 and rows[0]['Idle Mean'] == 1300000
+    assert rows[1]['Active Mean'] == 10000000 and rows[1]['Idle Mean'] == 0
+
+def test_truncated_and_foreign_captures(tmp_path):
+    path = tmp_path / "capture.pcap"
+    write_pcap(str(path), PACKETS[:3])
+    data = path.read_bytes()
+    # A capture still being written: the partial last record is left for later
+    path.write_bytes(data[:-10])
+    assert len(list(read_packets(str(path)))) == 2
+    path.write_bytes(b"not a capture at all")
+    with pytest.raises(CaptureError):
+        list(read_packets(str(path)))
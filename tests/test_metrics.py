@@ -0,0 +1,94 @@
+import json
+import urllib.error
+import urllib.request
+import pytest
+from utils.metrics import Histogram, MetricsRegistry
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    yield registry
+    registry.stop()
+
+@pytest.mark.parametrize("q, counts, expected", [
+    (0.5, [10, 20, 10, 0], 1.5),    # Rank 20 is halfway into the (1, 2] bucket
+    (0.25, [10, 20, 10, 0], 1.0),   # Rank 10 ends the first bucket
+    (0.9, [10, 20, 10, 0], 3.2),    # Rank 36 is 6/10 into the (2, 4] bucket
+    (0.5, [0, 0, 4, 0], 3.0),
+    (0.99, [1, 0, 0, 0], 0.99),     # The first bucket interpolates up from zero
+    (0.5, [0, 0, 0, 5], 4.0),       # Only +Inf: the highest finite bound
+    (0.95, [10, 0, 0, 10], 4.0),
+])
+def test_quantile_matches_bucket_counts(q, counts, expected):
+    histogram = Histogram('h', "test", buckets=(4, 1, 2))
+    assert histogram.quantile(q, counts) == pytest.approx(expected)
+
+def test_quantile_of_nothing():
+    assert Histogram('h', "test", buckets=(1, 2)).quantile(0.5, [0, 0, 0]) is None
+
+def test_observations_land_in_their_buckets():
+    histogram = Histogram('h', "test", ('stage',), buckets=(1, 2, 4))
+    for value in (0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 100.0):
+        histogram.observe(value, stage='a')
+    histogram.observe(0.1, stage='b')
+    items = dict(histogram._items())
+    # Bounds are inclusive, as with Prometheus's "le"
+    assert items[('a',)] == [[2, 2, 2, 1], 112.0, 7]
+    assert items[('b',)] == [[1, 0, 0, 0], 0.1, 1]
+
+def test_render_prometheus_text(registry):
+    counter = registry.counter('rows_total', "Rows handled", ('stage',))
+    counter.inc(3, stage='score')
+    counter.inc(stage='score')
+    counter.inc(2, stage='a "quoted"\nstage')
+    registry.gauge('pending', "Pending writes").set_function(lambda: 7)
+    histogram = registry.histogram('latency_seconds', "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value)
+    assert registry.counter('rows_total', "ignored") is counter
+
+    assert registry.render() == "\n".join([
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 6.05",
+        "latency_seconds_count 4",
+        "# HELP pending Pending writes",
+        "# TYPE pending gauge",
+        "pending 7",
+        "# HELP rows_total Rows handled",
+        "# TYPE rows_total counter",
+        'rows_total{stage="a \\"quoted\\"\\nstage"} 2',
+        'rows_total{stage="score"} 4',
+    ]) + "\n"
+
+def test_snapshot(registry):
+    registry.gauge('broken', "Raises when read").set_function(lambda: 1 / 0)
+    registry.gauge('queue', "Queue depth", ('name',)).set(5, name='log')
+    histogram = registry.histogram('latency_seconds', "Latency", ('stage',), buckets=(1, 2, 4))
+    for value in [0.5] * 10 + [1.5] * 20 + [3] * 10:
+        histogram.observe(value, stage='score')
+
+    snapshot = registry.snapshot()
+    assert snapshot['broken'] == {}
+    assert snapshot['queue'] == {'name=log': 5}
+    summary = snapshot['latency_seconds']['stage=score']
+    assert summary['count'] == 40
+    assert summary['mean'] == pytest.approx(1.625)
+    assert summary['p50'] == pytest.approx(1.5)
+    assert summary['p95'] == pytest.approx(3.6)
+    assert summary['p99'] == pytest.approx(3.92)
+
+def test_serve(registry):
+    registry.counter('requests_total', "Requests").inc()
+    port = registry.serve(port=0, host='127.0.0.1')
+    assert port and registry.serve() == port
+    base = f"http://127.0.0.1:{port}"
+    with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+        assert "requests_total 1\n" in response.read().decode()
+    with urllib.request.urlopen(f"{base}/snapshot", timeout=5) as response:
+        assert json.load(response)['requests_total'] == {'': 1}
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(f"{base}/other", timeout=5)
@@ -0,0 +1,84 @@
+import numpy as np
+from detector.sampling import ReservoirSampler, parse_times
+
+def stream(rows, block_sizes):
+    """Row blocks of a column counting 0..rows-1, cut to the given sizes in turn."""
+    data = np.arange(rows, dtype=np.float32).reshape(-1, 1)
+    start, i = 0, 0
+    while start < rows:
+        size = block_sizes[i % len(block_sizes)]
+        yield data[start:start + size]
+        start += size
+        i += 1
+
+def test_sample_size_and_rows():
+    sampler = ReservoirSampler(100, seed=1)
+    for block in stream(10000, [1, 37, 500, 0, 2048]):
+        sampler.add(block)
+    sample = sampler.sample()
+    assert sampler.seen == 10000
+    assert sample.shape == (100, 1) and sample.dtype == np.float32
+    values = sample[:, 0]
+    assert len(np.unique(values)) == 100
+    assert values.min() >= 0 and values.max() < 10000
+
+def test_short_stream_is_kept_whole():
+    sampler = ReservoirSampler(100, seed=1)
+    for block in stream(60, [7]):
+        sampler.add(block)
+    assert np.array_equal(sampler.sample()[:, 0], np.arange(60))
+    assert ReservoirSampler(10).sample() is None
+
+def test_every_row_equally_likely():
+    rows, size, trials = 50, 10, 4000
+    counts = np.zeros(rows)
+    rng = np.random.default_rng(0)
+    for trial in range(trials):
+        sampler = ReservoirSampler(size, seed=trial)
+        for block in stream(rows, list(rng.integers(1, 15, 5))):
+            sampler.add(block)
+        counts[sampler.sample()[:, 0].astype(int)] += 1
+    frequency = counts / trials
+    # Each row is kept with probability size / rows = 0.2; the standard error is about 0.006
+    assert np.abs(frequency - size / rows).max() < 0.03
+    # Rows late in the stream are not favoured over early ones
+    assert abs(frequency[:25].mean() - frequency[25:].mean()) < 0.01
+
+def test_windows_get_equal_shares():
+    window = 60
+    sampler = ReservoirSampler(90, window=window, seed=3)
+    sizes = {0: 5000, 1: 200, 2: 5}
+    for key, count in sizes.items():
+        times = key * window + np.linspace(0, window - 1, count)
+        block = np.full((count, 1), key, dtype=np.float32)
+        for start in range(0, count, 64):
+            sampler.add(block[start:start + 64], times[start:start + 64])
+    sample = sampler.sample()
+    assert sampler.windows == 3
+    assert sampler.seen == sum(sizes.values())
+    # Oldest window first; a window smaller than its share is kept whole
+    assert list(sample[:, 0]) == [0] * 30 + [1] * 30 + [2] * 5
+
+def test_rows_without_time_form_their_own_group():
+    sampler = ReservoirSampler(40, window=60, seed=4)
+    times = np.where(np.arange(400) % 4 == 0, np.nan, 30.0)
+    block = np.where(np.isnan(times), -1, 1).astype(np.float32).reshape(-1, 1)
+    sampler.add(block, times)
+    sample = sampler.sample()
+    assert sampler.windows == 2
+    assert list(sample[:, 0]) == [1] * 20 + [-1] * 20
+
+def test_many_windows_stay_bounded():
+    sampler = ReservoirSampler(100, window=1, seed=5)
+    for key in range(1000):
+        sampler.add(np.full((50, 1), key, dtype=np.float32), np.full(50, key + 0.5))
+        assert sampler._held <= 2 * 1000
+    sample = sampler.sample()
+    # More windows than rows: every window keeps one row
+    assert sorted(sample[:, 0]) == list(range(1000))
+
+def test_parse_times():
+    times = parse_times(["1970-01-01 00:01:00", "not a time", None, "2024-05-01 12:00:00"])
+    assert times[0] == 60.0
+    assert np.isnan(times[1]) and np.isnan(times[2])
+    assert times[3] == 1714564800.0
@@ -0,0 +1,99 @@
+import time
+import pytest
+from security.blocklist import PERMANENT
+from security.firewall import FakeBackend
+from security.response import SecurityResponse
+from security.store import BlockStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = BlockStore(path=str(tmp_path / "blocks.db"), flush_interval=60, batch_size=1000)
+    yield store
+    store.close()
+
+class RejectingBackend(FakeBackend):
+    """Fake firewall that refuses to block some rules."""
+
+    def __init__(self, refused):
+        super().__init__()
+        self.refused = set(refused)
+
+    def block(self, ip_address):
+        if ip_address in self.refused:
+            return False
+        return super().block(ip_address)
+
+def test_block_lift_history(store):
+    store.record_block("192.0.2.1", 100.0, 200.0, "scan", 0.9)
+    store.record_block("192.0.2.1", 100.0, 300.0, None, None)    # Refresh keeps reason and score
+    store.record_block("198.51.100.0/24", 110.0, None, "aggregated", None)
+    store.record_lift("192.0.2.1", 150.0)
+    store.record_block("192.0.2.1", 160.0, None, "again", 0.5)
+
+    active = {row['rule']: row for row in store.active()}
+    assert set(active) == {"192.0.2.1", "198.51.100.0/24"}
+    assert active["192.0.2.1"]['blocked_at'] == 160.0
+    history = store.query(ip="192.0.2.1")
+    assert [(row['blocked_at'], row['lifted_at']) for row in history] == [(160.0, None), (100.0, 150.0)]
+    assert history[1]['expires_at'] == 300.0 and history[1]['reason'] == "scan" and history[1]['score'] == 0.9
+    assert [row['rule'] for row in store.query(reason="aggr")] == ["198.51.100.0/24"]
+    assert [row['rule'] for row in store.query(reason="%")] == []
+    assert store.known(["192.0.2.1", "203.0.113.1"]) == {"192.0.2.1"}
+
+def test_rollback_forgets_open_block(store):
+    store.record_block("192.0.2.1", 100.0, None, "scan", None)
+    store.record_rollback("192.0.2.1")
+    assert store.query(ip="192.0.2.1") == []
+
+def test_failed_flush_keeps_writes_queued(store, monkeypatch):
+    store.record_block("192.0.2.1", 100.0, None, "first", None)
+
+    def broken():
+        raise OSError("disk full")
+    monkeypatch.setattr(store, "_connection", broken)
+    assert store.flush() is False
+    # Queued since the failure: committed after the retried writes
+    store.record_lift("192.0.2.1", 150.0)
+    assert len(store._pending) == 2
+    assert store._timer is not None
+
+    monkeypatch.undo()
+    assert store.flush() is True
+    assert store._pending == []
+    assert [(row['blocked_at'], row['lifted_at']) for row in store.query(ip="192.0.2.1")] == [(100.0, 150.0)]
+
+def test_recover_restores_and_reconciles(store):
+    wall = time.time()
+    store.record_block("192.0.2.1", wall - 10, wall + 3600, "temporary", 0.7)
+    store.record_block("192.0.2.2", wall - 10, None, "permanent", None)
+    store.record_block("192.0.2.3", wall - 7200, wall - 3600, "expired", None)
+    store.record_block("192.0.2.4", wall - 10, None, "refused", None)
+    store.record_block("192.0.2.5", wall - 7200, None, "lifted", None)
+    store.record_lift("192.0.2.5", wall - 3600)
+    store.flush()
+
+    firewall = RejectingBackend(refused=["192.0.2.4"])
+    firewall.rules = {"192.0.2.2", "192.0.2.5", "203.0.113.9"}
+    response = SecurityResponse(firewall=firewall, store=store)
+    try:
+        assert response.recover() is True
+
+        # Missing rules were added, rules this system created and lifted were removed,
+        # and rules it never created were left alone
+        assert firewall.rules == {"192.0.2.1", "192.0.2.2", "203.0.113.9"}
+        assert ('add', "192.0.2.2") not in firewall.operations
+        assert response.is_blocked("192.0.2.1") and response.is_blocked("192.0.2.2")
+        assert not response.is_blocked("192.0.2.3")
+        # Rejected by the firewall: not enforced, but still open for the next recovery
+        assert not response.is_blocked("192.0.2.4")
+        assert store.query(ip="192.0.2.4", active=True)
+
+        assert response.blocklist.expiry("192.0.2.2") == PERMANENT
+        remaining = (response.blocklist.expiry("192.0.2.1") - time.monotonic_ns()) / 1e9
+        assert 3500 < remaining <= 3600
+        assert [ip for ip, _ in response.pending_expiries()] == ["192.0.2.1"]
+
+        assert store.query(ip="192.0.2.3", active=True) == []
+        assert store.query(ip="192.0.2.3")[0]['lifted_at'] is not None
+    finally:
+        response.expiry_scheduler.stop()
@@ -0,0 +1,120 @@
+import glob
+import json
+import os
+import pytest
+from utils.threat_log import ThreatLog
+
+IPS = ["10.0.0.1", "10.0.0.2", "2001:db8::5"]
+TYPES = ["IP_BLOCKED", "ANOMALY"]
+
+def make_events(count, start=0):
+    return [
+        {'timestamp': 1000.0 + i, 'ip_address': IPS[i % len(IPS)],
+         'threat_type': TYPES[i % len(TYPES) if i % 5 else 0], 'details': {'n': i}}
+        for i in range(start, start + count)
+    ]
+
+def expected(events, ip=None, since=None, until=None, threat_type=None):
+    matches = [
+        event for event in events
+        if (ip is None or event['ip_address'] == ip)
+        and (since is None or event['timestamp'] >= since)
+        and (until is None or event['timestamp'] < until)
+        and (threat_type is None or event['threat_type'] == threat_type)
+    ]
+    return sorted(matches, key=lambda event: -event['timestamp'])
+
+@pytest.fixture
+def open_log(tmp_path):
+    logs = []
+    def open_log(**kwargs):
+        options = dict(directory=str(tmp_path / "threats"), max_segment_bytes=2000,
+                       max_segment_age=3600, retention=100, block_lines=3)
+        options.update(kwargs)
+        logs.append(ThreatLog(**options))
+        return logs[-1]
+    yield open_log
+    for log in logs:
+        log.close()
+
+def segment_counts(log):
+    return log._connection().execute(
+        "SELECT SUM(compressed = 1), SUM(compressed = 0) FROM segments").fetchone()
+
+@pytest.mark.parametrize("query", [
+    {}, {'ip': "10.0.0.2"}, {'ip': "2001:db8::5", 'threat_type': "ANOMALY"},
+    {'since': 1050.0, 'until': 1120.0}, {'threat_type': "IP_BLOCKED", 'since': 1100.0},
+    {'ip': "192.0.2.1"}
+])
+def test_query_across_rotated_segments(open_log, query):
+    log = open_log()
+    events = make_events(200)
+    for start in range(0, len(events), 7):
+        log.append(events[start:start + 7])
+    compressed, active = segment_counts(log)
+    assert compressed >= 3 and active == 1
+
+    assert log.query(limit=None, **query) == expected(events, **query)
+    assert log.query(limit=5, **query) == expected(events, **query)[:5]
+
+def test_query_accepts_iso_times(open_log):
+    log = open_log()
+    events = [{'timestamp': f"2024-05-01T12:00:0{i}", 'ip_address': "10.0.0.1", 'threat_type': "ANOMALY"}
+              for i in range(5)]
+    log.append(events)
+    assert log.query(since="2024-05-01T12:00:02", until="2024-05-01T12:00:04") == events[3:1:-1]
+
+def test_last_seen(open_log):
+    log = open_log()
+    log.append(make_events(30))
+    assert log.last_seen("10.0.0.1") == 1027.0
+    assert log.last_seen("10.0.0.1", "IP_BLOCKED") == max(
+        event['timestamp'] for event in expected(make_events(30), ip="10.0.0.1", threat_type="IP_BLOCKED"))
+    assert log.last_seen("192.0.2.1") is None
+
+def test_retention_drops_oldest_segments(open_log):
+    log = open_log(retention=2)
+    events = make_events(200)
+    for start in range(0, len(events), 10):
+        log.append(events[start:start + 10])
+    assert segment_counts(log)[0] == 2
+    assert len(glob.glob(os.path.join(log.directory, "*.gz"))) == 2
+    found = log.query(limit=None)
+    assert found == expected(events)[:len(found)]
+    assert found[-1]['timestamp'] > 1000.0
+
+def test_unindexed_tail_is_indexed_after_a_crash(open_log):
+    log = open_log(max_segment_bytes=10 ** 6)
+    events = make_events(10)
+    log.append(events[:5])
+    path = log._path(log._segment['file'])
+    log.close()
+
+    # Written but never indexed, then a line cut short
+    with open(path, 'ab') as f:
+        for event in events[5:8]:
+            f.write((json.dumps(event) + "\n").encode())
+        f.write(b"not json\n")
+        f.write(json.dumps(events[8]).encode()[:20])
+
+    log = open_log(max_segment_bytes=10 ** 6)
+    log.append(events[9:])
+    assert log.query(limit=None) == expected(events[:8] + events[9:])
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 10 and lines[8] == b"not json"
+    assert json.loads(lines[9]) == events[9]
+
+def test_processes_sharing_a_directory(open_log):
+    first, second = open_log(), open_log()
+    events = make_events(120)
+    for start in range(0, len(events), 4):
+        (first if start % 8 else second).append(events[start:start + 4])
+    assert segment_counts(first)[0] >= 2
+
+    for log in (first, second):
+        assert log.query(limit=None) == expected(events)
+        assert log.query(ip="10.0.0.1", limit=None) == expected(events, ip="10.0.0.1")
+    # Every event was indexed once, each segment by whichever process wrote into it
+    assert first._connection().execute("SELECT (SELECT SUM(records) FROM segments), COUNT(*) FROM events").fetchone() == (120, 120)
+    assert sum(segment_counts(first)) == len(glob.glob(os.path.join(first.directory, "threats-*")))
@@ -1,25 +1,259 @@
+import atexit
+import collections
 import logging
+import multiprocessing
 import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 from config import LOG_CONFIG
+from utils.metrics import metrics, STAGE_SECONDS, STAGE_ROWS
+from utils.threat_log import threat_log as default_threat_log
+
+class BatchWriter:
+    """Write batches of log records: text to the log file and console, threat events to the threat log.
+
+    Each batch costs one write and one flush per destination; ``fsync``
+    decides whether that is followed by an fsync after every batch
+    (``"batch"``), at most every ``fsync_interval`` seconds (``"interval"``)
+    or never, leaving it to the OS (``"never"``).
+    """
+
+    def __init__(self, formatter, log_path=None, threat_log=None, fsync=None, fsync_interval=None, console=True):
+        self.formatter = formatter
+        self.threat_log = threat_log or default_threat_log
+        self.fsync = fsync or LOG_CONFIG['fsync']
+        self.fsync_interval = LOG_CONFIG['fsync_interval'] if fsync_interval is None else fsync_interval
+        self.console = sys.stderr if console else None
+        self.log_path = log_path or LOG_CONFIG['file']
+        self._log = None
+        self._last_sync = time.monotonic()
+
+    def _file(self):
+        """Open the log file on first write, creating its directory."""
+        if self._log is None:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+        return self._log
+
+    def write(self, records):
+        with STAGE_SECONDS.time(stage='log_write'):
+            self._write(records)
+        STAGE_ROWS.inc(len(records), stage='log_write')
+
+    def _write(self, records):
+        lines = []
+        threats = []
+        for record in records:
+            lines.append(self.formatter.format(record) + "\n")
+            event = getattr(record, 'threat', None)
+            if event is not None:
+                threats.append(event)
+
+        text = "".join(lines)
+        log = self._file()
+        log.write(text)
+        log.flush()
+        if self.console is not None:
+            self.console.write(text)
+            self.console.flush()
+        if threats:
+            self.threat_log.append(threats)
+        self._sync()
+
+    def _sync(self, force=False):
+        """Fsync the files according to the policy."""
+        now = time.monotonic()
+        due = self.fsync == 'batch' or (self.fsync == 'interval' and now - self._last_sync >= self.fsync_interval)
+        if not (force or due) or self.fsync == 'never':
+            return
+        os.fsync(self._log.fileno())
+        self.threat_log.sync()
+        self._last_sync = now
+
+    def close(self):
+        if self._log is not None:
+            self._sync(force=True)
+            self._log.close()
+            self._log = None
+        self.threat_log.close()
+
+class WriterHandler(logging.Handler):
+    """Write each record synchronously on the caller's thread."""
+
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record):
+        try:
+            self.writer.write([record])
+        except Exception:
+            self.handleError(record)
+
+    def overflow_stats(self):
+        return {'dropped': 0, 'sampled_out': 0, 'priority_dropped': 0}
+
+    def queue_depth(self):
+        return 0
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+class AsyncQueueHandler(logging.Handler):
+    """Hand records to a background writer thread; the caller never touches disk.
+
+    Records go into a bounded queue that the writer drains in batches of up
+    to ``batch_size``. Warnings, errors and threat events spill into a side
+    queue of ``priority_size`` records when the queue is full, and are only
+    dropped once that is full too. Lower severity records are dropped when
+    the queue is full and, with the ``"sample"`` overflow policy, thinned to
+    one in ``sample_rate`` once the queue passes its high-water mark. All
+    of these are counted and reported.
+    """
+
+    _STOP = object()
+
+    def __init__(self, writer, queue_size=None, batch_size=None, flush_interval=None,
+                 overflow=None, sample_rate=None, high_water=None, priority_size=None):
+        super().__init__()
+        self.writer = writer
+        queue_size = queue_size or LOG_CONFIG['queue_size']
+        self.batch_size = batch_size or LOG_CONFIG['batch_size']
+        self.flush_interval = LOG_CONFIG['flush_interval'] if flush_interval is None else flush_interval
+        self.overflow = overflow or LOG_CONFIG['overflow']
+        self.sample_rate = sample_rate or LOG_CONFIG['sample_rate']
+        self._high_water = int(queue_size * (high_water or LOG_CONFIG['high_water']))
+        self._queue = queue.Queue(queue_size)
+        self._priority = collections.deque()
+        self.priority_size = priority_size or LOG_CONFIG['priority_queue_size']
+        self._seen = 0
+        self.stats = {'dropped': 0, 'sampled_out': 0, 'priority_dropped': 0}
+        self._reported = dict(self.stats)
+        self._stats_lock = threading.Lock()   # Emitting threads and the writer update the counters
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def handle(self, record):
+        # Skip the handler lock: the queue is already thread-safe
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+    def emit(self, record):
+        priority = record.levelno >= logging.WARNING or hasattr(record, 'threat')
+        if not priority and self.overflow == 'sample' and self._queue.qsize() >= self._high_water:
+            with self._stats_lock:
+                self._seen += 1
+                if self._seen % self.sample_rate:
+                    self.stats['sampled_out'] += 1
+                    return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                if not priority:
+                    self.stats['dropped'] += 1
+                elif len(self._priority) >= self.priority_size:
+                    self.stats['priority_dropped'] += 1
+                else:
+                    self._priority.append(record)
+
+    def _overflow_record(self):
+        """A warning summarizing records lost since the last report, or None."""
+        with self._stats_lock:
+            lost = {key: self.stats[key] - self._reported[key] for key in self.stats}
+            if not any(lost.values()):
+                return None
+            self._reported = dict(self.stats)
+        return logging.makeLogRecord({
+            'name': 'security_system', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f"Log queue overflow: {lost['dropped']} records dropped, {lost['sampled_out']} sampled out, "
+                   f"{lost['priority_dropped']} warnings, errors or threat events dropped"
+        })
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            while self._priority:
+                batch.append(self._priority.popleft())
+
+            if self._STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._STOP]
+            report = self._overflow_record()
+            if report is not None:
+                batch.append(report)
+            if batch:
+                try:
+                    self.writer.write(batch)
+                except Exception as e:
+                    sys.stderr.write(f"Failed to write {len(batch)} log records: {str(e)}\n")
+
+    def overflow_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def queue_depth(self):
+        """Records waiting for the writer thread."""
+        return self._queue.qsize() + len(self._priority)
+
+    def close(self):
+        """Drain the queue, stop the writer thread and close the files."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+            # Anything queued after the stop marker
+            rest = []
+            while not self._queue.empty():
+                rest.append(self._queue.get_nowait())
+            rest.extend(self._priority)
+            if rest:
+                self.writer.write(rest)
+            self.writer.close()
+        super().close()
 
 class SystemLogger:
     def __init__(self):
         self.logger = logging.getLogger('security_system')
         self.logger.setLevel(LOG_CONFIG['level'])
-        
+
         # Create formatters
         formatter = logging.Formatter(LOG_CONFIG['format'])
-        
-        # File handler
-        file_handler = logging.FileHandler(LOG_CONFIG['file'])
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
-        
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+
+        # One writer serves both the log file and the console. Training and
+        # scoring processes write their few records synchronously rather
+        # than each running a writer thread of their own on the same files
+        writer = BatchWriter(formatter)
+        if LOG_CONFIG['async'] and multiprocessing.parent_process() is None:
+            self.handler = AsyncQueueHandler(writer)
+        else:
+            self.handler = WriterHandler(writer)
+        self.logger.addHandler(self.handler)
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            # A forked child inherits the handler but not its writer thread
+            os.register_at_fork(after_in_child=self._write_synchronously)
+
+        metrics.gauge('shcs_log_queue_depth', "Log records waiting to be written").set_function(
+            lambda: self.handler.queue_depth())
+        metrics.gauge('shcs_log_dropped', "Log records dropped or sampled out under load").set_function(
+            lambda: sum(self.handler.overflow_stats().values()))
 
     def info(self, message):
         self.logger.info(message)
@@ -40,7 +274,24 @@ class SystemLogger:
             'threat_type': threat_type,
             'details': details
         }
-        self.info(f"Threat detected: {threat_log}")
+        # The full event goes to the indexed threat log; the text log gets a summary
+        self.logger.info(f"Threat detected: {threat_type} from {ip_address}", extra={'threat': threat_log})
+
+    def _write_synchronously(self):
+        """Switch to writing on the caller's thread, keeping the same writer."""
+        if isinstance(self.handler, AsyncQueueHandler):
+            self.logger.removeHandler(self.handler)
+            self.handler = WriterHandler(self.handler.writer)
+            self.logger.addHandler(self.handler)
+
+    def overflow_stats(self):
+        """Counts of records dropped or sampled out under load."""
+        return self.handler.overflow_stats()
+
+    def close(self):
+        """Write out queued records and close the log files."""
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
 
 # Create a singleton instance
-logger = SystemLogger() 
+logger = SystemLogger()
@@ -0,0 +1,265 @@
+import bisect
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_CONFIG
+
+def _label_key(names, labels):
+    """Label values in declaration order, as a hashable key."""
+    return tuple(str(labels[name]) for name in names)
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}   # label key -> value
+        self._lock = threading.Lock()
+
+    def _items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    """A total that only goes up, e.g. rows scored or blocks applied."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """A value that goes up and down; either set directly or read from a function when collected."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Report ``function()`` whenever the gauge is collected (unlabelled gauges only)."""
+        self._function = function
+
+    def _items(self):
+        if self._function is not None:
+            try:
+                return [((), self._function())]
+            except Exception:
+                return []
+        return super()._items()
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Histogram(_Metric):
+    """Observed values (seconds, by default) counted into cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=None):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets or METRICS_CONFIG['buckets']))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labels, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the time its block takes."""
+        return _Timer(self, labels)
+
+    def _items(self):
+        with self._lock:
+            return [(key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items()]
+
+    def quantile(self, q, counts):
+        """Estimate a quantile from bucket counts, interpolating within the bucket like Prometheus."""
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """Counters, gauges and histograms for the pipeline, exported as a snapshot or Prometheus text.
+
+    Recording costs a dictionary update under a per-metric lock, so it is
+    done per batch or per operation, never per row. ``serve()`` exposes
+    ``/metrics`` (Prometheus text format) and ``/snapshot`` (JSON) on
+    localhost from a background thread.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=None):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def snapshot(self):
+        """Current values: ``{metric: {"label=value,...": value}}``.
+
+        Histograms report ``count``, ``sum``, ``mean`` and estimated
+        ``p50``/``p95``/``p99`` instead of a single value.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {'timestamp': time.time()}
+        for metric in metrics:
+            values = {}
+            for key, value in metric._items():
+                label = ",".join(f"{name}={item}" for name, item in zip(metric.labels, key))
+                if metric.kind == 'histogram':
+                    counts, total, count = value
+                    value = {
+                        'count': count,
+                        'sum': total,
+                        'mean': total / count if count else None,
+                        **{f'p{int(q * 100)}': metric.quantile(q, counts) for q in (0.5, 0.95, 0.99)}
+                    }
+                values[label] = value
+            snapshot[metric.name] = values
+        return snapshot
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(metric._items()):
+                pairs = list(zip(metric.labels, key))
+                if metric.kind != 'histogram':
+                    lines.append(f"{metric.name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += bucket
+                    le = _format_labels(pairs + [('le', _format_value(bound))])
+                    lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{_format_labels(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=None, host=None):
+        """Serve the metrics over HTTP from a daemon thread; return the bound port, or None on failure."""
+        if self._server is not None:
+            return self._server.server_address[1]
+        port = METRICS_CONFIG['port'] if port is None else port
+        host = host or METRICS_CONFIG['host']
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    body, content_type = registry.render().encode('utf-8'), 'text/plain; version=0.0.4'
+                elif self.path.split('?')[0] == '/snapshot':
+                    body, content_type = json.dumps(registry.snapshot()).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would drown the system log
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            return None
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# Create a singleton instance
+metrics = MetricsRegistry()
+
+# Metrics shared across modules
+STAGE_SECONDS = metrics.histogram(
+    'shcs_stage_seconds', "Time spent per batch or call in each pipeline stage", ('stage',))
+STAGE_ROWS = metrics.counter(
+    'shcs_stage_rows_total', "Rows (or records) handled by each pipeline stage", ('stage',))
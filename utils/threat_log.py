@@ -0,0 +1,406 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from config import THREAT_LOG_CONFIG
+from utils.filelock import FileLock
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    start REAL NOT NULL,             -- Unix time the segment was started
+    end REAL,                        -- Unix time of its last event
+    records INTEGER NOT NULL DEFAULT 0,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    block_lines INTEGER NOT NULL     -- Lines per gzip member once compressed
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    segment INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    offset INTEGER NOT NULL,         -- Byte offset of the gzip member in the archive
+    source INTEGER,                  -- Byte offset of its first line before compression
+    PRIMARY KEY (segment, block)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    segment INTEGER NOT NULL,
+    line INTEGER NOT NULL,           -- Line number within the segment
+    offset INTEGER NOT NULL,         -- Byte offset of the line before compression
+    ts REAL NOT NULL,
+    ip TEXT,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ip ON events(ip, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events(ts);
+DROP INDEX IF EXISTS events_segment;
+CREATE INDEX IF NOT EXISTS events_offset ON events(segment, offset);
+"""
+
+def _timestamp(value):
+    """Unix time of an event timestamp (ISO string or number), now if missing."""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+class ThreatLog:
+    """Threat events as JSON Lines in rotating segments with a SQLite sidecar index.
+
+    Events are appended to an active segment, which rotates once it reaches
+    ``max_segment_bytes`` or ``max_segment_age`` seconds. A rotated segment
+    is compressed into a gzip file of independent members of
+    ``block_lines`` lines each. The index maps every event's IP address and
+    time to its segment and byte offset, so lookups decompress only the
+    members that hold matching events. Only the newest ``retention``
+    segments are kept.
+
+    Appends and rotation take a lock file in the directory, so processes
+    sharing it (the GUI and the daemon) write whole batches one at a time.
+    Lines in the active segment that are not indexed yet, left by a crash
+    between the write and the index insert, are indexed by the next append.
+    Queries use their own connection and do not wait for either.
+    """
+
+    def __init__(self, directory=None, max_segment_bytes=None, max_segment_age=None,
+                 retention=None, block_lines=None):
+        self.directory = directory or THREAT_LOG_CONFIG['dir']
+        self.max_segment_bytes = max_segment_bytes or THREAT_LOG_CONFIG['max_segment_bytes']
+        self.max_segment_age = max_segment_age or THREAT_LOG_CONFIG['max_segment_age']
+        self.retention = retention or THREAT_LOG_CONFIG['retention']
+        self.block_lines = block_lines or THREAT_LOG_CONFIG['block_lines']
+        self._lock = threading.Lock()
+        self._query_lock = threading.Lock()
+        self._conn = None
+        self._reader = None
+        self._file = None       # Active segment, open for appending
+        self._segment = None    # {'id', 'file', 'start', 'records'} of the active segment
+
+    def _connection(self):
+        """Open the index on first use."""
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = sqlite3.connect(self._path("index.sqlite"), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(INDEX_SCHEMA)
+            if 'source' not in {row[1] for row in self._conn.execute("PRAGMA table_info(blocks)")}:
+                # Indexes from before members recorded where their lines started
+                self._conn.execute("ALTER TABLE blocks ADD COLUMN source INTEGER")
+        return self._conn
+
+    def _query_connection(self):
+        """Connection for queries, opened after the index exists; call with the query lock held."""
+        if self._reader is None:
+            with self._lock:
+                self._connection()
+            self._reader = sqlite3.connect(self._path("index.sqlite"), check_same_thread=False)
+        return self._reader
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return FileLock(self._path("threats.lock"))
+
+    def _open_active(self):
+        """Reopen the newest uncompressed segment, or start a new one."""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT id, file, start, records FROM segments WHERE compressed = 0 ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if row is None or not os.path.exists(self._path(row[1])):
+            now = time.time()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO segments (file, start, block_lines) VALUES ('', ?, ?)", (now, self.block_lines)
+                )
+                segment_id = cursor.lastrowid
+                name = f"threats-{datetime.fromtimestamp(now).strftime('%Y%m%d-%H%M%S')}-{segment_id}.jsonl"
+                conn.execute("UPDATE segments SET file = ? WHERE id = ?", (name, segment_id))
+            row = (segment_id, name, now, 0)
+
+        self._segment = {'id': row[0], 'file': row[1], 'start': row[2], 'records': row[3]}
+        self._file = open(self._path(row[1]), 'ab')
+
+    def _current_segment(self):
+        """The active segment as the index has it now; call with both locks held.
+
+        Another process may have appended to it, or rotated it away, since
+        this one last wrote.
+        """
+        conn = self._connection()
+        if self._file is not None:
+            row = conn.execute("SELECT records, compressed FROM segments WHERE id = ?",
+                               (self._segment['id'],)).fetchone()
+            if row is None or row[1]:
+                self._file.close()
+                self._file = None
+            else:
+                self._segment['records'] = row[0]
+        if self._file is None:
+            self._open_active()
+        self._index_tail()
+        return self._segment
+
+    def _index_tail(self):
+        """Index lines of the active segment past its last indexed event."""
+        conn = self._connection()
+        segment = self._segment
+        size = os.fstat(self._file.fileno()).st_size
+        last = conn.execute("SELECT MAX(offset) FROM events WHERE segment = ?", (segment['id'],)).fetchone()[0]
+        with open(self._path(segment['file']), 'rb') as f:
+            start = 0
+            if last is not None:
+                f.seek(last)
+                start = last + len(f.readline())
+            if start >= size:
+                return
+            f.seek(start)
+            tail = f.read(size - start)
+
+        end = tail.rfind(b"\n") + 1
+        if end < len(tail):
+            # A write cut short: drop the partial line so the next one starts on its own
+            os.ftruncate(self._file.fileno(), start + end)
+        rows = []
+        offset = start
+        for line in tail[:end].splitlines(keepends=True):
+            try:
+                event = json.loads(line)
+                row = (_timestamp(event.get('timestamp')), event.get('ip_address'), event.get('threat_type'))
+            except (ValueError, TypeError, AttributeError):
+                # Indexed all the same, so it is not rescanned; queries skip it
+                row = (0.0, None, None)
+            rows.append((segment['id'], segment['records'], offset) + row)
+            segment['records'] += 1
+            offset += len(line)
+        if rows:
+            with conn:
+                conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("UPDATE segments SET end = MAX(COALESCE(end, 0), ?), records = ? WHERE id = ?",
+                             (max(row[3] for row in rows), segment['records'], segment['id']))
+
+    def append(self, events):
+        """Append threat event dicts and index them, rotating the segment when due."""
+        if not events:
+            return
+        with self._lock, self._file_lock():
+            segment = self._current_segment()
+            offset = os.fstat(self._file.fileno()).st_size
+            lines = []
+            rows = []
+            ts = None
+            for event in events:
+                line = (json.dumps(event, default=str) + "\n").encode('utf-8')
+                ts = _timestamp(event.get('timestamp'))
+                rows.append((segment['id'], segment['records'], offset, ts,
+                             event.get('ip_address'), event.get('threat_type')))
+                segment['records'] += 1
+                offset += len(line)
+                lines.append(line)
+
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("UPDATE segments SET end = ?, records = ? WHERE id = ?",
+                             (ts, segment['records'], segment['id']))
+
+            if offset >= self.max_segment_bytes or time.time() - segment['start'] >= self.max_segment_age:
+                self._rotate()
+
+    def _rotate(self):
+        """Compress the active segment into gzip members and apply retention."""
+        conn = self._connection()
+        segment_id = self._segment['id']
+        name = self._segment['file']
+        self._file.close()
+        self._file = None
+        self._segment = None
+
+        archive = name + ".gz"
+        blocks = []
+        source = 0
+        with open(self._path(name), 'rb') as src, open(self._path(archive), 'wb') as dst:
+            while True:
+                lines = [line for _, line in zip(range(self.block_lines), src)]
+                if not lines:
+                    break
+                data = b"".join(lines)
+                blocks.append((segment_id, len(blocks), dst.tell(), source))
+                dst.write(gzip.compress(data))
+                source += len(data)
+            os.fsync(dst.fileno())
+
+        with conn:
+            conn.executemany("INSERT INTO blocks (segment, block, offset, source) VALUES (?, ?, ?, ?)", blocks)
+            conn.execute("UPDATE segments SET file = ?, compressed = 1 WHERE id = ?", (archive, segment_id))
+        os.remove(self._path(name))
+
+        expired = conn.execute(
+            "SELECT id, file FROM segments WHERE compressed = 1 ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (self.retention,)
+        ).fetchall()
+        for old_id, old_file in expired:
+            with conn:
+                for table, column in (("events", "segment"), ("blocks", "segment"), ("segments", "id")):
+                    conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (old_id,))
+            if os.path.exists(self._path(old_file)):
+                os.remove(self._path(old_file))
+
+    def sync(self):
+        """Fsync the active segment."""
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+
+    def _read_block(self, path, offset):
+        """Decompress the single gzip member starting at ``offset``."""
+        decompressor = zlib.decompressobj(wbits=31)
+        data = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while not decompressor.eof:
+                chunk = f.read(65536)
+                if not chunk:
+                    break
+                data.append(decompressor.decompress(chunk))
+        return b"".join(data)
+
+    def _read_compressed(self, conn, path, segment_id, line, offset, block_lines, blocks):
+        """The raw line of an event in a compressed segment, decompressing its member once per query."""
+        row = conn.execute(
+            "SELECT block, offset, source FROM blocks WHERE segment = ? AND source <= ? "
+            "ORDER BY source DESC LIMIT 1", (segment_id, offset)
+        ).fetchone()
+        if row is None:
+            # Archived before members recorded their line offsets: count lines instead
+            block = line // block_lines
+            row = (block,) + conn.execute(
+                "SELECT offset FROM blocks WHERE segment = ? AND block = ?", (segment_id, block)
+            ).fetchone() + (None,)
+        block, block_offset, source = row
+        key = (segment_id, block)
+        if key not in blocks:
+            blocks[key] = self._read_block(path, block_offset)
+        data = blocks[key]
+        if source is None:
+            return data.splitlines()[line % block_lines]
+        start = offset - source
+        end = data.find(b"\n", start)
+        return data[start:] if end < 0 else data[start:end]
+
+    def query(self, ip=None, since=None, until=None, threat_type=None, limit=100):
+        """Threat events matching an IP, time range and type, newest first.
+
+        ``since`` and ``until`` accept Unix times or ISO timestamps. Only the
+        segments and gzip members holding matching events are read.
+        """
+        clauses, params = [], []
+        if ip is not None:
+            clauses.append("e.ip = ?")
+            params.append(ip)
+        if since is not None:
+            clauses.append("e.ts >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append("e.ts < ?")
+            params.append(_timestamp(until))
+        if threat_type is not None:
+            clauses.append("e.type = ?")
+            params.append(threat_type)
+
+        sql = ("SELECT e.segment, e.line, e.offset, s.file, s.compressed, s.block_lines "
+               "FROM events e JOIN segments s ON s.id = e.segment")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY e.ts DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._query_lock:
+            conn = self._query_connection()
+            for attempt in range(3):
+                try:
+                    return self._read_events(conn, conn.execute(sql, params).fetchall())
+                except FileNotFoundError:
+                    # Rotated or expired between the lookup and the read; look it up again
+                    if attempt == 2:
+                        raise
+
+    def _read_events(self, conn, rows):
+        events = []
+        blocks = {}
+        for segment_id, line, offset, name, compressed, block_lines in rows:
+            path = self._path(name)
+            if compressed:
+                raw = self._read_compressed(conn, path, segment_id, line, offset, block_lines, blocks)
+            else:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    raw = f.readline()
+            try:
+                events.append(json.loads(raw))
+            except ValueError:
+                # A damaged line; the rest of the results still stand
+                continue
+        return events
+
+    def last_seen(self, ip, threat_type=None):
+        """Unix time of the newest event for an IP, from the index alone, or None."""
+        sql = "SELECT MAX(ts) FROM events WHERE ip = ?"
+        params = [ip]
+        if threat_type is not None:
+            sql += " AND type = ?"
+            params.append(threat_type)
+        with self._query_lock:
+            return self._query_connection().execute(sql, params).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._segment = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        with self._query_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+# Create a singleton instance
+threat_log = ThreatLog()
+
+def main(argv=None):
+    """Command line query: ``python -m utils.threat_log --ip 10.0.0.5 --type IP_BLOCKED``."""
+    parser = argparse.ArgumentParser(description="Query the indexed threat log")
+    parser.add_argument("--ip", help="Source IP address")
+    parser.add_argument("--since", help="ISO timestamp of the earliest event")
+    parser.add_argument("--until", help="ISO timestamp after the latest event")
+    parser.add_argument("--type", dest="threat_type", help="Threat type, e.g. IP_BLOCKED")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of events")
+    parser.add_argument("--last", action="store_true", help="Only print when the IP was last seen")
+    args = parser.parse_args(argv)
+
+    if args.last:
+        if args.ip is None:
+            parser.error("--last requires --ip")
+        last = threat_log.last_seen(args.ip, args.threat_type)
+        print(datetime.fromtimestamp(last).isoformat() if last is not None else "never")
+        return
+
+    for event in threat_log.query(args.ip, args.since, args.until, args.threat_type, args.limit):
+        print(json.dumps(event))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from config import MONITOR_CONFIG
+from utils.logger import logger
+
+# inotify flags (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")   # struct inotify_event: wd, mask, cookie, len; the name follows
+
+class DirectoryWatcher:
+    """Block until files in a directory change.
+
+    Uses inotify on Linux and falls back to polling file sizes and mtimes
+    everywhere else.
+    """
+
+    def __init__(self, path, suffix=".csv"):
+        self.path = path
+        self.suffix = suffix
+        self._fd = None
+        self._snapshot = None
+        try:
+            self._fd = self._init_inotify()
+        except Exception as e:
+            logger.info(f"inotify unavailable, polling {path} instead: {str(e)}")
+        if self._fd is None:
+            self._snapshot = self._scan()
+
+    def _init_inotify(self):
+        """Open an inotify descriptor watching the directory."""
+        if not hasattr(select, "poll") or os.name != "posix":
+            return None
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            return None
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(self.path), WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch failed for {self.path}")
+        return fd
+
+    def _scan(self):
+        """Snapshot size and mtime of the watched files."""
+        snapshot = {}
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(self.suffix) and entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def _drain(self):
+        """Read pending inotify events; return True if any concerns a watched file.
+
+        The directory also holds the model, the block store, threat logs and
+        the feature cache, whose writes should not wake the monitoring loop.
+        """
+        relevant = False
+        suffix = os.fsencode(self.suffix)
+        try:
+            while True:
+                data = os.read(self._fd, 65536)
+                if not data:
+                    break
+                offset = 0
+                while offset + EVENT_HEADER.size <= len(data):
+                    _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = data[offset:offset + length].rstrip(b"\0")
+                    offset += length
+                    if mask & IN_Q_OVERFLOW or name.endswith(suffix):
+                        # An overflow may have dropped events for watched files
+                        relevant = True
+        except BlockingIOError:
+            pass
+        return relevant
+
+    def wait(self, timeout=None):
+        """Wait up to ``timeout`` seconds for a change; return True if one happened."""
+        if timeout is None:
+            timeout = MONITOR_CONFIG['max_wait']
+
+        deadline = time.monotonic() + timeout
+        if self._fd is not None:
+            poller = select.poll()
+            poller.register(self._fd, select.POLLIN)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not poller.poll(remaining * 1000):
+                    return False
+                if self._drain():
+                    break
+            # Let a burst of writes settle so it triggers a single pass
+            time.sleep(MONITOR_CONFIG['debounce'])
+            self._drain()
+            return True
+
+        while True:
+            snapshot = self._scan()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(MONITOR_CONFIG['poll_interval'], remaining))
+
+    def close(self):
+        """Release the inotify descriptor."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None